@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, UserSubscription, SubscriptionPlan, Onboarding, Profile
+from django.db.models import Prefetch
+from django.utils import timezone
+from .models import CustomUser, UserSubscription, SubscriptionPlan, Onboarding, Profile, StripeWebhookEvent
 
 
 @admin.register(CustomUser)
@@ -10,8 +12,19 @@ class CustomUserAdmin(admin.ModelAdmin):
     search_fields = ['email', 'username']
     readonly_fields = ['stripe_customer_id', 'date_joined', 'last_login']
     
+    def get_queryset(self, request):
+        # Prefetch active subscriptions (with plans) for the whole changelist page
+        # instead of running current_subscription once per row.
+        active = UserSubscription.objects.filter(
+            is_active=True, end_date__gt=timezone.now()
+        ).select_related('plan').order_by('-created_at', '-pk')  # newest first, as in entitlements
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('usersubscription_set', queryset=active, to_attr='active_subscriptions')
+        )
+
     def current_subscription_display(self, obj):
-        sub = obj.current_subscription
+        subs = getattr(obj, 'active_subscriptions', None)
+        sub = subs[0] if subs else (obj.current_subscription if subs is None else None)
         return f"{sub.plan.name}" if sub else "None"
     current_subscription_display.short_description = 'Current Plan'
 
@@ -76,4 +89,20 @@ class UserSubscriptionAdmin(admin.ModelAdmin):
     def is_current(self, obj):
         return obj.is_current
     is_current.boolean = True
-    is_current.short_description = 'Currently Active'
\ No newline at end of file
+    is_current.short_description = 'Currently Active'
+
+
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'subscription_id', 'status', 'attempts', 'stripe_created', 'processed_at']
+    list_filter = ['status', 'type']
+    search_fields = ['event_id', 'subscription_id']
+    readonly_fields = [f.name for f in StripeWebhookEvent._meta.fields]
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected failed events')
+    def requeue(self, request, queryset):
+        from .webhooks import release_failed
+        count = release_failed(list(queryset.values_list('event_id', flat=True)))
+        self.message_user(request, f"Requeued {count} failed event(s).")
+
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .entitlements import get_entitlements
+
+
+def entitlements(request):
+    """Expose the user's entitlements to templates; resolved only if a template reads them."""
+    return {"entitlements": SimpleLazyObject(lambda: get_entitlements(getattr(request, "user", None)))}
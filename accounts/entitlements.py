@@ -0,0 +1,119 @@
+"""
+What a user's plan entitles them to, resolved once per request.
+
+    ent = get_entitlements(request.user)
+    ent.plan            # "free" | "premium" | "pro"
+    ent.subscription    # active UserSubscription (with plan) or None
+    ent.has("programs")
+
+The first call in a request memoizes the result on the user object, so
+views, templates (via the `entitlements` context processor), decorators and
+CustomUser.current_subscription share one lookup. Behind the memo sits a
+per-user cached copy (myapp/cache.py). It is dropped when a UserSubscription
+is saved or deleted (signals), when a Stripe webhook handler touches a
+subscription, and when the subscription period it was built from runs out.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import FrozenSet, Optional
+
+from django.utils import timezone
+
+from myapp.cache import cached_per_user, invalidate_user
+
+MEMO_ATTR = "_entitlements"
+
+# Mirrors the plan comparison in accounts/subscriptions.py
+BASE_FEATURES = frozenset({"practice_test_generation", "flashcard_generation", "essay_feedback", "chatbot"})
+PLAN_ENTITLEMENTS = {
+    "free": {
+        "credit_allowance": 10_000, "credit_period": "day", "program_limit": 0,
+        "features": BASE_FEATURES,
+    },
+    "premium": {
+        "credit_allowance": 300_000, "credit_period": "month", "program_limit": 3,
+        "features": BASE_FEATURES | {"progress_tracking", "programs"},
+    },
+    "pro": {
+        "credit_allowance": 1_000_000, "credit_period": "month", "program_limit": None,  # unlimited
+        "features": BASE_FEATURES | {"progress_tracking", "programs", "early_access"},
+    },
+}
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    plan: str = "free"
+    plan_name: str = "Free"
+    subscription: Optional[object] = None
+    expires_at: Optional[datetime] = None
+    credit_allowance: int = PLAN_ENTITLEMENTS["free"]["credit_allowance"]
+    credit_period: str = PLAN_ENTITLEMENTS["free"]["credit_period"]
+    program_limit: Optional[int] = PLAN_ENTITLEMENTS["free"]["program_limit"]
+    features: FrozenSet[str] = field(default=PLAN_ENTITLEMENTS["free"]["features"])
+
+    @property
+    def is_paid(self) -> bool:
+        return self.subscription is not None
+
+    @property
+    def is_current(self) -> bool:
+        return self.expires_at is None or self.expires_at > timezone.now()
+
+    def has(self, feature: str) -> bool:
+        return feature in self.features
+
+
+FREE = Entitlements()
+
+
+def build_entitlements(subscription) -> Entitlements:
+    if subscription is None:
+        return FREE
+    plan = subscription.plan.name.lower()
+    allowances = PLAN_ENTITLEMENTS.get(plan, PLAN_ENTITLEMENTS["free"])
+    return Entitlements(
+        plan=plan,
+        plan_name=subscription.plan.name,
+        subscription=subscription,
+        expires_at=subscription.end_date,
+        **allowances,
+    )
+
+
+@cached_per_user("entitlements", timeout=900)
+def _resolve(user) -> Entitlements:
+    from .models import UserSubscription
+
+    subscription = (
+        UserSubscription.objects.filter(user=user, is_active=True, end_date__gt=timezone.now())
+        .select_related("plan")
+        .order_by("-created_at", "-pk")  # the newest, as current_subscription always returned
+        .first()
+    )
+    return build_entitlements(subscription)
+
+
+def get_entitlements(user) -> Entitlements:
+    """The user's entitlements, memoized on the user object for the rest of the request."""
+    if user is None or not user.is_authenticated:
+        return FREE
+
+    memo = getattr(user, MEMO_ATTR, None)
+    if memo is not None and memo.is_current:
+        return memo
+
+    entitlements = _resolve(user)
+    if not entitlements.is_current:  # cached copy outlived the subscription period
+        invalidate_user(user)
+        entitlements = _resolve(user)
+    setattr(user, MEMO_ATTR, entitlements)
+    return entitlements
+
+
+def invalidate_entitlements(user):
+    """Drop the cached entitlements for a user (instance or id)."""
+    invalidate_user(user)
+    if hasattr(user, MEMO_ATTR):
+        delattr(user, MEMO_ATTR)
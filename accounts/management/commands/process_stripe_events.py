@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from accounts.webhooks import process_due, release_failed
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply stored Stripe webhook events in order per subscription, retrying failures "
+        "with backoff (see accounts/webhooks.py). Runs until stopped unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process the events that are due now and exit")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when nothing is due")
+        parser.add_argument("--batch", type=int, default=100, help="Events to pick up per pass")
+        parser.add_argument("--retry-failed", nargs="*", metavar="EVENT_ID",
+                            help="Requeue failed events (all, or these Stripe event ids) before starting")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"] is not None:
+            requeued = release_failed(options["retry_failed"] or None)
+            self.stdout.write(f"Requeued {requeued} failed event(s).")
+
+        if options["once"]:
+            handled = process_due(options["batch"])
+            self.stdout.write(self.style.SUCCESS(f"Processed {handled} event(s)."))
+            return
+
+        self.stdout.write(f"Processing Stripe events every {options['interval']}s (Ctrl+C to stop)")
+        try:
+            while True:
+                if not process_due(options["batch"]):
+                    connections.close_all()
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
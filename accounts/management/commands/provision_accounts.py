@@ -0,0 +1,52 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.provisioning import provision_accounts
+
+
+class Command(BaseCommand):
+    help = (
+        "Create accounts in bulk from a CSV with an 'email' column and optional 'password', "
+        "'first_name', 'last_name' and 'username' columns (see accounts/provisioning.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file", help="CSV file with a header row")
+        parser.add_argument("--output", help="Write email,username,password for the created accounts here "
+                                             "(needed to hand out generated passwords)")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Processes used to hash passwords (0 = hash in this process)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per INSERT")
+        parser.add_argument("--mark-verified", action="store_true", help="Mark the new accounts' emails as verified")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["csv_file"], newline="", encoding="utf-8-sig") as f:
+                reader = csv.DictReader(f)
+                if "email" not in (reader.fieldnames or []):
+                    raise CommandError("The CSV needs an 'email' column.")
+                rows = list(reader)
+        except OSError as e:
+            raise CommandError(f"Could not read {options['csv_file']}: {e}")
+
+        if not options["output"] and any(not (row.get("password") or "").strip() for row in rows):
+            raise CommandError("Some rows have no password; pass --output to record the generated ones.")
+
+        result = provision_accounts(
+            rows, workers=options["workers"], batch_size=options["batch_size"],
+            mark_verified=options["mark_verified"],
+        )
+
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["email", "username", "password"])
+                writer.writerows(result.created)
+
+        for email, reason in result.skipped:
+            self.stderr.write(f"Skipped {email or '<blank>'}: {reason}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(result.created)} account(s), skipped {len(result.skipped)}."
+        ))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_subscriptionplan_non_features_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('type', models.CharField(max_length=100)),
+                ('subscription_id', models.CharField(blank=True, db_index=True, max_length=100, null=True)),
+                ('payload', models.JSONField()),
+                ('stripe_created', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['stripe_created', 'id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='accounts_st_status_997e0d_idx')],
+            },
+        ),
+    ]
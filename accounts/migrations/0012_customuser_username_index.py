@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_stripewebhookevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='username',
+            field=models.CharField(blank=True, db_index=True, max_length=150, null=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import re
 from decimal import Decimal
 from django.db import models
 from django.contrib.auth.models import AbstractUser
@@ -33,10 +34,28 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def usernames_like(self, base):
+        """Usernames of the form base, base1, base2... in one query (an index range scan over the prefix)."""
+        return set(
+            self.filter(username__gte=base, username__lt=base + chr(0x10FFFF))
+            .filter(username__regex=rf"^{re.escape(base)}[0-9]*$")
+            .values_list("username", flat=True)
+        )
+
+    @staticmethod
+    def next_free_username(base, taken):
+        """The first of base, base1, base2... that isn't in `taken`."""
+        if base not in taken:
+            return base
+        counter = 1
+        while f"{base}{counter}" in taken:
+            counter += 1
+        return f"{base}{counter}"
+
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
-    username = models.CharField(max_length=150, blank=True, null=True)
+    username = models.CharField(max_length=150, blank=True, null=True, db_index=True)
     points = models.IntegerField(default=0)
     ai_credits = models.IntegerField(default=10000)
     is_email_verified = models.BooleanField(default=False)
@@ -57,15 +76,8 @@ class CustomUser(AbstractUser):
         if self.username:
             return
         base_username = self.email.split('@')[0]
-        username = base_username
-        counter = 1
-        while self.__class__.objects.filter(username=username).exists() and counter < 10000:
-            username = f"{base_username}{counter}"
-            counter += 1
-        if counter >= 10000:
-            import uuid
-            username = f"user_{uuid.uuid4().hex[:8]}"
-        self.username = username
+        manager = self.__class__.objects
+        self.username = manager.next_free_username(base_username, manager.usernames_like(base_username))
 
     def create_stripe_customer(self):
         """Create or return existing Stripe customer ID"""
@@ -83,11 +95,9 @@ class CustomUser(AbstractUser):
 
     @property
     def current_subscription(self):
-        """Get active subscription"""
-        return self.usersubscription_set.filter(
-            is_active=True, 
-            end_date__gt=timezone.now()
-        ).first()
+        """Get active subscription (resolved once per request, see accounts/entitlements.py)"""
+        from .entitlements import get_entitlements
+        return get_entitlements(self).subscription
 
     def save(self, *args, **kwargs):
         if not self.username:
@@ -159,4 +169,37 @@ class UserSubscription(models.Model):
         return self.is_active and self.end_date > timezone.now()
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class StripeWebhookEvent(models.Model):
+    """A verified Stripe webhook event, queued for process_stripe_events (see accounts/webhooks.py)."""
+
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    subscription_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    payload = models.JSONField()
+    stripe_created = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.event_id} ({self.type}, {self.status})"
+
+    class Meta:
+        ordering = ['stripe_created', 'id']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
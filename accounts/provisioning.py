@@ -0,0 +1,117 @@
+"""
+Bulk account provisioning (e.g. a school enrolling a whole year group).
+
+    result = provision_accounts(rows, workers=4)
+
+`rows` are dicts with an "email" and optionally "password", "first_name",
+"last_name" and "username". Rows without a password get a random one, which
+is returned in result.created so it can be handed out. Emails that already
+have an account, or that repeat within the file, are skipped.
+
+Passwords are hashed in a process pool, since the configured hasher is
+deliberately slow and runs on one core per process. Accounts are then
+inserted with bulk_create, one statement per batch. Usernames are allocated
+with one query per distinct email prefix rather than one per candidate.
+bulk_create bypasses CustomUser.save() and post_save signals, so usernames
+are set here and no Profile rows are created (settings_page creates them on
+first visit).
+"""
+
+import secrets
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import CustomUser
+
+
+@dataclass
+class ProvisioningResult:
+    created: List[Tuple[str, str, str]] = field(default_factory=list)  # (email, username, password)
+    skipped: List[Tuple[str, str]] = field(default_factory=list)       # (email, reason)
+
+
+def _init_worker():
+    # Spawned (non-fork) workers start without the app registry
+    django.setup()
+
+
+def hash_passwords(passwords: List[str], workers: int = 0) -> List[str]:
+    """make_password() for each password, across `workers` processes (0 = in this process)."""
+    if workers <= 0 or len(passwords) < 2:
+        return [make_password(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def allocate_usernames(emails: Iterable[str], requested: Dict[str, str] = None) -> Dict[str, str]:
+    """email -> a free username, with one query per distinct email prefix (or requested name)."""
+    requested = requested or {}
+    by_base = defaultdict(list)
+    for email in emails:
+        by_base[requested.get(email) or email.split("@")[0]].append(email)
+
+    usernames = {}
+    for base, base_emails in by_base.items():
+        taken = CustomUser.objects.usernames_like(base)
+        for email in base_emails:
+            username = CustomUser.objects.next_free_username(base, taken)
+            taken.add(username)
+            usernames[email] = username
+    return usernames
+
+
+def provision_accounts(rows: Iterable[dict], workers: int = 0, batch_size: int = 500,
+                       mark_verified: bool = False) -> ProvisioningResult:
+    result = ProvisioningResult()
+
+    accounts = {}
+    for row in rows:
+        email = CustomUser.objects.normalize_email((row.get("email") or "").strip())
+        if not email or "@" not in email:
+            result.skipped.append((email, "invalid email"))
+        elif email.lower() in accounts:
+            result.skipped.append((email, "duplicate in file"))
+        else:
+            accounts[email.lower()] = {**row, "email": email}
+
+    existing = set()
+    emails = [row["email"] for row in accounts.values()]
+    for start in range(0, len(emails), batch_size):
+        existing.update(
+            e.lower() for e in
+            CustomUser.objects.filter(email__in=emails[start:start + batch_size]).values_list("email", flat=True)
+        )
+    for key in existing & accounts.keys():
+        result.skipped.append((accounts.pop(key)["email"], "already exists"))
+
+    rows = list(accounts.values())
+    passwords = [(row.get("password") or "").strip() or secrets.token_urlsafe(9) for row in rows]
+    hashes = hash_passwords(passwords, workers)
+
+    with transaction.atomic():
+        usernames = allocate_usernames(
+            [row["email"] for row in rows],
+            {row["email"]: row["username"].strip() for row in rows if (row.get("username") or "").strip()},
+        )
+        users = [
+            CustomUser(
+                email=row["email"],
+                username=usernames[row["email"]],
+                first_name=(row.get("first_name") or "").strip(),
+                last_name=(row.get("last_name") or "").strip(),
+                password=password_hash,
+                is_email_verified=mark_verified,
+            )
+            for row, password_hash in zip(rows, hashes)
+        ]
+        CustomUser.objects.bulk_create(users, batch_size=batch_size)
+
+    result.created = [(user.email, user.username, password) for user, password in zip(users, passwords)]
+    return result
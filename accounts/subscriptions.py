@@ -92,6 +92,7 @@ def get_subscription_features():
 from functools import wraps
 from django.shortcuts import redirect
 from django.urls import reverse
+from .entitlements import get_entitlements
 
 def subscription_required(view_func):
     """Decorator to ensure the user has an active subscription."""
@@ -99,14 +100,30 @@ def subscription_required(view_func):
     def _wrapped_view(request, *args, **kwargs):
         # Redirect to login if user is not authenticated
         if not request.user.is_authenticated:
-            login_url = reverse('accounts:login')
+            login_url = reverse('accounts:login_view')
             return redirect(f"{login_url}?next={request.path}")
 
-        # Check if the user has a subscription and if it's active
-        subscription = getattr(request.user, "subscription", None)
-        if not subscription or not subscription.is_active:
+        # Check if the user has an active paid subscription
+        if not get_entitlements(request.user).is_paid:
             return redirect(reverse("accounts:subscriptions"))
 
         # Otherwise, proceed with the view
         return view_func(request, *args, **kwargs)
     return _wrapped_view
+
+
+def feature_required(feature):
+    """Decorator to ensure the user's plan includes `feature` (see PLAN_ENTITLEMENTS)."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                login_url = reverse('accounts:login_view')
+                return redirect(f"{login_url}?next={request.path}")
+
+            if not get_entitlements(request.user).has(feature):
+                return redirect(reverse("accounts:subscriptions"))
+
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
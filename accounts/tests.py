@@ -1,3 +1,181 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .entitlements import get_entitlements, invalidate_entitlements
+from .models import CustomUser, StripeWebhookEvent, SubscriptionPlan, UserSubscription
+from .subscriptions import feature_required, subscription_required
+from .webhooks import process_due
+
+
+class EntitlementsTests(TestCase):
+    # cache versions are bumped on commit, which TestCase only runs when asked to
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = CustomUser.objects.create_user(username="ent", email="ent@example.com", password="pw")
+        self.plan = SubscriptionPlan.objects.create(
+            name="Premium", stripe_price_id="price_premium", duration_days=30, price=10,
+        )
+
+    def subscribe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sub = UserSubscription.objects.create(
+                user=self.user, plan=self.plan, end_date=timezone.now() + timedelta(days=30),
+            )
+            invalidate_entitlements(self.user)
+        return sub
+
+    def test_resolved_once_per_request(self):
+        self.subscribe()
+        with self.assertNumQueries(1):
+            ent = get_entitlements(self.user)
+            self.assertEqual(ent.plan, "premium")
+            self.assertEqual(self.user.current_subscription.plan.name, "Premium")
+            self.assertTrue(get_entitlements(self.user).has("programs"))
+
+        # a fresh user object (next request) reads the cached copy
+        with self.assertNumQueries(0):
+            self.assertEqual(get_entitlements(CustomUser(pk=self.user.pk)).plan, "premium")
+
+    def test_invalidated_when_subscription_changes(self):
+        self.assertFalse(get_entitlements(self.user).is_paid)
+        sub = self.subscribe()
+        self.assertEqual(get_entitlements(self.user).plan, "premium")
+
+        sub.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            sub.save()  # post_save signal drops the cached copy
+        self.assertEqual(get_entitlements(CustomUser.objects.get(pk=self.user.pk)).plan, "free")
+
+    def test_newest_active_subscription_wins(self):
+        self.subscribe()
+        pro = SubscriptionPlan.objects.create(name="Pro", stripe_price_id="price_pro", duration_days=30, price=20)
+        with self.captureOnCommitCallbacks(execute=True):  # upgraded; the old one is still active
+            UserSubscription.objects.create(user=self.user, plan=pro, end_date=timezone.now() + timedelta(days=30))
+        user = CustomUser.objects.get(pk=self.user.pk)
+        self.assertEqual(get_entitlements(user).plan, "pro")
+        self.assertEqual(user.current_subscription.plan, pro)
+
+    def test_gating_decorators(self):
+        view = subscription_required(lambda request: HttpResponse("ok"))
+        early = feature_required("early_access")(lambda request: HttpResponse("ok"))
+        request = RequestFactory().get("/gated/")
+        request.user = AnonymousUser()
+        self.assertTrue(view(request).url.startswith("/accounts/login-page/"))
+
+        request.user = self.user
+        self.assertEqual(view(request).status_code, 302)
+        self.subscribe()
+        self.assertEqual(view(request).status_code, 200)
+        self.assertEqual(early(request).status_code, 302)  # premium has no early access
+
+
+class StripeWebhookQueueTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = CustomUser.objects.create_user(
+                username="payer", email="payer@example.com", password="pw", stripe_customer_id="cus_1",
+            )
+        self.plan = SubscriptionPlan.objects.create(
+            name="Pro", stripe_price_id="price_pro", duration_days=30, price=20,
+        )
+        self.period_end = int((timezone.now() + timedelta(days=14)).timestamp())
+
+    def event(self, event_id, type, obj, created):
+        return {"id": event_id, "type": type, "created": created, "data": {"object": obj}}
+
+    def post(self, event):
+        with patch("stripe.Webhook.construct_event"):
+            return self.client.post(
+                reverse("accounts:stripe_webhook"), json.dumps(event), content_type="application/json",
+                HTTP_STRIPE_SIGNATURE="t=1,v1=sig",
+            )
+
+    def test_webhook_stores_each_event_once_and_defers_processing(self):
+        invoice = self.event("evt_1", "invoice.payment_failed", {"subscription": "sub_1"}, 100)
+        self.assertEqual(self.post(invoice).status_code, 200)
+        self.assertEqual(self.post(invoice).status_code, 200)  # Stripe retry
+
+        stored = StripeWebhookEvent.objects.get()
+        self.assertEqual((stored.event_id, stored.subscription_id, stored.status), ("evt_1", "sub_1", "pending"))
+
+    def test_worker_applies_events_from_payload_in_order(self):
+        self.post(self.event("evt_checkout", "checkout.session.completed", {
+            "subscription": "sub_1", "customer": "cus_1", "metadata": {"plan_id": str(self.plan.pk)},
+        }, created=200))
+        self.post(self.event("evt_invoice", "invoice.payment_succeeded", {
+            "subscription": "sub_1", "customer": "cus_1",
+            "lines": {"data": [{"price": {"id": "price_pro"}, "period": {"end": self.period_end}}]},
+        }, created=100))
+
+        with patch("stripe.Subscription.retrieve", side_effect=AssertionError("no API call expected")), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_due(), 2)
+
+        sub = UserSubscription.objects.get(stripe_subscription_id="sub_1")
+        self.assertEqual((sub.user, sub.plan, sub.is_active), (self.user, self.plan, True))
+        self.assertEqual(int(sub.end_date.timestamp()), self.period_end)
+        self.assertFalse(StripeWebhookEvent.objects.exclude(status=StripeWebhookEvent.DONE).exists())
+        self.assertEqual(get_entitlements(CustomUser.objects.get(pk=self.user.pk)).plan, "pro")
+
+    def test_failed_event_backs_off_and_holds_later_events_for_its_subscription(self):
+        self.post(self.event("evt_a", "customer.subscription.updated", {"id": "sub_1", "status": "active"}, 100))
+        self.post(self.event("evt_b", "invoice.payment_failed", {"subscription": "sub_1"}, 200))
+        UserSubscription.objects.create(
+            user=self.user, plan=self.plan, stripe_subscription_id="sub_1", end_date=timezone.now(),
+        )
+
+        # evt_a has no current_period_end, so its handler raises
+        with self.assertLogs("accounts.webhooks", "WARNING"):
+            self.assertEqual(process_due(), 1)
+        first, second = StripeWebhookEvent.objects.all()
+        self.assertEqual((first.status, first.attempts), ("pending", 1))
+        self.assertGreater(first.next_attempt_at, timezone.now())
+        self.assertEqual(second.status, "pending")
+        self.assertEqual(process_due(), 0)  # evt_b waits behind evt_a's retry
+
+
+class UsernameAllocationTests(TestCase):
+    def test_next_free_suffix_in_one_query(self):
+        for username in ["john", "john1", "john2", "johnny", "john4"]:
+            CustomUser.objects.create_user(username=username, email=f"{username}@old.example.com", password="pw")
+
+        user = CustomUser(email="john@example.com")
+        with self.assertNumQueries(1):
+            user.generate_username()
+        self.assertEqual(user.username, "john3")
+
+    def test_provision_accounts_from_csv(self):
+        CustomUser.objects.create_user(email="taken@school.example.com", password="pw")
+        with tempfile.TemporaryDirectory() as tmp:
+            source, output = os.path.join(tmp, "pupils.csv"), os.path.join(tmp, "created.csv")
+            with open(source, "w") as f:
+                f.write("email,first_name,password\n"
+                        "ada@school.example.com,Ada,\n"
+                        "ada@other.example.com,Ada,secret-pw\n"
+                        "taken@school.example.com,Taken,\n"
+                        "ADA@school.example.com,Dup,\n")
+            call_command("provision_accounts", source, output=output, workers=2, stdout=io.StringIO(),
+                         stderr=io.StringIO())
+
+            with open(output) as f:
+                created = {row["email"]: row for row in csv.DictReader(f)}
+
+        self.assertEqual(set(created), {"ada@school.example.com", "ada@other.example.com"})
+        self.assertEqual(created["ada@school.example.com"]["username"], "ada")
+        self.assertEqual(created["ada@other.example.com"]["username"], "ada1")
+        user = CustomUser.objects.get(email="ada@other.example.com")
+        self.assertTrue(user.check_password("secret-pw"))
+        self.assertTrue(CustomUser.objects.get(email="ada@school.example.com")
+                        .check_password(created["ada@school.example.com"]["password"]))
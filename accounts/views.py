@@ -1,5 +1,5 @@
 # accounts/views.py
-import traceback
+import logging
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, update_session_auth_hash, get_user_model
 from django.contrib.auth.forms import PasswordChangeForm
@@ -14,6 +14,11 @@ from .forms import SignUpForm, LoginForm, UserForm, ProfileForm
 from .models import Profile
 from django.contrib.auth import logout
 from .subscriptions import get_subscription_features
+from .entitlements import get_entitlements
+from .webhooks import record_event
+from myapp import instrumentation, metrics
+
+logger = logging.getLogger(__name__)
 
 import random
 
@@ -150,13 +155,14 @@ def settings_page(request):
             else:
                 messages.error(request, "Please correct the errors below.")
 
+    entitlements = get_entitlements(user)
     context = {
         "user_form": user_form,
         "profile_form": profile_form,
         "pwd_form": pwd_form,
         "ai_credits": user.ai_credits,
-        "current_plan": user.current_subscription.plan.name if user.current_subscription else "Free",
-        "plan_end": user.current_subscription.end_date if user.current_subscription else None,
+        "current_plan": entitlements.plan_name,
+        "plan_end": entitlements.expires_at,
     }
 
     return render(request, "accounts/settings.html", context)
@@ -189,6 +195,7 @@ def verify_email(request, uidb64, token):
 
 import stripe
 import json
+import time
 from django.conf import settings
 from django.shortcuts import render, get_object_or_404, reverse
 from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
@@ -203,8 +210,8 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 
 @login_required
 def subscriptions(request):
-    plans = SubscriptionPlan.objects.all()
-    current_sub = request.user.current_subscription
+    plans = list(SubscriptionPlan.objects.all())
+    current_sub = get_entitlements(request.user).subscription
 
     # Determine if user already had a free trial
     # (You can check if they ever had a subscription of a paid plan)
@@ -213,13 +220,14 @@ def subscriptions(request):
         plan__name__in=['Premium', 'Pro']
     ).exists()
 
-    monthly_plans = plans.filter(duration_days=30)
-    yearly_plans = plans.filter(duration_days=365)
-
     for plan in plans:
         plan.features_list = [f.strip() for f in plan.features.split(',')] if plan.features else []
         plan.non_features_list = [f.strip() for f in plan.non_features.split(',')] if plan.non_features else []
 
+    # Split in Python so the feature lists above survive (and plans are fetched once)
+    monthly_plans = [plan for plan in plans if plan.duration_days == 30]
+    yearly_plans = [plan for plan in plans if plan.duration_days == 365]
+
     context = {
         'monthly_plans': monthly_plans,
         'yearly_plans': yearly_plans,
@@ -270,16 +278,13 @@ def create_checkout_session(request, plan_id):
             },
         )
 
-        print("[DEBUG] Checkout session successfully created.")
-        print(f"[DEBUG] Session ID: {session.id}")
-        print("=== Stripe Checkout Session Debug End ===\n")
+        instrumentation.event("stripe.checkout_session_created", session_id=session.id, plan_id=plan.id)
 
         return JsonResponse({'sessionId': session.id})
 
     except Exception as e:
-        print("\n❌ Stripe Checkout Error:", str(e))
-        print(traceback.format_exc())
-        print("=== Stripe Checkout Session Debug End (ERROR) ===\n")
+        instrumentation.event("stripe.checkout_session_failed", plan_id=plan_id, error=str(e))
+        logger.exception(f"Stripe checkout session for plan {plan_id} failed: {e}")
         return JsonResponse({'error': str(e)}, status=400)
 
 
@@ -306,113 +311,33 @@ def checkout_cancel(request):
 
 @csrf_exempt
 def stripe_webhook(request):
-    """Handle Stripe webhook events"""
+    """Verify and store a Stripe webhook event; process_stripe_events applies it (see accounts/webhooks.py)"""
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE', '')
     
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
+        stripe.Webhook.construct_event(
+            payload, sig_header, settings.STRIPE_WEBHOOK_KEY
         )
     except ValueError:
         return HttpResponseBadRequest('Invalid payload')
     except stripe.error.SignatureVerificationError:
         return HttpResponseBadRequest('Invalid signature')
 
-    event_type = event['type']
-    data = event['data']['object']
-
-    # Handle checkout completion
-    if event_type == 'checkout.session.completed':
-        handle_checkout_completed(data)
-    
-    # Handle successful payment
-    elif event_type == 'invoice.payment_succeeded':
-        handle_payment_succeeded(data)
-    
-    # Handle failed payment
-    elif event_type == 'invoice.payment_failed':
-        handle_payment_failed(data)
-    
-    # Handle subscription updates/deletions
-    elif event_type in ('customer.subscription.deleted', 'customer.subscription.updated'):
-        handle_subscription_changed(data)
+    event = json.loads(payload)
+    metrics.STRIPE_WEBHOOK_EVENTS.labels(type=event['type']).inc()
+    if event.get('created'):
+        metrics.STRIPE_WEBHOOK_LAG_SECONDS.observe(max(0, time.time() - event['created']))
 
+    record_event(event)
     return HttpResponse(status=200)
 
 
-def handle_checkout_completed(session):
-    """Process completed checkout session"""
-    stripe_sub_id = session.get('subscription')
-    stripe_customer_id = session.get('customer')
-
-    if stripe_sub_id:
-        sub = stripe.Subscription.retrieve(stripe_sub_id)
-        price_id = sub['items']['data'][0]['price']['id']
-        
-        plan = SubscriptionPlan.objects.filter(stripe_price_id=price_id).first()
-        user = CustomUser.objects.filter(stripe_customer_id=stripe_customer_id).first()
-        
-        if user and plan:
-            UserSubscription.objects.update_or_create(
-                stripe_subscription_id=stripe_sub_id,
-                defaults={
-                    'user': user,
-                    'plan': plan,
-                    'stripe_customer_id': stripe_customer_id,
-                    'is_active': True,
-                    'start_date': timezone.now(),
-                    'end_date': timezone.datetime.fromtimestamp(
-                        sub['current_period_end'], tz=timezone.utc
-                    ),
-                }
-            )
-
-
-def handle_payment_succeeded(invoice):
-    """Process successful payment"""
-    sub_id = invoice.get('subscription')
-    if sub_id:
-        sub = stripe.Subscription.retrieve(sub_id)
-        user_sub = UserSubscription.objects.filter(stripe_subscription_id=sub_id).first()
-        
-        if user_sub:
-            user_sub.is_active = True
-            user_sub.end_date = timezone.datetime.fromtimestamp(
-                sub['current_period_end'], tz=timezone.utc
-            )
-            user_sub.save(update_fields=['is_active', 'end_date'])
-
-
-def handle_payment_failed(invoice):
-    """Process failed payment"""
-    sub_id = invoice.get('subscription')
-    if sub_id:
-        user_sub = UserSubscription.objects.filter(stripe_subscription_id=sub_id).first()
-        if user_sub:
-            user_sub.is_active = False
-            user_sub.save(update_fields=['is_active'])
-
-
-def handle_subscription_changed(subscription):
-    """Process subscription update or deletion"""
-    sub_id = subscription.get('id')
-    user_sub = UserSubscription.objects.filter(stripe_subscription_id=sub_id).first()
-    
-    if user_sub:
-        status = subscription.get('status')
-        user_sub.is_active = status in ('active', 'trialing')
-        user_sub.end_date = timezone.datetime.fromtimestamp(
-            subscription['current_period_end'], tz=timezone.utc
-        )
-        user_sub.save(update_fields=['is_active', 'end_date'])
-
-
 @login_required
 @require_POST
 def cancel_subscription(request):
     """Cancel user's active subscription"""
-    current_sub = request.user.current_subscription
+    current_sub = get_entitlements(request.user).subscription
     
     if not current_sub:
         return JsonResponse({'error': 'No active subscription found'}, status=400)
@@ -426,7 +351,9 @@ def cancel_subscription(request):
         return JsonResponse({'message': 'Subscription will cancel at period end'})
     
     except Exception as e:
-        print("Stripe Checkout Error: ", str(e))
+        instrumentation.event("stripe.subscription_cancel_failed", subscription_id=current_sub.stripe_subscription_id,
+                              error=str(e))
+        logger.exception(f"Cancelling Stripe subscription {current_sub.stripe_subscription_id} failed: {e}")
         return JsonResponse({'error': str(e)}, status=400)
 
 from django.http import JsonResponse
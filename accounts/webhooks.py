@@ -0,0 +1,287 @@
+"""
+Stripe webhook event log and worker.
+
+stripe_webhook (accounts/views.py) only verifies the signature, stores the
+event with record_event() and returns 200. `manage.py process_stripe_events`
+then applies stored events:
+
+- Idempotent. The event id is unique, so a Stripe retry of an event we
+  already have is acknowledged and dropped.
+- Ordered per subscription. An event waits while an earlier event for the
+  same Stripe subscription is still pending or backing off.
+- Retried. A handler error is recorded and the event is tried again after an
+  exponential backoff. After `max_attempts` it is marked failed and left for
+  a human; release_failed() requeues those events.
+
+Handlers read the subscription data carried by the event itself (plan id
+from the checkout metadata, billing period from the invoice line). They only
+call the Stripe API when the payload can't answer.
+"""
+
+import logging
+import random
+import traceback
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from myapp import instrumentation, metrics
+
+from .entitlements import invalidate_entitlements
+from .models import CustomUser, StripeWebhookEvent, SubscriptionPlan, UserSubscription
+
+logger = logging.getLogger(__name__)
+
+
+def _conf():
+    return {
+        "max_attempts": 8,
+        "backoff_base": 30,    # seconds before the first retry, doubled for each later one
+        "backoff_cap": 3600,
+        "lease": 300,          # seconds a claimed event stays with one worker
+        **getattr(settings, "STRIPE_WEBHOOK_QUEUE", {}),
+    }
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc) if value else None
+
+
+def _id(value):
+    """Stripe fields hold either an id or, when expanded, the object itself."""
+    return value.get("id") if isinstance(value, dict) else value
+
+
+# ============================== HANDLERS ==============================
+
+def _subscription_line(invoice):
+    """The invoice line that bills the subscription (carries its price and period)."""
+    for line in (invoice.get("lines") or {}).get("data", []):
+        if line.get("period") and (line.get("price") or {}).get("id"):
+            return line
+    return None
+
+
+def handle_checkout_completed(session):
+    """Process completed checkout session"""
+    stripe_sub = session.get("subscription")
+    stripe_sub_id = _id(stripe_sub)
+    stripe_customer_id = _id(session.get("customer"))
+    if not stripe_sub_id:
+        return
+
+    user = CustomUser.objects.filter(stripe_customer_id=stripe_customer_id).first()
+    if user is None:
+        return
+
+    user_sub = UserSubscription.objects.filter(stripe_subscription_id=stripe_sub_id).first()
+    if user_sub:
+        # The subscription's first invoice arrived first and already recorded the plan and period
+        user_sub.is_active = True
+        user_sub.save(update_fields=["is_active"])
+        invalidate_entitlements(user_sub.user_id)
+        return
+
+    # The session carries our plan id but not the billing period
+    sub = stripe_sub if isinstance(stripe_sub, dict) else stripe.Subscription.retrieve(stripe_sub_id)
+    plan_id = (session.get("metadata") or {}).get("plan_id")
+    plan = SubscriptionPlan.objects.filter(pk=plan_id).first() if plan_id else None
+    if plan is None:
+        price_id = sub["items"]["data"][0]["price"]["id"]
+        plan = SubscriptionPlan.objects.filter(stripe_price_id=price_id).first()
+
+    if plan:
+        UserSubscription.objects.update_or_create(
+            stripe_subscription_id=stripe_sub_id,
+            defaults={
+                "user": user,
+                "plan": plan,
+                "stripe_customer_id": stripe_customer_id,
+                "is_active": True,
+                "start_date": timezone.now(),
+                "end_date": _timestamp(sub["current_period_end"]),
+            },
+        )
+        invalidate_entitlements(user)
+
+
+def handle_payment_succeeded(invoice):
+    """Process successful payment"""
+    sub_id = _id(invoice.get("subscription"))
+    if not sub_id:
+        return
+
+    line = _subscription_line(invoice)
+    user_sub = UserSubscription.objects.filter(stripe_subscription_id=sub_id).first()
+
+    if user_sub is None:
+        # A new subscription's first invoice is sent before checkout.session.completed
+        user = CustomUser.objects.filter(stripe_customer_id=_id(invoice.get("customer"))).first()
+        plan = SubscriptionPlan.objects.filter(stripe_price_id=line["price"]["id"]).first() if line else None
+        if user and plan:
+            UserSubscription.objects.create(
+                user=user,
+                plan=plan,
+                stripe_subscription_id=sub_id,
+                stripe_customer_id=_id(invoice.get("customer")),
+                end_date=_timestamp(line["period"]["end"]),
+            )
+            invalidate_entitlements(user)
+        return
+
+    if line:
+        period_end = _timestamp(line["period"]["end"])
+    else:
+        period_end = _timestamp(stripe.Subscription.retrieve(sub_id)["current_period_end"])
+    user_sub.is_active = True
+    user_sub.end_date = period_end
+    user_sub.save(update_fields=["is_active", "end_date"])
+    invalidate_entitlements(user_sub.user_id)
+
+
+def handle_payment_failed(invoice):
+    """Process failed payment"""
+    sub_id = _id(invoice.get("subscription"))
+    if sub_id:
+        user_sub = UserSubscription.objects.filter(stripe_subscription_id=sub_id).first()
+        if user_sub:
+            user_sub.is_active = False
+            user_sub.save(update_fields=["is_active"])
+            invalidate_entitlements(user_sub.user_id)
+
+
+def handle_subscription_changed(subscription):
+    """Process subscription update or deletion"""
+    sub_id = subscription.get("id")
+    user_sub = UserSubscription.objects.filter(stripe_subscription_id=sub_id).first()
+
+    if user_sub:
+        status = subscription.get("status")
+        user_sub.is_active = status in ("active", "trialing")
+        user_sub.end_date = _timestamp(subscription["current_period_end"])
+        user_sub.save(update_fields=["is_active", "end_date"])
+        invalidate_entitlements(user_sub.user_id)
+
+
+# event type -> (handler, how to find the Stripe subscription id in data.object)
+HANDLERS = {
+    "checkout.session.completed": (handle_checkout_completed, lambda obj: _id(obj.get("subscription"))),
+    "invoice.payment_succeeded": (handle_payment_succeeded, lambda obj: _id(obj.get("subscription"))),
+    "invoice.payment_failed": (handle_payment_failed, lambda obj: _id(obj.get("subscription"))),
+    "customer.subscription.updated": (handle_subscription_changed, lambda obj: obj.get("id")),
+    "customer.subscription.deleted": (handle_subscription_changed, lambda obj: obj.get("id")),
+}
+
+
+# =============================== QUEUE ===============================
+
+def record_event(event: dict):
+    """
+    Store a verified event for the worker. Returns the new StripeWebhookEvent,
+    or None for event types we don't handle and for events already stored.
+    """
+    if event["type"] not in HANDLERS:
+        return None
+    _, subscription_of = HANDLERS[event["type"]]
+    try:
+        with transaction.atomic():
+            return StripeWebhookEvent.objects.create(
+                event_id=event["id"],
+                type=event["type"],
+                subscription_id=subscription_of(event["data"]["object"]),
+                payload=event,
+                stripe_created=_timestamp(event.get("created")) or timezone.now(),
+            )
+    except IntegrityError:  # Stripe redelivered an event we already have
+        metrics.STRIPE_WEBHOOK_DUPLICATES.inc()
+        return None
+
+
+def backoff(attempts: int) -> float:
+    """Seconds to wait before retry number `attempts`, with up to 10% jitter."""
+    conf = _conf()
+    delay = min(conf["backoff_base"] * 2 ** (attempts - 1), conf["backoff_cap"])
+    return delay * random.uniform(1.0, 1.1)
+
+
+def _blocked_subscriptions(now):
+    """subscription id -> (stripe_created, pk) of its earliest event that isn't due yet."""
+    blocked = {}
+    waiting = (
+        StripeWebhookEvent.objects
+        .filter(status__in=[StripeWebhookEvent.PENDING, StripeWebhookEvent.PROCESSING], next_attempt_at__gt=now)
+        .exclude(subscription_id=None)
+        .values_list("subscription_id", "stripe_created", "pk")
+    )
+    for sub_id, created, pk in waiting:
+        if sub_id not in blocked or (created, pk) < blocked[sub_id]:
+            blocked[sub_id] = (created, pk)
+    return blocked
+
+
+def _claim(event, now) -> bool:
+    """Take the event for this worker; False if another worker got there first."""
+    return bool(
+        StripeWebhookEvent.objects
+        .filter(pk=event.pk, status=event.status, next_attempt_at=event.next_attempt_at)
+        .update(status=StripeWebhookEvent.PROCESSING, next_attempt_at=now + timedelta(seconds=_conf()["lease"]))
+    )
+
+
+def process_event(event: StripeWebhookEvent) -> bool:
+    """Run the handler for one claimed event and record the outcome. Returns True on success."""
+    handler, _ = HANDLERS[event.type]
+    event.attempts += 1
+    try:
+        with transaction.atomic():
+            handler(event.payload["data"]["object"])
+    except Exception as e:
+        failed = event.attempts >= _conf()["max_attempts"]
+        event.status = StripeWebhookEvent.FAILED if failed else StripeWebhookEvent.PENDING
+        event.next_attempt_at = timezone.now() + timedelta(seconds=backoff(event.attempts))
+        event.last_error = traceback.format_exc()
+        event.save(update_fields=["status", "attempts", "next_attempt_at", "last_error"])
+        metrics.STRIPE_WEBHOOK_PROCESSED.labels(type=event.type, outcome="failed" if failed else "retry").inc()
+        instrumentation.event("stripe.webhook_failed", event_id=event.event_id, type=event.type,
+                              attempts=event.attempts, error=str(e))
+        logger.warning(f"Stripe event {event.event_id} ({event.type}) failed on attempt {event.attempts}: {e}")
+        return False
+
+    event.status = StripeWebhookEvent.DONE
+    event.processed_at = timezone.now()
+    event.last_error = ""
+    event.save(update_fields=["status", "attempts", "processed_at", "last_error"])
+    metrics.STRIPE_WEBHOOK_PROCESSED.labels(type=event.type, outcome="done").inc()
+    return True
+
+
+def process_due(limit: int = 100) -> int:
+    """Process due events in Stripe order, one subscription at a time. Returns how many were handled."""
+    now = timezone.now()
+    blocked = _blocked_subscriptions(now)
+    due = StripeWebhookEvent.objects.filter(
+        status__in=[StripeWebhookEvent.PENDING, StripeWebhookEvent.PROCESSING], next_attempt_at__lte=now,
+    ).order_by("stripe_created", "pk")[:limit]
+
+    handled = 0
+    for event in due:
+        sub_id = event.subscription_id
+        if sub_id in blocked and blocked[sub_id] < (event.stripe_created, event.pk):
+            continue  # an earlier event for this subscription hasn't gone through yet
+        if not _claim(event, now):
+            continue
+        handled += 1
+        if not process_event(event) and sub_id:
+            blocked[sub_id] = (event.stripe_created, event.pk)
+    return handled
+
+
+def release_failed(event_ids=None) -> int:
+    """Requeue failed events (all of them, or the given Stripe event ids) with a fresh retry budget."""
+    failed = StripeWebhookEvent.objects.filter(status=StripeWebhookEvent.FAILED)
+    if event_ids is not None:
+        failed = failed.filter(event_id__in=event_ids)
+    return failed.update(status=StripeWebhookEvent.PENDING, attempts=0, next_attempt_at=timezone.now())
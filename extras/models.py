@@ -28,6 +28,7 @@ class Program(models.Model):
     icon = models.CharField(max_length=100, blank=True)
 
     def get_duration(self):
+        # count() reads the prefetched weeks when the queryset used prefetch_related('weeks')
         return self.weeks.count()
 
     def __str__(self):
@@ -1,3 +1,38 @@
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from accounts.models import CustomUser
+from myapp.models import PracticeTest
+
+from .models import Activity, Program, ProgramWeek
+
+
+class ProgramsPageTests(TestCase):
+
+    def test_lists_programs_with_duration(self):
+        for i in range(3):
+            program = Program.objects.create(title=f"Program {i}")
+            for week in range(1, 3):
+                ProgramWeek.objects.create(program=program, week_number=week)
+        self.client.force_login(CustomUser.objects.create_user(email="p@example.com", password="pw"))
+
+        with self.assertNumQueries(5):  # session, user, programs, weeks, activities
+            response = self.client.get(reverse("extras:programs"))
+        self.assertContains(response, "2 weeks", count=3)
+
+    def test_duplicate_copies_weeks_and_activities(self):
+        user = CustomUser.objects.create_user(email="d@example.com", password="pw")
+        test = PracticeTest.objects.create(title="Week 1 quiz", owner=user)
+        program = Program.objects.create(title="Exam prep")
+        for number in range(1, 4):
+            week = ProgramWeek.objects.create(program=program, week_number=number, title=f"Week {number}")
+            Activity.objects.create(week=week, content_type=ContentType.objects.get_for_model(test), object_id=number)
+        self.client.force_login(user)
+
+        response = self.client.post(reverse("extras:duplicate_program", args=[program.pk]))
+        copy = Program.objects.get(title="Exam prep (copy)")
+        self.assertRedirects(response, reverse("extras:edit_program", args=[copy.pk]), fetch_redirect_response=False)
+        self.assertEqual(list(copy.weeks.values_list("week_number", "title")), [(1, "Week 1"), (2, "Week 2"), (3, "Week 3")])
+        activities = Activity.objects.filter(week__program=copy).order_by("object_id")
+        self.assertEqual(list(activities.values_list("week__week_number", "object_id")), [(1, 1), (2, 2), (3, 3)])
@@ -9,6 +9,7 @@ urlpatterns = [
 
     path("program/new/", views.program_form_view, name="create_program"),
     path("program/<int:pk>/edit/", views.program_form_view, name="edit_program"),
+    path("program/<int:pk>/duplicate/", views.duplicate_program, name="duplicate_program"),
 
     path('chatbot/', views.chatbot, name='chatbot'),
 ]
\ No newline at end of file
@@ -1,28 +1,40 @@
 from django.shortcuts import render, redirect
 from .models import Achievement, UserAchievement
+import copy
 import math
 from .models import Program
 from django.contrib.auth.decorators import login_required
+from myapp.cache import cached_global, cached_per_user
+from myapp.cloning import clone_program
 from myapp.utils import ai_chat_response
 from extras.models import Achievement, UserAchievement
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+@cached_global("achievements", timeout=3600)
+def all_achievements():
+    return list(Achievement.objects.all())
+
+
+@cached_per_user("user_achievements", timeout=3600)
+def unlocked_achievement_ids(user):
+    return set(UserAchievement.objects.filter(user=user).values_list('achievement_id', flat=True))
+
 
 def achievements(request):
     user = request.user
     user_level = math.floor(user.points / 1000) or 0
 
-    # Get all achievements
-    achievements = Achievement.objects.all()
-
     # Optional: if you track which achievements the user has unlocked
-    user_achievements = set(UserAchievement.objects.filter(user=user).values_list('achievement_id', flat=True))
+    user_achievements = unlocked_achievement_ids(user)
 
-    print(f'user: {user}, level: {user_level}, achievements: {user_achievements}')
-
-    # Annotate each achievement with unlocked boolean
-    for ach in achievements:
+    # Annotate each achievement with unlocked boolean (on copies: the cached list is shared)
+    achievements = []
+    for ach in all_achievements():
+        ach = copy.copy(ach)
         # Unlocked if user has enough points OR already has it in UserAchievement
         ach.unlocked = user_level >= ach.required_level or ach.id in user_achievements
+        achievements.append(ach)
 
     # Calculate level and progress toward next level
     progress = (user.points % 1000) / 1000 * 100  # percentage
@@ -37,7 +49,8 @@ def achievements(request):
     return render(request, 'extras/achievements.html', context)
 
 def programs(request):
-    program_objects = Program.objects.all()
+    # weeks/activities are prefetched so get_duration() and the template loops don't query per program
+    program_objects = Program.objects.prefetch_related('weeks__activities')
     return render(request, 'extras/programs/programs.html', {
         'programs': program_objects,
     })
@@ -142,6 +155,15 @@ def program_form_view(request, pk=None):
     )
 
 
+@login_required
+@require_http_methods(["POST"])
+def duplicate_program(request, pk):
+    """Copy a program with its weeks and activities (see myapp/cloning.py) and open the copy for editing."""
+    copy = clone_program(get_object_or_404(Program, pk=pk))
+    messages.success(request, f"Created “{copy.title}”.")
+    return redirect("extras:edit_program", copy.pk)
+
+
 @login_required
 @csrf_exempt
 def chatbot(request):
@@ -156,7 +178,7 @@ def chatbot(request):
     if request.method == "POST":
         prompt = request.POST.get("prompt", "").strip()
         if prompt:
-           ai_response = ai_chat_response(prompt, "You are a helpful assistant who generates text responses to prompts.", user, "gpt-4o", "text") 
+           ai_response = ai_chat_response(prompt, "You are a helpful assistant who generates text responses to prompts.", user, task="chatbot", response_format="text")
 
         
 
@@ -0,0 +1,179 @@
+"""
+Adaptive practice tests assembled from the question bank, without an AI call.
+
+    changes = adaptive.rate_submission(user.pk, rows)   # after grading; {subject: rating change}
+    mastery.add_responses(user.pk, rows, when, changes)
+    test = adaptive.assemble(user, "Algebra", amount=10)
+
+Ratings are Elo: every question has one (Question.rating) and every user has
+one per subject (SubjectMastery.rating), on the same scale. An answer is a
+game the user wins by answering correctly, expected with probability
+    E = 1 / (1 + 10 ** ((question - user) / 400))
+After a submission the user moves by K_USER * (won - E) summed over its
+answers, and each question by K_QUESTION * (E - won). All expectations use
+the ratings from before the submission. The question changes are one UPDATE
+and the user's ride along in the mastery upsert. An answer to an adaptive
+test's copy rates its bank question (Question.source) as well.
+
+Assembly targets questions the user should get right with probability
+ADAPTIVE["target"], i.e. rated 400 * log10(target / (1 - target)) below them.
+The bank is the user's own questions plus those of public catalog originals
+in the subject, without earlier adaptive copies. The nearest ratings on
+both sides come from two range scans of the (subject, rating) index.
+Questions the user got right in the last ADAPTIVE["recent_days"], directly
+or through a copy, are left out, and identical texts (copies) count once.
+The chosen questions are copied into a new private test, keeping their
+ratings and linked to them through Question.source.
+"""
+
+import math
+import random
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Q, Value, When, prefetch_related_objects
+from django.utils import timezone
+
+from .cache import invalidate_user
+from .cloning import copy_questions
+from .mastery import normalize_subject
+from .models import PracticeTest, Question, QuestionResponse, SubjectMastery
+
+SCALE = 400
+
+DEFAULTS = {
+    "k_user": 16,
+    "k_question": 8,
+    "target": 0.7,             # chance the user answers an assembled question correctly
+    "recent_days": 7,
+    "max_questions": 50,
+    "minutes_per_question": 2,
+}
+
+
+def _conf():
+    return {**DEFAULTS, **getattr(settings, "ADAPTIVE", {})}
+
+
+def expected(user_rating: float, question_rating: float) -> float:
+    """Probability that the user answers the question correctly."""
+    return 1 / (1 + 10 ** ((question_rating - user_rating) / SCALE))
+
+
+def user_rating(owner_id, subject: str) -> float:
+    rating = SubjectMastery.objects.filter(owner_id=owner_id, subject=normalize_subject(subject)).values_list(
+        "rating", flat=True).first()
+    return rating if rating is not None else SubjectMastery._meta.get_field("rating").default
+
+
+# ============================== UPDATES ==============================
+
+def rate_submission(owner_id, responses: Iterable) -> Dict[str, float]:
+    """
+    Update the answered questions' ratings for one submission's QuestionResponse
+    rows (with their questions and the questions' sources loaded) and return
+    the user's rating change per subject, for mastery.add_responses.
+    """
+    responses = list(responses)
+    if not responses:
+        return {}
+    conf = _conf()
+    default = SubjectMastery._meta.get_field("rating").default
+    subjects = {normalize_subject(r.subject) for r in responses}
+    ratings = dict(SubjectMastery.objects.filter(owner_id=owner_id, subject__in=subjects)
+                   .values_list("subject", "rating"))
+
+    user_changes = defaultdict(float)
+    question_changes = defaultdict(float)
+    for response in responses:
+        question = response.question
+        rated = question.source if question.source_id else question  # an adaptive copy plays as its original
+        subject = normalize_subject(response.subject)
+        surprise = float(response.is_correct) - expected(ratings.get(subject, default), rated.rating)
+        user_changes[subject] += conf["k_user"] * surprise
+        question_changes[question.pk] -= conf["k_question"] * surprise
+        if question.source_id:
+            question_changes[question.source_id] -= conf["k_question"] * surprise
+
+    # relative to the stored value, so concurrent submissions both count
+    Question.objects.filter(pk__in=question_changes).update(rating=F("rating") + Case(
+        *[When(pk=pk, then=Value(change)) for pk, change in question_changes.items()],
+        output_field=FloatField(),
+    ))
+    return dict(user_changes)
+
+
+# ============================== ASSEMBLY ==============================
+
+def target_rating(rating: float, target: Optional[float] = None) -> float:
+    """Question rating the user beats with probability `target`."""
+    target = target or _conf()["target"]
+    return rating - SCALE * math.log10(target / (1 - target))
+
+
+def bank(user, subject: str):
+    """Questions of the subject the user may draw from: their own and public catalog originals'."""
+    conf = _conf()
+    since = timezone.now() - timedelta(days=conf["recent_days"])
+    recently_right = QuestionResponse.objects.filter(
+        owner=user, subject=subject, answered_at__gte=since, is_correct=True)
+    return (
+        Question.objects.filter(subject=subject, source=None)
+        .filter(Q(practice_test__owner=user) | Q(practice_test__is_public=True, practice_test__copied_from=None))
+        .exclude(pk__in=recently_right.values("question"))
+        .exclude(pk__in=recently_right.exclude(question__source=None).values("question__source"))
+    )
+
+
+def pick(user, subject: str, amount: int, rng: Optional[random.Random] = None) -> List[Question]:
+    """
+    About `amount` distinct questions rated around the user's target, from
+    the 2 * amount nearest on each side, sampled so repeated tests vary.
+    """
+    subject = normalize_subject(subject)
+    target = target_rating(user_rating(user.pk, subject))
+    questions = bank(user, subject)
+    above = list(questions.filter(rating__gte=target).order_by("rating")[:2 * amount])
+    below = list(questions.filter(rating__lt=target).order_by("-rating")[:2 * amount])
+
+    nearest, seen = [], set()
+    for question in sorted(above + below, key=lambda q: abs(q.rating - target)):
+        key = " ".join(question.text.lower().split())
+        if key not in seen:
+            seen.add(key)
+            nearest.append(question)
+    nearest = nearest[:2 * amount]
+    chosen = (rng or random).sample(nearest, min(amount, len(nearest)))
+    return sorted(chosen, key=lambda q: q.rating)  # easiest first
+
+
+def difficulty_label(rating: float) -> str:
+    default = Question._meta.get_field("rating").default
+    if rating < default - 100:
+        return "Easy"
+    return "Medium" if rating < default + 100 else "Hard"
+
+
+def assemble(user, subject: str, amount: int, rng: Optional[random.Random] = None) -> Optional[PracticeTest]:
+    """A new private practice test for `user` in `subject`, or None when the bank has nothing to offer."""
+    conf = _conf()
+    amount = max(1, min(amount, conf["max_questions"]))
+    questions = pick(user, subject, amount, rng)
+    if not questions:
+        return None
+    prefetch_related_objects(questions, "options")
+    subject = normalize_subject(subject)
+    mean_rating = sum(q.rating for q in questions) / len(questions)
+
+    with transaction.atomic():
+        test = PracticeTest.objects.create(
+            owner=user, is_public=False, title=f"Adaptive practice: {subject}"[:200], subject=subject,
+            description=f"{len(questions)} questions picked for your current level.",
+            difficulty=difficulty_label(mean_rating), duration=len(questions) * conf["minutes_per_question"],
+        )
+        copy_questions(questions, test, link_source=True)
+    invalidate_user(user)  # the list page caches per-test question counts
+    return test
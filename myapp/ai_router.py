@@ -0,0 +1,217 @@
+"""
+Latency-aware model routing for AI calls.
+
+Every AI call site names a *task* ("activity", "essay_grading", "chatbot", ...)
+instead of a hard-coded model. Each task has an ordered list of model tiers in
+settings.AI_MODEL_ROUTES. The router keeps rolling latency and error stats per
+model, opens a circuit on a model that keeps failing and fails over to the
+next tier, so a slow or rate-limited model doesn't hold every request hostage.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from . import instrumentation, metrics
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_ROUTER_SETTINGS = {
+    "window": 50,                # rolling samples kept per model
+    "failure_threshold": 3,      # consecutive failures that open the circuit
+    "max_error_rate": 0.5,       # error rate (over the window) that opens the circuit
+    "min_samples": 10,           # samples needed before the error rate is trusted
+    "cooldown_seconds": 30,      # how long a circuit stays open before a trial call
+}
+
+
+class ModelHealth:
+    """Rolling latency/error window and circuit breaker state for one model."""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)  # (latency_ms, ok)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    def percentile(self, pct: float) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        if not latencies:
+            return None
+        index = min(int(round(pct / 100 * (len(latencies) - 1))), len(latencies) - 1)
+        return latencies[index]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def state(self, cooldown: float) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self, cooldown: float) -> bool:
+        """Closed circuits always allow; half-open ones let a single trial call through."""
+        state = self.state(cooldown)
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record(self, latency_ms: float, ok: bool, conf: Dict):
+        self.samples.append((latency_ms, ok))
+        self.trial_in_flight = False
+        if ok:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            return
+
+        self.consecutive_failures += 1
+        too_many_failures = self.consecutive_failures >= conf["failure_threshold"]
+        too_many_errors = (
+            len(self.samples) >= conf["min_samples"]
+            and self.error_rate >= conf["max_error_rate"]
+        )
+        if too_many_failures or too_many_errors or self.opened_at is not None:
+            # a failed half-open trial re-opens the circuit for another cooldown
+            self.opened_at = time.monotonic()
+
+
+class ModelRouter:
+    """Picks a model per task and fails over between tiers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._health: Dict[str, ModelHealth] = {}
+        self.decisions: Counter = Counter()  # (task, model, reason) -> count
+
+    # ---------------------------- configuration ----------------------------
+
+    @property
+    def routes(self) -> Dict:
+        # the route table lives only in settings; an unknown task falls back in candidates()
+        return getattr(settings, "AI_MODEL_ROUTES", {})
+
+    @property
+    def conf(self) -> Dict:
+        return {**DEFAULT_ROUTER_SETTINGS, **getattr(settings, "AI_ROUTER", {})}
+
+    def health(self, model: str) -> ModelHealth:
+        if model not in self._health:
+            self._health[model] = ModelHealth(self.conf["window"])
+        return self._health[model]
+
+    # ------------------------------- routing -------------------------------
+
+    def candidates(self, task: str, prompt_chars: int = 0, plan: str = "free") -> List[Tuple[str, str]]:
+        """Return the ordered (model, reason) tiers to try for a task."""
+        route = self.routes.get(task) or self.routes.get("chatbot") or {"models": ["gpt-4o-mini"]}
+        models, reason = route["models"], "primary"
+
+        small_limit = route.get("small_prompt_chars")
+        if small_limit and prompt_chars and prompt_chars <= small_limit and route.get("small_models"):
+            models, reason = route["small_models"], "small_task"
+        elif plan in route.get("plans", {}):
+            models, reason = route["plans"][plan], f"plan:{plan}"
+
+        ordered = [(model, reason if i == 0 else "fallback") for i, model in enumerate(models)]
+
+        # Demote the first tier when its p95 blows the budget and a later tier is within it
+        budget = route.get("latency_budget_ms")
+        if budget and len(ordered) > 1:
+            with self._lock:
+                first_p95 = self.health(ordered[0][0]).percentile(95)
+                for i, (model, _) in enumerate(ordered[1:], start=1):
+                    p95 = self.health(model).percentile(95)
+                    if first_p95 and first_p95 > budget and p95 is not None and p95 <= budget:
+                        promoted = (model, "latency")
+                        ordered = [promoted] + [m for j, m in enumerate(ordered) if j != i]
+                        break
+
+        return ordered
+
+    def run(self, task: str, call: Callable[[str], object], prompt_chars: int = 0, plan: str = "free"):
+        """
+        Call `call(model)` on the best available tier, failing over on errors.
+        Re-raises the last error if every tier fails.
+        """
+        conf = self.conf
+        tiers = self.candidates(task, prompt_chars, plan)
+        attempted = False
+        last_error: Optional[Exception] = None
+
+        for index, (model, reason) in enumerate(tiers):
+            is_last = index == len(tiers) - 1
+            with self._lock:
+                allowed = self.health(model).allow(conf["cooldown_seconds"])
+            if not allowed and (attempted or not is_last):
+                self._count(task, model, "circuit_open")
+                continue
+
+            attempted = True
+            start = time.monotonic()
+            try:
+                result = call(model)
+            except Exception as exc:
+                latency_ms = (time.monotonic() - start) * 1000
+                with self._lock:
+                    self.health(model).record(latency_ms, False, conf)
+                self._count(task, model, "error")
+                instrumentation.record_ai_call(model, latency_ms, ok=False)
+                metrics.AI_REQUESTS.labels(task=task, model=model, outcome="error").inc()
+                metrics.AI_REQUEST_SECONDS.labels(task=task, model=model).observe(latency_ms / 1000)
+                logger.warning(f"AI router: {task} on {model} failed after {latency_ms:.0f}ms: {exc}")
+                last_error = exc
+                continue
+
+            latency_ms = (time.monotonic() - start) * 1000
+            with self._lock:
+                self.health(model).record(latency_ms, True, conf)
+            self._count(task, model, reason)
+            instrumentation.record_ai_call(model, latency_ms)
+            metrics.AI_REQUESTS.labels(task=task, model=model, outcome="ok").inc()
+            metrics.AI_REQUEST_SECONDS.labels(task=task, model=model).observe(latency_ms / 1000)
+            return result
+
+        raise last_error or RuntimeError(f"No model available for task '{task}'")
+
+    def _count(self, task: str, model: str, reason: str):
+        with self._lock:
+            self.decisions[(task, model, reason)] += 1
+        metrics.AI_ROUTER_DECISIONS.labels(task=task, model=model, reason=reason).inc()
+
+    # ------------------------------- metrics -------------------------------
+
+    def snapshot(self) -> Dict:
+        """Current per-model health and routing decision counters."""
+        cooldown = self.conf["cooldown_seconds"]
+        with self._lock:
+            models = {
+                model: {
+                    "p50_ms": health.percentile(50),
+                    "p95_ms": health.percentile(95),
+                    "error_rate": round(health.error_rate, 3),
+                    "samples": len(health.samples),
+                    "circuit": health.state(cooldown),
+                }
+                for model, health in self._health.items()
+            }
+            decisions = [
+                {"task": task, "model": model, "reason": reason, "count": count}
+                for (task, model, reason), count in sorted(self.decisions.items())
+            ]
+        return {"models": models, "decisions": decisions}
+
+
+router = ModelRouter()
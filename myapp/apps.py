@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install_template_timer
+        from . import nplusone, signals, sqlite
+        install_template_timer()
+        nplusone.install()
+        signals.connect()
+        connection_created.connect(sqlite.configure_connection, dispatch_uid="sqlite-tuning")
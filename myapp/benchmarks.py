@@ -0,0 +1,413 @@
+"""
+End-to-end view benchmarks.
+
+seed_benchmark_data() fills the database with a user owning a configurable
+volume of tests, questions, results, flashcards and subscriptions.
+run_benchmarks() then hits the hot views through the test client and records
+wall time, SQL query count and peak memory per view, checked against the
+budgets in fixtures/view_budgets.json.
+
+Used by `python manage.py benchmark_views` and by the budget tests.
+
+run_write_benchmark() is separate. It measures SQLite write contention with
+several processes doing short point/credit/result writes against a scratch
+database file. It compares the old access pattern (default pragmas, read
+then overwrite) with the tuned profile from myapp/sqlite.py (`manage.py
+benchmark_sqlite_writes`).
+
+run_clone_benchmark() times copying a large practice test row by row (what
+duplicating through the formsets amounts to) against myapp/cloning.py, in a
+transaction that is rolled back afterwards (`manage.py benchmark_cloning`).
+"""
+
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser, SubscriptionPlan, UserSubscription
+from .cloning import clone_activity
+from .sqlite import apply_pragmas, is_locked_error
+from .models import (
+    PracticeTest, Question, Option, PracticeTestResult,
+    WritingTask, WritingTaskResult,
+    FlashcardSet, Flashcard, FlashcardSetProgress,
+)
+
+BUDGETS_FILE = os.path.join(os.path.dirname(__file__), "fixtures", "view_budgets.json")
+
+DEFAULT_VOLUMES = {
+    "tests": 20,
+    "questions": 10,          # per practice test
+    "options": 4,             # per mcq question
+    "results": 50,            # practice + writing results each
+    "flashcard_sets": 10,
+    "cards": 20,              # per flashcard set
+    "writing_tasks": 5,
+}
+
+
+def seed_benchmark_data(email="bench@example.com", **volumes):
+    """Create a user with the given content volumes using bulk inserts. Returns the user."""
+    v = {**DEFAULT_VOLUMES, **volumes}
+    user = CustomUser.objects.create_user(email=email, password="bench-password")
+    now = timezone.now()
+
+    tests = PracticeTest.objects.bulk_create([
+        PracticeTest(title=f"Bench test {i}", subject=["Biology", "Maths", "History"][i % 3],
+                     difficulty="Medium", owner=user)
+        for i in range(v["tests"])
+    ])
+    questions = Question.objects.bulk_create([
+        Question(practice_test=test, text=f"Question {j} of {test.title}",
+                 question_type="mcq" if j % 3 else "text", subject=test.subject, answer="answer")
+        for test in tests for j in range(v["questions"])
+    ])
+    Option.objects.bulk_create([
+        Option(question=question, text=f"Option {k}", is_correct=(k == 0))
+        for question in questions if question.question_type == "mcq"
+        for k in range(v["options"])
+    ])
+
+    tasks = WritingTask.objects.bulk_create([
+        WritingTask(title=f"Bench essay {i}", prompt="Discuss the causes of the First World War.", owner=user)
+        for i in range(v["writing_tasks"])
+    ])
+
+    if tests:
+        PracticeTestResult.objects.bulk_create([
+            PracticeTestResult(owner=user, score=(i * 7) % 100, practice_test=tests[i % len(tests)])
+            for i in range(v["results"])
+        ])
+    if tasks:
+        WritingTaskResult.objects.bulk_create([
+            WritingTaskResult(owner=user, score=(i * 11) % 100, writing_task=tasks[i % len(tasks)],
+                              content="An essay " * 50, feedback="Good work.")
+            for i in range(v["results"])
+        ])
+    # spread results across the last fortnight so the weekly charts have data
+    for model in (PracticeTestResult, WritingTaskResult):
+        results = list(model.objects.filter(owner=user))
+        for i, result in enumerate(results):
+            result.taken_at = now - timedelta(hours=7 * i)
+        model.objects.bulk_update(results, ["taken_at"], batch_size=500)
+
+    sets = FlashcardSet.objects.bulk_create([
+        FlashcardSet(title=f"Bench set {i}", subject="Biology", owner=user)
+        for i in range(v["flashcard_sets"])
+    ])
+    Flashcard.objects.bulk_create([
+        Flashcard(flashcard_set=fs, front=f"Front {j}", back=f"Back {j}")
+        for fs in sets for j in range(v["cards"])
+    ])
+    FlashcardSetProgress.objects.bulk_create([
+        FlashcardSetProgress(owner=user, flashcard_set=fs, current_index=3, known=2, not_known=1)
+        for fs in sets
+    ])
+
+    plan, _ = SubscriptionPlan.objects.get_or_create(
+        stripe_price_id="price_bench_premium",
+        defaults={"name": "Premium", "duration_days": 30, "price": 12, "features": "Progress Tracking, Programs"},
+    )
+    SubscriptionPlan.objects.get_or_create(
+        stripe_price_id="price_bench_pro_yearly",
+        defaults={"name": "Pro", "duration_days": 365, "price": 240, "features": "Everything in Premium"},
+    )
+    UserSubscription.objects.create(user=user, plan=plan, end_date=now + timedelta(days=30))
+
+    return user
+
+
+def benchmark_cases(user):
+    """(name, method, url, data) for every benchmarked view."""
+    test = PracticeTest.objects.filter(owner=user).first()
+    flashcard_set = FlashcardSet.objects.filter(owner=user).first()
+    cases = [
+        ("dashboard", "get", reverse("dashboard"), None),
+        ("progress_page", "get", reverse("progress:progress_page"), None),
+        ("subscriptions", "get", reverse("accounts:subscriptions"), None),
+    ]
+    if test:
+        answers = {f"question_{q.id}": "answer" for q in test.questions.all()}
+        cases += [
+            ("take_practice_test", "get", reverse("take_practice_test", args=[test.pk]), None),
+            ("take_practice_test_submit", "post", reverse("take_practice_test", args=[test.pk]), answers),
+            ("practice_test_form", "get", reverse("edit_practice_test", args=[test.pk]), None),
+        ]
+    if flashcard_set:
+        set_id = flashcard_set.pk
+        cases += [
+            ("flashcard_nav_ajax", "json", reverse("flashcard_nav_ajax", args=[set_id]),
+             {"direction": "next", "current_index": 0}),
+            ("answer_flashcard_ajax", "json", reverse("answer_flashcard_ajax", args=[set_id]),
+             {"known": 3, "not_known": 1, "total": 4}),
+            ("reset_flashcards_ajax", "json", reverse("reset_flashcards_ajax", args=[set_id]),
+             {"mode": "study"}),
+        ]
+    return cases
+
+
+def _request(client, method, url, data):
+    if method == "get":
+        return client.get(url)
+    if method == "json":
+        return client.post(url, data=json.dumps(data), content_type="application/json")
+    return client.post(url, data)
+
+
+def measure(client, method, url, data=None, iterations=5):
+    """Time a view and capture its query count and peak memory."""
+    _request(client, method, url, data)  # warm-up (template loading, caches)
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = _request(client, method, url, data)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        response = _request(client, method, url, data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "status": response.status_code,
+        "queries": len(queries.captured_queries),
+        "wall_ms": {
+            "median": round(statistics.median(timings), 2),
+            "p95": round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 2),
+            "min": round(timings[0], 2),
+        },
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def load_budgets(path=None):
+    with open(path or BUDGETS_FILE) as f:
+        return json.load(f)
+
+
+def check_budget(result, budget):
+    """Return a list of human-readable budget violations for one result."""
+    violations = []
+    if result["status"] >= 400:
+        violations.append(f"status {result['status']}")
+    if "max_queries" in budget and result["queries"] > budget["max_queries"]:
+        violations.append(f"{result['queries']} queries > {budget['max_queries']}")
+    if "max_ms" in budget and result["wall_ms"]["median"] > budget["max_ms"]:
+        violations.append(f"{result['wall_ms']['median']}ms median > {budget['max_ms']}ms")
+    if "max_peak_kb" in budget and result["peak_kb"] > budget["max_peak_kb"]:
+        violations.append(f"{result['peak_kb']}KB peak > {budget['max_peak_kb']}KB")
+    return violations
+
+
+def run_benchmarks(user, budgets=None, iterations=5, only=None, warm_cache=False):
+    """
+    Run every benchmark case for `user` and return the machine-readable report.
+    By default the app cache is off so budgets guard the uncached (cold) path.
+    """
+    budgets = budgets if budgets is not None else load_budgets()
+    client = Client()
+    client.force_login(user)
+
+    results = []
+    app_cache = {**getattr(settings, "APP_CACHE", {}), "enabled": warm_cache}
+    with override_settings(APP_CACHE=app_cache):
+        for name, method, url, data in benchmark_cases(user):
+            if only and name not in only:
+                continue
+            result = {"name": name, "url": url, **measure(client, method, url, data, iterations)}
+            result["budget"] = budgets.get(name, {})
+            result["violations"] = check_budget(result, result["budget"])
+            results.append(result)
+
+    return {
+        "generated_at": timezone.now().isoformat(),
+        "iterations": iterations,
+        "warm_cache": warm_cache,
+        "results": results,
+        "passed": not any(r["violations"] for r in results),
+    }
+
+
+# ======================== SQLITE WRITE CONTENTION ========================
+
+WRITE_PROFILES = ("baseline", "tuned")
+
+WRITE_SCHEMA = """
+CREATE TABLE bench_user (id INTEGER PRIMARY KEY, points INTEGER NOT NULL, ai_credits INTEGER NOT NULL);
+CREATE TABLE bench_result (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                           score INTEGER NOT NULL, taken_at REAL NOT NULL);
+"""
+
+
+def _baseline_write(cur, user_id, points, tokens, award):
+    """The old pattern: read the user, then write back absolute values in a deferred transaction."""
+    current_points, credits = cur.execute(
+        "SELECT points, ai_credits FROM bench_user WHERE id = ?", (user_id,)
+    ).fetchone()
+    cur.execute("BEGIN")
+    if award:
+        cur.execute("INSERT INTO bench_result (user_id, score, taken_at) VALUES (?, ?, ?)",
+                    (user_id, points, time.time()))
+        cur.execute("UPDATE bench_user SET points = ? WHERE id = ?", (current_points + points, user_id))
+    else:
+        cur.execute("UPDATE bench_user SET ai_credits = ? WHERE id = ?", (credits - tokens, user_id))
+    cur.execute("COMMIT")
+
+
+def _tuned_write(cur, user_id, points, tokens, award):
+    """The new pattern: BEGIN IMMEDIATE and increments done in SQL."""
+    cur.execute("BEGIN IMMEDIATE")
+    if award:
+        cur.execute("INSERT INTO bench_result (user_id, score, taken_at) VALUES (?, ?, ?)",
+                    (user_id, points, time.time()))
+        cur.execute("UPDATE bench_user SET points = points + ? WHERE id = ?", (points, user_id))
+    else:
+        cur.execute("UPDATE bench_user SET ai_credits = ai_credits - ? WHERE id = ?", (tokens, user_id))
+    cur.execute("COMMIT")
+
+
+def _write_worker(path, profile, seconds, users, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+    cur = conn.cursor()
+    tuned = profile == "tuned"
+    if tuned:
+        apply_pragmas(cur)
+    write = _tuned_write if tuned else _baseline_write
+    attempts = 5 if tuned else 1  # only the tuned profile retries on a lock
+
+    stats = {"committed": 0, "errors": 0, "retries": 0, "points": 0, "credits": 0, "latencies": []}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        user_id, award = rng.randint(1, users), rng.random() < 0.5
+        points, tokens = rng.randint(1, 20), rng.randint(100, 2000)
+        started = time.perf_counter()
+        for attempt in range(1, attempts + 1):
+            try:
+                write(cur, user_id, points, tokens, award)
+            except sqlite3.OperationalError as exc:
+                if conn.in_transaction:
+                    cur.execute("ROLLBACK")
+                if not is_locked_error(exc) or attempt == attempts:
+                    stats["errors"] += 1
+                    break
+                stats["retries"] += 1
+                time.sleep(0.05 * 2 ** (attempt - 1) * rng.uniform(0.5, 1.5))
+            else:
+                stats["committed"] += 1
+                stats["points" if award else "credits"] += points if award else tokens
+                stats["latencies"].append((time.perf_counter() - started) * 1000)
+                break
+    conn.close()
+    return stats
+
+
+def run_write_benchmark(writers=8, seconds=5.0, users=20, profiles=WRITE_PROFILES):
+    """Run `writers` processes against a fresh database per profile and report throughput and lost updates."""
+    results = []
+    for profile in profiles:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "writes.sqlite3")
+            conn = sqlite3.connect(path)
+            conn.executescript(WRITE_SCHEMA)
+            conn.executemany("INSERT INTO bench_user (id, points, ai_credits) VALUES (?, 0, 1000000000)",
+                             [(i,) for i in range(1, users + 1)])
+            conn.commit()
+
+            with ProcessPoolExecutor(max_workers=writers, initializer=django.setup) as pool:
+                stats = list(pool.map(_write_worker, [path] * writers, [profile] * writers,
+                                      [seconds] * writers, [users] * writers, range(writers)))
+
+            stored_points, stored_credits = conn.execute(
+                "SELECT SUM(points), SUM(1000000000 - ai_credits) FROM bench_user"
+            ).fetchone()
+            conn.close()
+
+        latencies = sorted(ms for s in stats for ms in s["latencies"])
+        committed = sum(s["committed"] for s in stats)
+        results.append({
+            "profile": profile,
+            "writers": writers,
+            "seconds": seconds,
+            "transactions": committed,
+            "tx_per_sec": round(committed / seconds, 1),
+            "errors": sum(s["errors"] for s in stats),
+            "retries": sum(s["retries"] for s in stats),
+            "lost_points": sum(s["points"] for s in stats) - (stored_points or 0),
+            "lost_credits": sum(s["credits"] for s in stats) - (stored_credits or 0),
+            "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+        })
+    return {"generated_at": timezone.now().isoformat(), "results": results}
+
+
+
+# ============================== CLONING ==============================
+
+def _copy_row_by_row(test, owner):
+    """The pre-cloning-service way: save the test, then every question and option one at a time."""
+    copy = PracticeTest.objects.create(owner=owner, title=test.title, description=test.description,
+                                       subject=test.subject, duration=test.duration, difficulty=test.difficulty)
+    for question in test.questions.prefetch_related("options"):
+        new_question = Question.objects.create(practice_test=copy, text=question.text,
+                                               question_type=question.question_type, answer=question.answer,
+                                               explanation=question.explanation)
+        for option in question.options.all():
+            Option.objects.create(question=new_question, text=option.text, is_correct=option.is_correct)
+    return copy
+
+
+CLONE_STRATEGIES = {"row_by_row": _copy_row_by_row, "bulk": clone_activity}
+
+
+def run_clone_benchmark(questions=500, options=4, iterations=3, strategies=CLONE_STRATEGIES):
+    """Copy a `questions`-question test with each strategy; nothing is left in the database."""
+    results = []
+    with transaction.atomic():
+        owner = CustomUser.objects.create_user(email="clone-bench@example.com", password=None)
+        test = PracticeTest.objects.create(owner=owner, title="Clone benchmark")
+        new_questions = Question.objects.bulk_create([
+            Question(practice_test=test, text=f"Question {i}?", explanation="Because.") for i in range(questions)
+        ])
+        Option.objects.bulk_create([
+            Option(question=q, text=f"Option {j}", is_correct=j == 0) for q in new_questions for j in range(options)
+        ])
+
+        for name in strategies:
+            timings, query_count = [], 0
+            for _ in range(iterations):
+                connection.queries_log.clear()  # the log keeps 9000 queries; row by row would overflow it
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    copy = CLONE_STRATEGIES[name](test, owner)
+                    timings.append((time.perf_counter() - started) * 1000)
+                query_count = len(ctx.captured_queries)
+                assert copy.questions.count() == questions
+            results.append({
+                "strategy": name,
+                "questions": questions,
+                "options": questions * options,
+                "queries": query_count,
+                "median_ms": round(statistics.median(timings), 1),
+            })
+        transaction.set_rollback(True)
+    return {"generated_at": timezone.now().isoformat(), "results": results}
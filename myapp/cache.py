@@ -0,0 +1,219 @@
+"""
+Two-tier cache for per-user, per-object and global computations.
+
+    @cached_per_user("dashboard", timeout=300)
+    def dashboard_data(user, today):
+        ...
+
+Lookups hit a small in-process LRU first (tier 1, no pickling), then the
+shared Django cache named by APP_CACHE["shared_alias"] (tier 2, file-based by
+default so it works without external services), and only then compute.
+
+Keys embed a version per scope ("user:42", "obj:myapp.practicetest:<uuid>",
+"global"). Invalidation bumps the scope's version instead of deleting keys,
+so every cached computation for that user/object is dropped at once and the
+orphaned entries age out of both tiers. myapp/signals.py bumps versions on
+post_save/post_delete. Bulk operations (bulk_create, queryset.update) don't
+send signals; call invalidate_user()/invalidate_object() after them.
+
+Inside a transaction the bump waits for the commit (transaction.on_commit).
+Bumped earlier, a concurrent request could cache the rows from before the
+commit under the new version, where they would stay for the whole timeout.
+A rollback bumps nothing.
+
+Versions are cached locally for APP_CACHE["version_ttl"] seconds, so another
+worker's invalidation is seen within that window. Cached values are shared
+between requests: treat them as read-only.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import instrumentation, metrics
+
+DEFAULTS = {
+    "enabled": True,
+    "shared_alias": "default",
+    "local_max_entries": 1024,
+    "local_timeout": 30,   # seconds a value may live in the in-process tier
+    "version_ttl": 2,      # seconds a scope version is trusted before re-reading the shared tier
+}
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, timeout: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    def __init__(self):
+        self.local = LocalLRU(DEFAULTS["local_max_entries"])
+
+    @property
+    def conf(self):
+        return {**DEFAULTS, **getattr(settings, "APP_CACHE", {})}
+
+    @property
+    def shared(self):
+        return caches[self.conf["shared_alias"]]
+
+    # ------------------------------ versions ------------------------------
+
+    def version(self, scope: str) -> int:
+        local_key = f"ver:{scope}"
+        version = self.local.get(local_key)
+        if version is not _MISSING:
+            return version
+        shared_key = f"appcache:ver:{scope}"
+        version = self.shared.get(shared_key)
+        if version is None:
+            self.shared.add(shared_key, time.time_ns(), None)
+            version = self.shared.get(shared_key) or 0
+        self.local.set(local_key, version, self.conf["version_ttl"])
+        return version
+
+    def bump(self, scope: str):
+        version = time.time_ns()
+        self.shared.set(f"appcache:ver:{scope}", version, None)
+        self.local.set(f"ver:{scope}", version, self.conf["version_ttl"])
+
+    # ------------------------------- values -------------------------------
+
+    def key(self, namespace: str, scope: str, args=()) -> str:
+        digest = hashlib.md5(repr(args).encode()).hexdigest()[:16]
+        return f"appcache:{namespace}:{scope}:{self.version(scope)}:{digest}"
+
+    def get_or_set(self, namespace: str, scope: str, compute: Callable[[], Any], args=(), timeout: int = 300):
+        conf = self.conf
+        if not conf["enabled"]:
+            return compute()
+
+        key = self.key(namespace, scope, args)
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self._record(namespace, "local")
+            return value
+
+        value = self.shared.get(key, _MISSING)
+        if value is _MISSING:
+            self._record(namespace, "miss")
+            value = compute()
+            self.shared.set(key, value, timeout)
+        else:
+            self._record(namespace, "shared")
+        self.local.set(key, value, min(timeout, conf["local_timeout"]))
+        return value
+
+    @staticmethod
+    def _record(namespace: str, tier: str):
+        instrumentation.record_cache(hit=tier != "miss")
+        metrics.CACHE_LOOKUPS.labels(namespace=namespace, tier=tier).inc()
+
+    def clear_local(self):
+        self.local.clear()
+
+
+tiered = TieredCache()
+
+
+# ======================== SCOPES / INVALIDATION ========================
+
+def user_scope(user) -> str:
+    return f"user:{getattr(user, 'pk', user)}"
+
+
+def object_scope(obj=None, model=None, pk=None) -> str:
+    """Scope for a model instance, or for (model, pk) without loading it."""
+    model = model or type(obj)
+    return f"obj:{model._meta.label_lower}:{obj.pk if obj is not None else pk}"
+
+
+GLOBAL_SCOPE = "global"
+
+
+def _bump_on_commit(scope: str):
+    # runs right away outside an atomic block
+    transaction.on_commit(lambda: tiered.bump(scope))
+
+
+def invalidate_user(user):
+    _bump_on_commit(user_scope(user))
+
+
+def invalidate_object(obj=None, model=None, pk=None):
+    _bump_on_commit(object_scope(obj, model, pk))
+
+
+def invalidate_global():
+    _bump_on_commit(GLOBAL_SCOPE)
+
+
+# ============================ DECORATORS ============================
+
+def _decorator(namespace: str, timeout: int, scope_of: Callable):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            scope, key_args = scope_of(args)
+            return tiered.get_or_set(
+                namespace, scope, lambda: fn(*args, **kwargs),
+                args=(key_args, sorted(kwargs.items())), timeout=timeout,
+            )
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+
+def cached_per_user(namespace: str, timeout: int = 300):
+    """Cache fn(user, *args) per user; dropped by invalidate_user(user)."""
+    return _decorator(namespace, timeout, lambda args: (user_scope(args[0]), args[1:]))
+
+
+def cached_per_object(namespace: str, timeout: int = 300):
+    """Cache fn(obj, *args) per model instance; dropped by invalidate_object(obj)."""
+    return _decorator(namespace, timeout, lambda args: (object_scope(args[0]), args[1:]))
+
+
+def cached_global(namespace: str, timeout: int = 300):
+    """Cache fn(*args) for everyone; dropped by invalidate_global()."""
+    return _decorator(namespace, timeout, lambda args: (GLOBAL_SCOPE, args))
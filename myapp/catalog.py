@@ -0,0 +1,194 @@
+"""
+Public catalog of tests, flashcard sets and writing tasks.
+
+Each public original (is_public and not itself a copy) has a CatalogEntry.
+The entry holds usage counters and a precomputed popularity score, so
+browsing by subject/difficulty is an index walk in score order rather than
+an aggregate over every result row. myapp/signals.py keeps the entries up to
+date incrementally:
+
+- activity saved/deleted -> entry upserted or removed (one query)
+- result or study session inserted -> counters and score bumped in place
+  with a single UPDATE (attempts on copies count towards the original)
+- writing task graded -> the grade is added as a score
+- "add to my library" -> copies bumped
+
+    popularity = ln(1 + attempts + COPY_WEIGHT * copies) * quality / 100
+
+quality is the mean 0-100 score, shrunk towards PRIOR_MEAN by PRIOR_WEIGHT
+pseudo-attempts, so a single lucky 100 doesn't outrank a well-used item.
+`manage.py rebuild_catalog` recomputes everything from the result tables.
+"""
+
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce, Ln
+
+from .cache import cached_global
+from .cloning import clone_activity
+from .models import (
+    CatalogEntry, FlashcardSet, FlashcardSetProgress, PracticeTest, PracticeTestResult, WritingTask,
+    WritingTaskResult,
+)
+from .pagination import DEFAULT_PAGE_SIZE, KeysetPage, keyset_page
+
+COPY_WEIGHT = 3.0
+PRIOR_MEAN = 60.0
+PRIOR_WEIGHT = 5.0
+
+# kind -> activity model
+KINDS = {
+    "practice_test": PracticeTest,
+    "flashcard_set": FlashcardSet,
+    "writing_task": WritingTask,
+}
+KIND_OF = {model: kind for kind, model in KINDS.items()}
+
+# result model -> (activity fk name, which rows carry a 0-100 score; None = none do)
+RESULTS = {
+    PracticeTestResult: ("practice_test", Q(score__isnull=False)),
+    WritingTaskResult: ("writing_task", Q(feedback__isnull=False)),  # scored once graded
+    FlashcardSetProgress: ("flashcard_set", None),
+}
+
+
+def popularity(attempts, scored_attempts, score_sum, copies):
+    """The popularity score as a database expression over (new) counter values."""
+    usage = Ln(Value(1.0) + attempts + Value(COPY_WEIGHT) * copies)
+    quality = (score_sum + Value(PRIOR_WEIGHT * PRIOR_MEAN)) / (scored_attempts + Value(PRIOR_WEIGHT))
+    return ExpressionWrapper(usage * quality / Value(100.0), output_field=FloatField())
+
+
+def _bump(kind, object_id, attempts=0, scored=0, score=0.0, copies=0) -> int:
+    """Add to an entry's counters and recompute its popularity in the same UPDATE."""
+    new = {
+        "attempts": F("attempts") + attempts,
+        "scored_attempts": F("scored_attempts") + scored,
+        "score_sum": F("score_sum") + float(score),
+        "copies": F("copies") + copies,
+    }
+    return CatalogEntry.objects.filter(kind=kind, object_id=object_id).update(**new, popularity=popularity(**new))
+
+
+def _original_id(activity_model, activity_id, activity=None):
+    """The catalog original behind an activity (itself, unless it's a copy)."""
+    if activity is not None:
+        return activity.copied_from_id or activity.pk
+    copied_from_id = activity_model.objects.filter(pk=activity_id).values_list("copied_from_id", flat=True).first()
+    return copied_from_id or activity_id
+
+
+# ============================ SYNC ============================
+
+def sync_entry(activity):
+    """Create, refresh or drop the catalog entry for a saved activity."""
+    kind = KIND_OF[type(activity)]
+    if not activity.is_public or activity.copied_from_id:
+        CatalogEntry.objects.filter(kind=kind, object_id=activity.pk).delete()
+        return
+    CatalogEntry.objects.bulk_create(
+        [CatalogEntry(
+            kind=kind, object_id=activity.pk, owner_id=activity.owner_id, title=activity.title,
+            description=activity.description or "", subject=activity.subject or "",
+            difficulty=activity.difficulty or "", created_at=activity.created_at,
+        )],
+        update_conflicts=True, unique_fields=["kind", "object_id"],
+        update_fields=["owner", "title", "description", "subject", "difficulty"],
+    )
+
+
+def remove_entry(activity):
+    CatalogEntry.objects.filter(kind=KIND_OF[type(activity)], object_id=activity.pk).delete()
+
+
+def _original_of(result):
+    """(kind, original id) for the activity a result belongs to."""
+    field, _ = RESULTS[type(result)]
+    fk = result._meta.get_field(field)
+    activity = getattr(result, field) if fk.is_cached(result) else None
+    return KIND_OF[fk.related_model], _original_id(fk.related_model, getattr(result, fk.attname), activity)
+
+
+def result_saved(result, created: bool, update_fields=None):
+    """
+    Count a new result or study session towards its original. A practice test
+    result is scored on insert; an essay's grade is saved later with
+    update_fields including "feedback", and is added then.
+    """
+    if created:
+        kind, original_id = _original_of(result)
+        if isinstance(result, PracticeTestResult):
+            _bump(kind, original_id, attempts=1, scored=1, score=result.score)
+        else:
+            _bump(kind, original_id, attempts=1)
+    elif isinstance(result, WritingTaskResult) and update_fields and "feedback" in update_fields:
+        kind, original_id = _original_of(result)
+        _bump(kind, original_id, scored=1, score=result.score)
+
+
+def rebuild() -> int:
+    """Recreate every entry and its counters from the activity and result tables. Returns entries written."""
+    total = 0
+    for result_model, (field, scored) in RESULTS.items():
+        model = result_model._meta.get_field(field).related_model
+        kind = KIND_OF[model]
+        with transaction.atomic():
+            CatalogEntry.objects.filter(kind=kind).delete()
+            originals = model.objects.filter(is_public=True, copied_from=None)
+            total += len(CatalogEntry.objects.bulk_create(
+                [CatalogEntry(kind=kind, object_id=a.pk, owner_id=a.owner_id, title=a.title,
+                              description=a.description or "", subject=a.subject or "",
+                              difficulty=a.difficulty or "", created_at=a.created_at)
+                 for a in originals.iterator(chunk_size=1000)],
+                batch_size=1000,
+            ))
+
+            copies = dict(model.objects.exclude(copied_from=None).values_list("copied_from").annotate(n=Count("pk")))
+            usage = (
+                result_model.objects
+                .annotate(original=Coalesce(f"{field}__copied_from", field))
+                .values("original")
+                .annotate(
+                    n=Count("pk"),
+                    scored=Count("pk", filter=scored) if scored is not None else Value(0),
+                    score_sum=Sum("score", filter=scored) if scored is not None else Value(0.0),
+                )
+                .values_list("original", "n", "scored", "score_sum")
+            )
+            for original, n, scored_n, score_sum in usage:
+                _bump(kind, original, attempts=n, scored=scored_n, score=score_sum or 0,
+                      copies=copies.pop(original, 0))
+            for original, n in copies.items():
+                _bump(kind, original, copies=n)
+    return total
+
+
+# ============================ BROWSING ============================
+
+@cached_global("catalog", timeout=60)
+def browse(kind, subject="", difficulty="", cursor=None, size=DEFAULT_PAGE_SIZE) -> KeysetPage:
+    """One page of public `kind` items, most popular first, optionally filtered."""
+    entries = CatalogEntry.objects.filter(kind=kind)
+    if subject:
+        entries = entries.filter(subject=subject)
+    if difficulty:
+        entries = entries.filter(difficulty=difficulty)
+    return keyset_page(entries, cursor, size, field="popularity")
+
+
+@cached_global("catalog_filters", timeout=600)
+def filters(kind):
+    """Subjects and difficulties present in the catalog for `kind`, for the filter menus."""
+    entries = CatalogEntry.objects.filter(kind=kind).order_by()
+    return {
+        "subjects": sorted(s for s in entries.values_list("subject", flat=True).distinct() if s),
+        "difficulties": sorted(d for d in entries.values_list("difficulty", flat=True).distinct() if d),
+    }
+
+
+def add_to_library(entry: CatalogEntry, user):
+    """Copy a catalog item into `user`'s library and credit the original. Returns the copy."""
+    original = KINDS[entry.kind].objects.get(pk=entry.object_id)
+    copy = clone_activity(original, user)
+    _bump(entry.kind, entry.object_id, copies=1)
+    return copy
@@ -0,0 +1,131 @@
+"""
+Deep copies of tests, flashcard sets, writing tasks and programs.
+
+    copy = clone_activity(test, request.user)                        # from the catalog
+    copy = clone_activity(test, request.user, title="Algebra (copy)", link_original=False)
+    copy = clone_program(program)
+
+Everything runs in one transaction with one bulk_create per table: the
+parent, then its children (questions, cards, weeks), then the grandchildren
+(options, activities). The grandchildren are wired to the new children
+through the primary keys bulk_create returns. A 500-question test is about
+a dozen queries instead of the ~2,500 that saving it through the formsets
+would take (`manage.py benchmark_cloning`).
+
+Only the parent goes through save(), so it gets the usual post_save cache,
+search and catalog handling. bulk_create skips post_save for the children,
+so they are added to the search index here, and get the originals'
+near-duplicate buckets (see myapp/dedup.py).
+"""
+
+from django.db import connection, transaction
+
+from . import dedup, search
+from .cache import invalidate_user
+from .models import Flashcard, FlashcardSet, Option, PracticeTest, Question, WritingTask
+
+# never copied from the original
+SKIP_FIELDS = {"id", "owner", "created_at", "is_public", "copied_from"}
+
+
+def _fields(obj, skip=()):
+    return {
+        field.attname: getattr(obj, field.attname)
+        for field in obj._meta.concrete_fields
+        if not field.primary_key and field.name not in SKIP_FIELDS and field.name not in skip
+    }
+
+
+def _insert(model, objects):
+    """bulk_create that leaves primary keys set on `objects`, which the next level needs."""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objects)
+    for obj in objects:  # backends without INSERT ... RETURNING: one row at a time
+        obj.save(force_insert=True)
+    return objects
+
+
+# ============================== ACTIVITIES ==============================
+
+def copy_questions(questions, copy, link_source=False):
+    """
+    Copy `questions` (with prefetched options) into the test `copy`. myapp/adaptive.py
+    passes link_source, so each copy points at its bank question (never at another copy).
+    """
+    new_questions = _insert(Question, [
+        Question(practice_test=copy, **_fields(question, skip={"practice_test", "source"}),
+                 source_id=(question.source_id or question.pk) if link_source else question.source_id)
+        for question in questions
+    ])
+    Option.objects.bulk_create([
+        Option(question=new_question, **_fields(option, skip={"question"}))
+        for question, new_question in zip(questions, new_questions)
+        for option in question.options.all()
+    ])
+    search.index_instances(new_questions)
+    dedup.copy_buckets(questions, new_questions, copy.owner_id)
+
+
+def _copy_questions(original, copy):
+    copy_questions(list(original.questions.order_by("pk").prefetch_related("options")), copy)
+
+
+def _copy_flashcards(original, copy):
+    cards = list(original.flashcards.order_by("pk"))
+    new_cards = _insert(Flashcard, [
+        Flashcard(flashcard_set=copy, **_fields(card, skip={"flashcard_set"})) for card in cards
+    ])
+    search.index_instances(new_cards)
+    dedup.copy_buckets(cards, new_cards, copy.owner_id)
+
+
+CHILDREN = {
+    PracticeTest: _copy_questions,
+    FlashcardSet: _copy_flashcards,
+    WritingTask: None,
+}
+
+
+def clone_activity(activity, owner, title=None, link_original=True):
+    """
+    A private copy of `activity` (with its questions/options or cards) owned by `owner`.
+
+    With link_original the copy points at the catalog original (never at an
+    intermediate copy), so its results count towards it. Duplicating one's
+    own item passes link_original=False.
+    """
+    model = type(activity)
+    fields = _fields(activity)
+    if title:
+        fields["title"] = title
+    copied_from_id = (activity.copied_from_id or activity.pk) if link_original else None
+
+    with transaction.atomic():
+        copy = model.objects.create(owner=owner, is_public=False, copied_from_id=copied_from_id, **fields)
+        if CHILDREN[model]:
+            CHILDREN[model](activity, copy)
+    # the list pages cache per-test question and per-set card counts
+    invalidate_user(owner)
+    return copy
+
+
+def copy_title(title: str) -> str:
+    return f"{title} (copy)"[:200]
+
+
+# =============================== PROGRAMS ===============================
+
+def clone_program(program, title=None):
+    """A copy of `program` with its weeks and activities. Activities still point at the same content."""
+    from extras.models import Activity, Program, ProgramWeek
+
+    weeks = list(program.weeks.order_by("week_number").prefetch_related("activities"))
+    with transaction.atomic():
+        copy = Program.objects.create(**{**_fields(program), "title": title or copy_title(program.title)})
+        new_weeks = _insert(ProgramWeek, [ProgramWeek(program=copy, **_fields(week, skip={"program"})) for week in weeks])
+        Activity.objects.bulk_create([
+            Activity(week=new_week, **_fields(activity, skip={"week"}))
+            for week, new_week in zip(weeks, new_weeks)
+            for activity in week.activities.all()
+        ])
+    return copy
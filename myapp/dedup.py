@@ -0,0 +1,277 @@
+"""
+Near-duplicate detection for questions and flashcards (MinHash LSH).
+
+    checker = DuplicateChecker(user, "question")
+    checker.is_duplicate("What is the powerhouse of the cell?")  # batch so far (and library)
+    checker.add("What is the powerhouse of the cell?")
+
+Text is normalized (lowercase, accents and punctuation dropped, whitespace
+collapsed) and cut into word-pair shingles. Pairs rather than characters,
+so questions that differ in one word stay apart ("What is 2+3?" and "What
+is 2+4?" share half their pairs, but 78% of their character 4-grams). A
+64-permutation MinHash signature is split into 16 bands of 4 rows, and each
+band is hashed, together with the kind and band number, into one LSHBucket
+row. Two texts share at least one bucket with high probability once their
+shingle Jaccard similarity passes about 0.5 (~99% at 0.7). A lookup is
+therefore an index probe on (owner, bucket IN 16 values), not a scan of the
+library. Candidates are then confirmed by their exact Jaccard similarity
+against settings.NEAR_DUPLICATES["threshold"]. Buckets stored before the
+switch to word shingles are refreshed by `manage.py dedup_library --rebuild`.
+
+Scopes: "activity" (the default) only compares within the same test or
+flashcard set, "owner" against the whole library of the user.
+
+myapp/signals.py keeps the buckets in step with saves and deletes.
+save_activity_from_json() skips generated items that duplicate an earlier
+item of the same generation (or the library, with scope "owner"), and
+rejects a generation in which nothing is left. `manage.py dedup_library`
+reports (or deletes) existing duplicate clusters.
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Flashcard, FlashcardSet, LSHBucket, PracticeTest, Question
+from .search import parent_owner
+
+DEFAULTS = {
+    "enabled": True,
+    "threshold": 0.8,     # exact shingle Jaccard at which two texts count as duplicates
+    "scope": "activity",  # what generated items are checked against: "activity" or "owner"
+}
+
+SHINGLE = 2  # words
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _conf():
+    return {**DEFAULTS, **getattr(settings, "NEAR_DUPLICATES", {})}
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def _permutations():
+    # Fixed seeds: bucket values are stored, so they must not change between processes
+    params = []
+    for i in range(NUM_PERM):
+        seed = _hash64(f"minhash-{i}".encode())
+        params.append((seed % (_MERSENNE - 1) + 1, (seed >> 3) % _MERSENNE))
+    return params
+
+
+PERMUTATIONS = _permutations()
+
+# kind -> (model, text field, parent fk, parent model)
+KINDS = {
+    "question": (Question, "text", "practice_test", PracticeTest),
+    "flashcard": (Flashcard, "front", "flashcard_set", FlashcardSet),
+}
+KIND_OF = {model: kind for kind, (model, *_) in KINDS.items()}
+
+
+# ============================== HASHING ==============================
+
+def normalize(text: str) -> str:
+    text = "".join(c for c in unicodedata.normalize("NFKD", text or "") if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[^\W_]+", text.lower()))
+
+
+def shingles(text: str) -> Set[str]:
+    words = normalize(text).split()
+    if len(words) <= SHINGLE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def signature(shingle_set: Set[str]) -> List[int]:
+    hashes = [_hash64(s.encode()) & _MAX_HASH for s in shingle_set]
+    return [min((a * h + b) % _MERSENNE for h in hashes) for a, b in PERMUTATIONS]
+
+
+def buckets(kind: str, shingle_set: Set[str]) -> List[int]:
+    """The item's LSH bucket per band, as signed 64-bit ints (one per band; empty text has none)."""
+    if not shingle_set:
+        return []
+    sig = signature(shingle_set)
+    keys = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        value = _hash64(f"{kind}:{band}:{','.join(map(str, rows))}".encode())
+        keys.append(value - (1 << 64) if value >= 1 << 63 else value)
+    return keys
+
+
+# ============================== INDEX ==============================
+
+def _rows(kind: str, instance, owner_id) -> List[LSHBucket]:
+    _, text_field, parent_field, _ = KINDS[kind]
+    return [
+        LSHBucket(kind=kind, object_id=instance.pk, owner_id=owner_id,
+                  parent_id=getattr(instance, f"{parent_field}_id"), bucket=bucket)
+        for bucket in buckets(kind, shingles(getattr(instance, text_field)))
+    ]
+
+
+def index_instance(instance):
+    """Replace the buckets of one saved question or flashcard."""
+    kind = KIND_OF[type(instance)]
+    _, _, parent_field, parent_model = KINDS[kind]
+    LSHBucket.objects.filter(kind=kind, object_id=instance.pk).delete()
+    owner_id = parent_owner(instance, parent_field, parent_model)
+    if owner_id:
+        LSHBucket.objects.bulk_create(_rows(kind, instance, owner_id))
+
+
+def copy_buckets(originals: Sequence, copies: Sequence, owner_id):
+    """
+    Index bulk-created copies of questions/cards (same text) by copying the
+    originals' bucket rows in one INSERT ... SELECT, so a clone costs one query
+    however many items it has.
+    """
+    if not originals or not owner_id:
+        return
+    kind = KIND_OF[type(originals[0])]
+    _, _, parent_field, _ = KINDS[kind]
+    parent_id = LSHBucket._meta.get_field("parent_id").get_db_prep_value(
+        getattr(copies[0], f"{parent_field}_id"), connection,
+    )
+    table = connection.ops.quote_name(LSHBucket._meta.db_table)
+    whens = " ".join(["WHEN %s THEN %s"] * len(originals))
+    in_list = ", ".join(["%s"] * len(originals))
+    sql = f"""
+        INSERT INTO {table} (kind, object_id, owner_id, parent_id, bucket)
+        SELECT kind, CAST(CASE object_id {whens} END AS BIGINT), %s, %s, bucket
+        FROM {table}
+        WHERE kind = %s AND object_id IN ({in_list})
+    """
+    params = [pk for pair in zip((o.pk for o in originals), (c.pk for c in copies)) for pk in pair]
+    params += [owner_id, parent_id, kind, *(o.pk for o in originals)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def remove_instance(instance):
+    LSHBucket.objects.filter(kind=KIND_OF[type(instance)], object_id=instance.pk).delete()
+
+
+def rebuild(kinds: Optional[Iterable[str]] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """Recompute the buckets of every question/flashcard of the given kinds. Returns kind -> items."""
+    counts = {}
+    for kind in kinds or KINDS:
+        model, _, parent_field, _ = KINDS[kind]
+        items = model.objects.select_related(parent_field).exclude(**{f"{parent_field}__owner": None}).order_by()
+        with transaction.atomic():
+            LSHBucket.objects.filter(kind=kind).delete()
+            batch, counts[kind] = [], 0
+            for instance in items.iterator(chunk_size=batch_size):
+                batch += _rows(kind, instance, getattr(instance, parent_field).owner_id)
+                counts[kind] += 1
+                if len(batch) >= batch_size:
+                    LSHBucket.objects.bulk_create(batch)
+                    batch = []
+            LSHBucket.objects.bulk_create(batch)
+    return counts
+
+
+# ============================== LOOKUPS ==============================
+
+def _texts(kind: str, object_ids) -> Dict[int, str]:
+    model, text_field, _, _ = KINDS[kind]
+    return dict(model.objects.filter(pk__in=object_ids).values_list("pk", text_field))
+
+
+def find_duplicates(user, kind: str, text: str, parent_id=None, threshold: Optional[float] = None
+                    ) -> List[Tuple[int, float]]:
+    """(object id, similarity) of `user`'s items (optionally within one test/set) that near-duplicate `text`."""
+    threshold = _conf()["threshold"] if threshold is None else threshold
+    shingle_set = shingles(text)
+    keys = buckets(kind, shingle_set)
+    if not keys:
+        return []
+    candidates = LSHBucket.objects.filter(owner=user, bucket__in=keys, kind=kind)
+    if parent_id is not None:
+        candidates = candidates.filter(parent_id=parent_id)
+    object_ids = set(candidates.values_list("object_id", flat=True))
+    if not object_ids:
+        return []
+    matches = [(pk, jaccard(shingle_set, shingles(other))) for pk, other in _texts(kind, object_ids).items()]
+    return sorted(((pk, sim) for pk, sim in matches if sim >= threshold), key=lambda m: -m[1])
+
+
+class DuplicateChecker:
+    """
+    Checks a batch of new texts against the user's library (scope "owner") and
+    against each other, keeping the batch's buckets in memory.
+    """
+
+    def __init__(self, user, kind: str, scope: Optional[str] = None, threshold: Optional[float] = None):
+        conf = _conf()
+        self.user, self.kind = user, kind
+        self.scope = scope or conf["scope"]
+        self.threshold = conf["threshold"] if threshold is None else threshold
+        self.enabled = conf["enabled"]
+        self._batch: Dict[int, List[Set[str]]] = defaultdict(list)
+
+    def is_duplicate(self, text: str) -> bool:
+        if not self.enabled:
+            return False
+        shingle_set = shingles(text)
+        for key in buckets(self.kind, shingle_set):
+            if any(jaccard(shingle_set, other) >= self.threshold for other in self._batch[key]):
+                return True
+        return self.scope == "owner" and bool(find_duplicates(self.user, self.kind, text, threshold=self.threshold))
+
+    def add(self, text: str):
+        shingle_set = shingles(text)
+        for key in buckets(self.kind, shingle_set):
+            self._batch[key].append(shingle_set)
+
+
+def duplicate_clusters(user, kind: str, scope: str = "owner", threshold: Optional[float] = None) -> List[List[int]]:
+    """Groups of `user`'s near-duplicate items (object ids, oldest first), from the stored buckets."""
+    threshold = _conf()["threshold"] if threshold is None else threshold
+    groups = defaultdict(set)
+    for object_id, parent_id, bucket in (
+        LSHBucket.objects.filter(owner=user, kind=kind).values_list("object_id", "parent_id", "bucket")
+    ):
+        groups[(bucket, parent_id) if scope == "activity" else bucket].add(object_id)
+
+    pairs = {tuple(sorted((a, b))) for ids in groups.values() if len(ids) > 1 for a in ids for b in ids if a < b}
+    if not pairs:
+        return []
+    texts = _texts(kind, {pk for pair in pairs for pk in pair})
+    shingle_sets = {pk: shingles(text) for pk, text in texts.items()}
+
+    parent = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        if a in shingle_sets and b in shingle_sets and jaccard(shingle_sets[a], shingle_sets[b]) >= threshold:
+            parent[find(a)] = find(b)
+
+    clusters = defaultdict(list)
+    for pk in parent:
+        clusters[find(pk)].append(pk)
+    return sorted((sorted(ids) for ids in clusters.values() if len(ids) > 1), key=lambda ids: ids[0])
@@ -0,0 +1,252 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware opens a context-local RequestMetrics collector for each
+request. Code anywhere in the request records into it:
+
+    instrumentation.event("practice_test.saved", test_id=test.id)
+    instrumentation.record_ai_call("gpt-4o-mini", latency_ms=812.4)
+    instrumentation.record_cache(hit=True)
+
+SQL count/time is captured with a database execute wrapper and template
+render time by timing the outermost Template.render. Each response gets a
+Server-Timing header and one structured log line on the "myapp.performance"
+logger. Requests slower than settings.PERF_SLOW_REQUEST_MS are logged as
+warnings. Per-endpoint aggregates back the staff performance page.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import HTTP_REQUEST_SECONDS
+
+logger = logging.getLogger("myapp.performance")
+
+_current: ContextVar[Optional["RequestMetrics"]] = ContextVar("request_metrics", default=None)
+
+
+@dataclass
+class RequestMetrics:
+    path: str = ""
+    method: str = ""
+    view_name: str = ""
+    sql_count: int = 0
+    sql_ms: float = 0.0
+    ai_calls: int = 0
+    ai_errors: int = 0
+    ai_tokens: int = 0
+    ai_ms: float = 0.0
+    template_ms: float = 0.0
+    template_depth: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    events: List[Dict] = field(default_factory=list)
+
+    def as_log_record(self, total_ms: float, status: int) -> Dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "view": self.view_name,
+            "status": status,
+            "total_ms": round(total_ms, 2),
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_ms, 2),
+            "ai_calls": self.ai_calls,
+            "ai_errors": self.ai_errors,
+            "ai_tokens": self.ai_tokens,
+            "ai_ms": round(self.ai_ms, 2),
+            "template_ms": round(self.template_ms, 2),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "events": self.events,
+        }
+
+
+# ======================== RECORDING API ========================
+
+def current() -> Optional[RequestMetrics]:
+    """The collector for the request being handled, or None outside a request."""
+    return _current.get()
+
+
+def event(name: str, **fields):
+    """Record a named instrumentation event (replaces ad-hoc debug prints)."""
+    metrics = current()
+    if metrics is not None:
+        metrics.events.append({"event": name, **fields})
+    logger.debug(json.dumps({"event": name, **fields}, default=str))
+
+
+def record_ai_call(model: str, latency_ms: float, ok: bool = True):
+    metrics = current()
+    if metrics is not None:
+        metrics.ai_calls += 1
+        metrics.ai_ms += latency_ms
+        if not ok:
+            metrics.ai_errors += 1
+
+
+def record_ai_tokens(tokens: int):
+    metrics = current()
+    if metrics is not None:
+        metrics.ai_tokens += tokens or 0
+
+
+def record_cache(hit: bool):
+    metrics = current()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    metrics = current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_count += 1
+        metrics.sql_ms += (time.perf_counter() - start) * 1000
+
+
+def install_template_timer():
+    """Time the outermost Template.render per request. Called from MyappConfig.ready()."""
+    from django.template.base import Template
+
+    if getattr(Template.render, "_perf_instrumented", False):
+        return
+    original_render = Template.render
+
+    def render(self, context):
+        metrics = current()
+        if metrics is None:
+            return original_render(self, context)
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            metrics.template_depth -= 1
+            if metrics.template_depth == 0:
+                metrics.template_ms += (time.perf_counter() - start) * 1000
+
+    render._perf_instrumented = True
+    Template.render = render
+
+
+# ======================== ENDPOINT AGGREGATES ========================
+
+class EndpointStats:
+    """In-process rolling aggregates per view, shown on the staff performance page."""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._window = window
+        self._stats: Dict[str, Dict] = {}
+
+    def add(self, view_name: str, total_ms: float, metrics: RequestMetrics):
+        with self._lock:
+            stats = self._stats.setdefault(view_name, {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0, "sql_count": 0, "ai_calls": 0,
+                "recent": deque(maxlen=self._window),
+            })
+            stats["count"] += 1
+            stats["total_ms"] += total_ms
+            stats["max_ms"] = max(stats["max_ms"], total_ms)
+            stats["sql_count"] += metrics.sql_count
+            stats["ai_calls"] += metrics.ai_calls
+            stats["recent"].append(total_ms)
+
+    def slowest(self, limit: int = 20) -> List[Dict]:
+        with self._lock:
+            rows = []
+            for view_name, stats in self._stats.items():
+                recent = sorted(stats["recent"])
+                rows.append({
+                    "view": view_name,
+                    "count": stats["count"],
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 1),
+                    "p95_ms": round(recent[min(len(recent) - 1, int(0.95 * len(recent)))], 1),
+                    "max_ms": round(stats["max_ms"], 1),
+                    "avg_sql": round(stats["sql_count"] / stats["count"], 1),
+                    "ai_calls": stats["ai_calls"],
+                })
+        return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+# ======================== MIDDLEWARE ========================
+
+class PerformanceMiddleware:
+    """Collects per-request metrics, adds a Server-Timing header and logs a summary line."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "PERF_INSTRUMENTATION_ENABLED", True):
+            return self.get_response(request)
+
+        metrics = RequestMetrics(path=request.path, method=request.method)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total_ms = (time.perf_counter() - start) * 1000
+        match = getattr(request, "resolver_match", None)
+        metrics.view_name = match.view_name if match else "unresolved"
+
+        response["Server-Timing"] = self.server_timing(metrics, total_ms)
+        endpoint_stats.add(metrics.view_name, total_ms, metrics)
+        HTTP_REQUEST_SECONDS.labels(
+            view=metrics.view_name, method=metrics.method, status=f"{response.status_code // 100}xx",
+        ).observe(total_ms / 1000)
+        self.log(metrics, total_ms, response.status_code)
+        return response
+
+    @staticmethod
+    def server_timing(metrics: RequestMetrics, total_ms: float) -> str:
+        parts = [
+            f'db;dur={metrics.sql_ms:.1f};desc="{metrics.sql_count} queries"',
+            f'tpl;dur={metrics.template_ms:.1f}',
+        ]
+        if metrics.ai_calls:
+            parts.append(f'ai;dur={metrics.ai_ms:.1f};desc="{metrics.ai_calls} calls, {metrics.ai_tokens} tokens"')
+        if metrics.cache_hits or metrics.cache_misses:
+            parts.append(f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"')
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+    @staticmethod
+    def log(metrics: RequestMetrics, total_ms: float, status: int):
+        line = json.dumps(metrics.as_log_record(total_ms, status), default=str)
+        if total_ms >= getattr(settings, "PERF_SLOW_REQUEST_MS", 500):
+            logger.warning(f"slow_request {line}")
+        else:
+            logger.info(f"request {line}")
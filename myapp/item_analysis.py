@@ -0,0 +1,170 @@
+"""
+Item analysis for practice tests: which questions are too easy or too hard,
+which don't separate strong from weak students, and which wrong options
+mislead.
+
+    questions = test.questions.select_related("stats").prefetch_related(
+        Prefetch("options", queryset=Option.objects.select_related("stats")))
+    for question in questions:
+        item = analyze(question)      # None until someone has answered it
+        item.p_value, item.discrimination, item.flags, item.options
+
+Every submission adds to running sums per question (QuestionStats) and per
+chosen option (OptionStats). This is one upsert per table in the result's
+transaction (add_submission), so concurrent submissions can't lose updates.
+The sums are sufficient statistics: reading an analysis is arithmetic on a
+row loaded with its question, never a scan of the answers.
+
+- p-value (difficulty): share of responders answering correctly.
+- discrimination: point-biserial correlation between answering correctly
+  and the total test score,
+      r = (M1 - M0) / s * sqrt(p * (1 - p))
+  where M1/M0 are the mean totals of correct/incorrect responders and s is
+  the population standard deviation of totals. The item is not removed from
+  the total (the uncorrected index), which overstates r slightly on very
+  short tests.
+- distractors: each option's selection rate and the mean total of the
+  students who chose it.
+
+`manage.py rebuild_item_stats` recomputes the sums from QuestionResponse.
+That covers only responses still within their retention period.
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import OptionStats, QuestionResponse, QuestionStats
+
+MIN_RESPONSES = 5        # no flags before this many answers
+EASY, HARD = 0.9, 0.2    # p-value bounds
+MIN_DISCRIMINATION = 0.2
+
+
+@dataclass
+class OptionAnalysis:
+    option_id: int
+    picks: int
+    rate: float                     # share of the question's responders who chose it
+    mean_score: Optional[float]     # mean total score of those who chose it
+    flags: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ItemAnalysis:
+    responses: int
+    p_value: float
+    discrimination: Optional[float]  # None while undefined (everyone right/wrong, no spread)
+    flags: List[str] = field(default_factory=list)
+    options: List[OptionAnalysis] = field(default_factory=list)
+
+
+def _stats(obj):
+    # reverse one-to-one: missing rows raise RelatedObjectDoesNotExist, an AttributeError
+    return getattr(obj, "stats", None)
+
+
+def point_biserial(n: int, correct: int, score_sum: float, score_sq_sum: float, correct_score_sum: float):
+    if n < 2 or correct in (0, n):
+        return None
+    mean = score_sum / n
+    variance = score_sq_sum / n - mean * mean
+    if variance <= 1e-9:
+        return None
+    p = correct / n
+    mean_correct = correct_score_sum / correct
+    mean_incorrect = (score_sum - correct_score_sum) / (n - correct)
+    return (mean_correct - mean_incorrect) / math.sqrt(variance) * math.sqrt(p * (1 - p))
+
+
+def analyze(question) -> Optional[ItemAnalysis]:
+    """Item analysis for a question loaded with its stats (and its options' stats)."""
+    stats = _stats(question)
+    if stats is None or not stats.responses:
+        return None
+    n = stats.responses
+    item = ItemAnalysis(
+        responses=n,
+        p_value=stats.correct / n,
+        discrimination=point_biserial(n, stats.correct, stats.score_sum, stats.score_sq_sum,
+                                      stats.correct_score_sum),
+    )
+    enough = n >= MIN_RESPONSES
+    if enough and item.p_value > EASY:
+        item.flags.append("too easy")
+    if enough and item.p_value < HARD:
+        item.flags.append("too hard")
+    if enough and item.discrimination is not None and item.discrimination < MIN_DISCRIMINATION:
+        item.flags.append("negative discrimination" if item.discrimination < 0 else "low discrimination")
+
+    mean_correct = stats.correct_score_sum / stats.correct if stats.correct else None
+    for option in question.options.all():
+        option_stats = _stats(option)
+        picks = option_stats.picks if option_stats else 0
+        analysis = OptionAnalysis(
+            option_id=option.pk, picks=picks, rate=picks / n,
+            mean_score=option_stats.score_sum / picks if picks else None,
+        )
+        if enough and not option.is_correct:
+            if not picks:
+                analysis.flags.append("never chosen")
+            elif mean_correct is not None and analysis.mean_score > mean_correct:
+                analysis.flags.append("chosen by stronger students")
+        item.options.append(analysis)
+    return item
+
+
+# ============================== UPDATES ==============================
+
+def _increment(model, key: str, columns: List[str], rows: List[tuple]):
+    """INSERT the rows, or add them to the existing row's columns: one statement, safe under concurrency."""
+    if not rows:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    quoted = [connection.ops.quote_name(column) for column in [key, *columns]]
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(quoted)) + ")"] * len(rows))
+    updates = ", ".join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in quoted[1:])
+    sql = (f"INSERT INTO {table} ({', '.join(quoted)}) VALUES {placeholders} "
+           f"ON CONFLICT ({quoted[0]}) DO UPDATE SET {updates}")
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+
+
+def add_submission(score: float, responses):
+    """Add one submission's QuestionResponse rows (see myapp/responses.py) to the sums."""
+    score = float(score)
+    _increment(QuestionStats, "question_id",
+               ["responses", "correct", "score_sum", "score_sq_sum", "correct_score_sum"],
+               [(r.question_id, 1, int(r.is_correct), score, score * score, score if r.is_correct else 0.0)
+                for r in responses])
+    _increment(OptionStats, "option_id", ["picks", "score_sum"],
+               [(r.option_id, 1, score) for r in responses if r.option_id is not None])
+
+
+def rebuild() -> int:
+    """Recompute every question's and option's sums from the stored responses. Returns questions written."""
+    score = F("result__score")
+    with transaction.atomic():
+        QuestionStats.objects.all().delete()
+        OptionStats.objects.all().delete()
+        questions = QuestionResponse.objects.values("question").annotate(
+            n=Count("pk"), correct=Count("pk", filter=Q(is_correct=True)), score_sum=Sum(score),
+            score_sq_sum=Sum(score * score), correct_score_sum=Sum(score, filter=Q(is_correct=True)),
+        ).order_by()
+        written = QuestionStats.objects.bulk_create([
+            QuestionStats(question_id=row["question"], responses=row["n"], correct=row["correct"],
+                          score_sum=row["score_sum"] or 0, score_sq_sum=row["score_sq_sum"] or 0,
+                          correct_score_sum=row["correct_score_sum"] or 0)
+            for row in questions
+        ], batch_size=1000)
+        options = QuestionResponse.objects.exclude(option=None).values("option").annotate(
+            picks=Count("pk"), score_sum=Sum(score),
+        ).order_by()
+        OptionStats.objects.bulk_create([
+            OptionStats(option_id=row["option"], picks=row["picks"], score_sum=row["score_sum"] or 0)
+            for row in options
+        ], batch_size=1000)
+    return len(written)
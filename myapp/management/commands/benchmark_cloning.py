@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from myapp.benchmarks import CLONE_STRATEGIES, run_clone_benchmark
+
+
+class Command(BaseCommand):
+    help = "Time copying a large practice test row by row vs with myapp/cloning.py (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--questions", type=int, default=500)
+        parser.add_argument("--options", type=int, default=4, help="Options per question")
+        parser.add_argument("--iterations", type=int, default=3)
+        parser.add_argument("--strategies", nargs="*", choices=CLONE_STRATEGIES, default=list(CLONE_STRATEGIES))
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        report = run_clone_benchmark(options["questions"], options["options"], options["iterations"],
+                                     options["strategies"])
+
+        for result in report["results"]:
+            self.stdout.write(
+                f"{result['strategy']:<12} {result['questions']} questions / {result['options']} options  "
+                f"{result['queries']:>6} queries  {result['median_ms']:>9.1f} ms"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
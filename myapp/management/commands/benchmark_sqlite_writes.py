@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from myapp.benchmarks import WRITE_PROFILES, run_write_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure SQLite write contention: concurrent processes awarding points, deducting credits and "
+        "inserting results, with the old access pattern vs the tuned profile in myapp/sqlite.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8, help="Concurrent writer processes")
+        parser.add_argument("--seconds", type=float, default=5.0, help="Run time per profile")
+        parser.add_argument("--users", type=int, default=20, help="Rows the writers contend on")
+        parser.add_argument("--profiles", nargs="*", choices=WRITE_PROFILES, default=list(WRITE_PROFILES))
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        report = run_write_benchmark(options["writers"], options["seconds"], options["users"], options["profiles"])
+
+        for result in report["results"]:
+            self.stdout.write(
+                f"{result['profile']:<10} {result['tx_per_sec']:>9.1f} tx/s  "
+                f"{result['errors']:>5} locked errors  {result['retries']:>5} retries  "
+                f"{result['lost_points']:>6} lost points  {result['lost_credits']:>8} lost credits  "
+                f"p50 {result['p50_ms']}ms  p95 {result['p95_ms']}ms"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
@@ -0,0 +1,73 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from myapp.benchmarks import DEFAULT_VOLUMES, load_budgets, run_benchmarks, seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot views (wall time, SQL queries, peak memory) against the budgets "
+        "in myapp/fixtures/view_budgets.json. Runs on a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        for key, default in DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=default, dest=key,
+                                help=f"Seed volume for {key} (default {default})")
+        parser.add_argument("--iterations", type=int, default=5, help="Timed requests per view")
+        parser.add_argument("--only", nargs="*", help="Only run these benchmark names")
+        parser.add_argument("--budgets", help="Budgets JSON file (default myapp/fixtures/view_budgets.json)")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--warm-cache", action="store_true",
+                            help="Leave the app cache on (measures cached renders; budgets assume it is off)")
+        parser.add_argument("--fail-on-budget", action="store_true", help="Exit non-zero if any budget is exceeded")
+
+    def handle(self, *args, **options):
+        volumes = {key: options[key] for key in DEFAULT_VOLUMES}
+        budgets = load_budgets(options["budgets"])
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = seed_benchmark_data(**volumes)
+            report = run_benchmarks(user, budgets, options["iterations"], options["only"], options["warm_cache"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report["volumes"] = volumes
+        report["commit"] = self._git_commit()
+
+        for result in report["results"]:
+            line = (
+                f"{result['name']:<28} {result['status']:>3}  "
+                f"{result['queries']:>4} queries  "
+                f"{result['wall_ms']['median']:>8.2f}ms median  "
+                f"{result['peak_kb']:>9.1f}KB peak"
+            )
+            if result["violations"]:
+                self.stdout.write(self.style.ERROR(f"{line}  OVER BUDGET: {'; '.join(result['violations'])}"))
+            else:
+                self.stdout.write(line)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if report["passed"]:
+            self.stdout.write(self.style.SUCCESS("All views within budget."))
+        elif options["fail_on_budget"]:
+            raise SystemExit(1)
+
+    def _git_commit(self):
+        try:
+            return subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from myapp.related import build
+
+
+class Command(BaseCommand):
+    help = "Build the TF-IDF index behind \"related material\" (run from cron; --append between full builds)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--append", action="store_true",
+                            help="Only index activities created since the last build, as a new segment")
+        parser.add_argument("--path", help="Index directory (default: settings.RELATED_INDEX['path'])")
+
+    def handle(self, *args, **options):
+        manifest = build(options["path"], append=options["append"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {manifest['docs']} activities, {len(manifest['df'])} terms, "
+            f"{len(manifest['segments'])} segment(s)."
+        ))
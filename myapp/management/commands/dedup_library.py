@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.dedup import KINDS, duplicate_clusters, rebuild
+
+
+class Command(BaseCommand):
+    help = "Report (or delete) near-duplicate questions and flashcards in users' libraries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Email of the user to check (default: every user with indexed items)")
+        parser.add_argument("--kind", choices=list(KINDS), action="append", help="Default: all kinds")
+        parser.add_argument("--scope", choices=["owner", "activity"], default="owner",
+                            help="Compare across the whole library or only within each test/set")
+        parser.add_argument("--threshold", type=float, help="Jaccard similarity (default: settings.NEAR_DUPLICATES)")
+        parser.add_argument("--rebuild", action="store_true", help="Recompute the LSH buckets first")
+        parser.add_argument("--delete", action="store_true", help="Keep the oldest item of each cluster, delete the rest")
+
+    def handle(self, *args, **options):
+        kinds = options["kind"] or list(KINDS)
+        if options["rebuild"]:
+            for kind, count in rebuild(kinds).items():
+                self.stdout.write(f"Indexed {count} {kind} items.")
+
+        User = get_user_model()
+        if options["user"]:
+            try:
+                users = [User.objects.get(email=options["user"])]
+            except User.DoesNotExist:
+                raise CommandError(f"No user {options['user']!r}")
+        else:
+            users = User.objects.filter(lshbucket__isnull=False).distinct().order_by("pk")
+
+        found = deleted = 0
+        for user in users:
+            for kind in kinds:
+                model, text_field, _, _ = KINDS[kind]
+                for cluster in duplicate_clusters(user, kind, options["scope"], options["threshold"]):
+                    found += 1
+                    texts = dict(model.objects.filter(pk__in=cluster).values_list("pk", text_field))
+                    self.stdout.write(f"{user.email} {kind} {cluster}: {texts.get(cluster[0], '')[:80]!r}")
+                    if options["delete"]:
+                        for item in model.objects.filter(pk__in=cluster[1:]):
+                            item.delete()  # one by one, so the signals update caches and indexes
+                            deleted += 1
+
+        summary = f"{found} duplicate clusters"
+        if options["delete"]:
+            summary += f", {deleted} items deleted"
+        self.stdout.write(self.style.SUCCESS(summary + "."))
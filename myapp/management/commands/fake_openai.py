@@ -0,0 +1,417 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as email_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.validate_json import example_json_flashcard, example_json_practice_test
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec into a sampler returning milliseconds.
+    Supported: fixed:MS, uniform:LOW:HIGH, normal:MEAN:STDDEV, lognormal:MEDIAN:SIGMA
+    """
+    kind, *params = spec.split(":")
+    try:
+        params = [float(p) for p in params]
+        if kind == "fixed":
+            (ms,) = params
+            return lambda: ms
+        if kind == "uniform":
+            low, high = params
+            return lambda: random.uniform(low, high)
+        if kind == "normal":
+            mean, stddev = params
+            return lambda: max(0.0, random.gauss(mean, stddev))
+        if kind == "lognormal":
+            median, sigma = params
+            return lambda: random.lognormvariate(math.log(median), sigma)
+    except ValueError:
+        pass
+    raise CommandError(f"Invalid latency spec '{spec}' (e.g. fixed:200, uniform:100:2000, lognormal:800:0.6)")
+
+
+def estimate_tokens(text):
+    return max(1, len(text or "") // 4)
+
+
+def canned_practice_test(amount):
+    data = json.loads(json.dumps(example_json_practice_test))
+    template = data["questions"][0]
+    data["questions"] = [
+        {**template, "text": f"{template['text']} (variant {i + 1})"} for i in range(amount)
+    ]
+    return data
+
+
+def canned_flashcards(amount):
+    data = json.loads(json.dumps(example_json_flashcard))
+    cards = data["flashcards"]
+    data["flashcards"] = [
+        {"front": f"{cards[i % len(cards)]['front']} ({i + 1})", "back": cards[i % len(cards)]["back"]}
+        for i in range(amount)
+    ]
+    return data
+
+
+def build_reply(messages, json_mode, fixtures):
+    """Pick a plausible reply for the request based on what the app is asking for."""
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+
+    if json_mode:
+        match = re.search(r"exactly (\d+) (flashcards|questions)", prompt)
+        if match:
+            amount, kind = int(match.group(1)), match.group(2)
+            if kind in fixtures:
+                return json.dumps(fixtures[kind])
+            payload = canned_flashcards(amount) if kind == "flashcards" else canned_practice_test(amount)
+            return json.dumps(payload)
+        if "grading a student essay" in prompt:
+            return json.dumps(fixtures.get("essay") or {
+                "score": random.randint(55, 95),
+                "feedback": "Clear structure and a solid argument. Tighten the conclusion and cite more evidence.",
+            })
+        return json.dumps({"reply": "ok"})
+
+    return fixtures.get("text") or (
+        "Here is some feedback based on your recent activity: keep practising the topics where "
+        "your scores dip, and review explanations for questions you missed."
+    )
+
+
+def completion(body, options):
+    """A chat.completion object (no latency, no injected errors) and its reply text and usage."""
+    model = body.get("model", "gpt-4o-mini")
+    messages = body.get("messages") or []
+    json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+    content = build_reply(messages, json_mode, options["fixtures"])
+
+    prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+    completion_tokens = estimate_tokens(content)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": usage,
+    }, content, usage
+
+
+def injected_error(options):
+    """An (HTTP status, error body) pair for a request picked to fail, or None."""
+    if random.random() >= options["error_rate"]:
+        return None
+    status = random.choice(options["error_statuses"])
+    return status, {"error": {"message": f"Injected {status} error", "type": "server_error", "code": str(status)}}
+
+
+def parse_multipart(content_type, data):
+    """{field name: (filename, bytes)} of a multipart/form-data body."""
+    message = BytesParser(policy=email_policy).parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + data)
+    return {
+        part.get_param("name", header="content-disposition"): (part.get_filename(), part.get_payload(decode=True))
+        for part in message.iter_parts()
+    }
+
+
+def run_batch(server, input_file_id, endpoint):
+    """
+    Answer every request line of an uploaded batch file at once, like the real
+    Batch API would over its completion window. Failed lines go to the error file.
+    """
+    output, errors = [], []
+    for line in server.files[input_file_id]["content"].decode().splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        failure = injected_error(server.options)
+        if failure:
+            status, body = failure
+        else:
+            status, body = 200, completion(request.get("body") or {}, server.options)[0]
+        (errors if failure else output).append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+            "custom_id": request.get("custom_id"),
+            "response": {"status_code": status, "request_id": uuid.uuid4().hex, "body": body},
+            "error": None,
+        }))
+    output_id = add_file(server, "batch_output.jsonl", "batch_output", "\n".join(output).encode()) if output else None
+    error_id = add_file(server, "batch_errors.jsonl", "batch_output", "\n".join(errors).encode()) if errors else None
+    return {
+        "id": f"batch_{uuid.uuid4().hex[:24]}",
+        "object": "batch",
+        "endpoint": endpoint,
+        "input_file_id": input_file_id,
+        "completion_window": "24h",
+        "status": "completed",
+        "output_file_id": output_id,
+        "error_file_id": error_id,
+        "created_at": int(time.time()),
+        "completed_at": int(time.time()) + int(server.options["batch_delay"]),
+        "request_counts": {"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)},
+    }
+
+
+def add_file(server, filename, purpose, content):
+    file_id = f"file-{uuid.uuid4().hex[:24]}"
+    with server.state_lock:
+        server.files[file_id] = {"filename": filename, "purpose": purpose, "content": content,
+                                 "created_at": int(time.time())}
+    return file_id
+
+
+def file_object(file_id, entry):
+    return {
+        "id": file_id, "object": "file", "bytes": len(entry["content"]), "created_at": entry["created_at"],
+        "filename": entry["filename"], "purpose": entry["purpose"], "status": "processed",
+    }
+
+
+def batch_view(batch):
+    """A batch as a client sees it: in progress until its completion time (--batch-delay)."""
+    if time.time() >= batch["completed_at"]:
+        return batch
+    return {**batch, "status": "in_progress", "output_file_id": None, "error_file_id": None,
+            "completed_at": None}
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOpenAI/1.0"
+
+    # ------------------------------------------------------------------ utils
+
+    def log_message(self, fmt, *args):
+        if self.server.options["verbose"]:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return None
+
+    # --------------------------------------------------------------- routes
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        match = re.search(r"/batches/([\w-]+)$", path)
+        if match:
+            batch = self.server.batches.get(match.group(1))
+            if batch is None:
+                return self._send_json(404, {"error": {"message": "No such batch"}})
+            return self._send_json(200, batch_view(batch))
+        match = re.search(r"/files/([\w-]+)/content$", path)
+        if match:
+            entry = self.server.files.get(match.group(1))
+            if entry is None:
+                return self._send_json(404, {"error": {"message": "No such file"}})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(entry["content"])))
+            self.end_headers()
+            self.wfile.write(entry["content"])
+            return
+        if path.endswith("/models"):
+            models = sorted(self.server.options["model_latency"]) or ["gpt-4o", "gpt-4o-mini"]
+            return self._send_json(200, {
+                "object": "list",
+                "data": [{"id": m, "object": "model", "owned_by": "fake"} for m in models],
+            })
+        return self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/files"):
+            return self._upload_file()
+        if path.endswith("/batches"):
+            return self._create_batch()
+        if not path.endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "Not found"}})
+
+        body = self._read_json()
+        if body is None:
+            return self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+
+        options = self.server.options
+        model = body.get("model", "gpt-4o-mini")
+        sampler = options["model_latency"].get(model, options["latency"])
+        time.sleep(sampler() / 1000)
+
+        failure = injected_error(options)
+        if failure:
+            status, error = failure
+            return self._send_json(status, error, {"Retry-After": "1"} if status == 429 else None)
+
+        reply, content, usage = completion(body, options)
+        if body.get("stream"):
+            return self._stream(reply["id"], model, content, usage, body)
+        return self._send_json(200, reply)
+
+    def _upload_file(self):
+        fields = parse_multipart(self.headers.get("Content-Type", ""),
+                                 self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        if "file" not in fields:
+            return self._send_json(400, {"error": {"message": "Missing file", "type": "invalid_request_error"}})
+        filename, content = fields["file"]
+        purpose = (fields.get("purpose") or (None, b"batch"))[1].decode()
+        file_id = add_file(self.server, filename or "upload.jsonl", purpose, content)
+        return self._send_json(200, file_object(file_id, self.server.files[file_id]))
+
+    def _create_batch(self):
+        body = self._read_json()
+        if not body or body.get("input_file_id") not in self.server.files:
+            return self._send_json(400, {"error": {"message": "Unknown input_file_id", "type": "invalid_request_error"}})
+        batch = run_batch(self.server, body["input_file_id"], body.get("endpoint", "/v1/chat/completions"))
+        with self.server.state_lock:
+            self.server.batches[batch["id"]] = batch
+        return self._send_json(200, batch_view(batch))
+
+    def _stream(self, completion_id, model, content, usage, body):
+        """Server-sent events in the chat.completion.chunk format."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(delta, finish_reason=None, extra=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **(extra or {}),
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        step = self.server.options["chunk_chars"]
+        for i in range(0, len(content), step):
+            time.sleep(self.server.options["chunk_delay"] / 1000)
+            send({"content": content[i:i + step]})
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        send({}, "stop", {"usage": usage} if include_usage else None)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+DEFAULT_OPTIONS = {
+    "latency": lambda: 0.0,
+    "model_latency": {},
+    "error_rate": 0.0,
+    "error_statuses": [429, 500],
+    "chunk_chars": 20,
+    "chunk_delay": 30,
+    "fixtures": {},
+    "verbose": False,
+    "batch_delay": 0.0,
+}
+
+
+def make_server(host="127.0.0.1", port=0, **options):
+    """A ready (not yet serving) fake server; port 0 picks a free one. Tests run it in a thread."""
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.options = {**DEFAULT_OPTIONS, **options}
+    server.files, server.batches = {}, {}
+    server.state_lock = threading.Lock()
+    return server
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local OpenAI-compatible chat-completions (and files/batches) server for offline testing. "
+        "Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", default="lognormal:800:0.5",
+                            help="Default latency distribution, e.g. fixed:200, uniform:100:2000, "
+                                 "normal:800:200, lognormal:800:0.5")
+        parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                            help="Per-model latency override, e.g. gpt-4o=lognormal:20000:0.3")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (0-1)")
+        parser.add_argument("--error-status", type=int, action="append", default=[],
+                            help="HTTP status used for injected errors (repeatable, default 429 and 500)")
+        parser.add_argument("--chunk-chars", type=int, default=20, help="Characters per streamed chunk")
+        parser.add_argument("--chunk-delay", type=float, default=30, help="Milliseconds between streamed chunks")
+        parser.add_argument("--fixtures", help="JSON file with canned replies keyed by questions/flashcards/essay/text")
+        parser.add_argument("--batch-delay", type=float, default=0,
+                            help="Seconds a batch stays in_progress before its results are available")
+        parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+        parser.add_argument("--verbose", action="store_true", help="Log every request")
+
+    def handle(self, *args, **options):
+        if options["seed"] is not None:
+            random.seed(options["seed"])
+
+        model_latency = {}
+        for item in options["model_latency"]:
+            model, _, spec = item.partition("=")
+            if not spec:
+                raise CommandError(f"Expected MODEL=SPEC, got '{item}'")
+            model_latency[model] = parse_latency(spec)
+
+        fixtures = {}
+        if options["fixtures"]:
+            with open(options["fixtures"]) as f:
+                fixtures = json.load(f)
+
+        server = make_server(
+            options["host"], options["port"],
+            latency=parse_latency(options["latency"]),
+            model_latency=model_latency,
+            error_rate=options["error_rate"],
+            error_statuses=options["error_status"] or [429, 500],
+            chunk_chars=max(1, options["chunk_chars"]),
+            chunk_delay=options["chunk_delay"],
+            fixtures=fixtures,
+            verbose=options["verbose"],
+            batch_delay=options["batch_delay"],
+        )
+
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f"Fake OpenAI server listening on http://{host}:{port}/v1"))
+        self.stdout.write(f"Set OPENAI_BASE_URL=http://{host}:{port}/v1 to route the app's AI calls here.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Shutting down.")
+        finally:
+            server.server_close()
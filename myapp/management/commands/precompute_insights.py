@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.utils import client
+from progress.precompute import Checkpoint, checkpoint_path, collect_batch, due_users, run_live, submit_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate AI insights ahead of time for users with new results. Run it from cron; "
+        "an interrupted run or a submitted batch is picked up by the next invocation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["live", "batch"], default="live",
+                            help="live: concurrent chat completions now; batch: one Batch API job (cheaper, up to 24h)")
+        parser.add_argument("--days", type=int, help="Only users active this many days back (default: settings)")
+        parser.add_argument("--concurrency", type=int, help="Model calls in flight in live mode (default: settings)")
+        parser.add_argument("--limit", type=int, help="At most this many users in a new run")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: settings.INSIGHT_PRECOMPUTE)")
+        parser.add_argument("--restart", action="store_true", help="Discard an unfinished run and start over")
+
+    def handle(self, *args, **options):
+        path = options["checkpoint"] or checkpoint_path()
+        run = None if options["restart"] else Checkpoint.load(path)
+        if run is not None and run.mode != options["mode"]:
+            raise CommandError(f"An unfinished {run.mode} run is checkpointed in {path}; "
+                               f"resume it with --mode {run.mode} or pass --restart.")
+        if run is None:
+            users = due_users(options["days"])[:options["limit"]]
+            run = Checkpoint.start(path, options["mode"], users)
+            self.stdout.write(f"{len(users)} users due.")
+        else:
+            self.stdout.write(f"Resuming the run from {run.started}: {len(run.pending)} of {len(run.users)} users pending.")
+
+        if run.mode == "live":
+            report = run_live(run, client, options["concurrency"])
+        elif run.batch_id:
+            report = collect_batch(run, client)
+            self.stdout.write(f"Batch {report['status']}.")
+        else:
+            batch_id = submit_batch(run, client)
+            if batch_id:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Submitted batch {batch_id} for {len(run.pending)} users; run again to collect it."))
+            else:
+                self.stdout.write(self.style.SUCCESS("Every insight is current."))
+            return
+
+        summary = f"{report['stored']} insights stored, {report['failed']} failed"
+        summary += "." if report["complete"] else f"; {len(run.pending)} users pending for the next run."
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from myapp.responses import prune
+
+
+class Command(BaseCommand):
+    help = "Delete per-question responses past the retention period (run daily)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Keep this many days (default: settings.QUESTION_RESPONSES)")
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        deleted = prune(options["days"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} responses."))
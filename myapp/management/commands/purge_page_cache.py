@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp.pagecache import purge
+
+
+class Command(BaseCommand):
+    help = "Drop cached anonymous pages (all of them, or only those with the given tags). Run after deploys."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tags", nargs="*", help="Page tags to purge, e.g. blog plans (default: every page)")
+
+    def handle(self, *args, **options):
+        purge(*options["tags"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {', '.join(options['tags']) or 'all cached pages'}."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp.catalog import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recreate the public catalog and its popularity scores from the activity and result tables."
+
+    def handle(self, *args, **options):
+        total = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Catalog rebuilt with {total} entries."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp.item_analysis import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-question and per-option item analysis sums from the stored responses."
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {count} questions."))
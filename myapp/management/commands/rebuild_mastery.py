@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp.mastery import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's per-subject mastery from the stored responses and graded essays."
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt mastery for {count} user subjects."))
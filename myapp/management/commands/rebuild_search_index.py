@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.search import SOURCES, rebuild
+
+
+class Command(BaseCommand):
+    help = "Reindex searchable objects from scratch (after bulk imports or a restore)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kinds", nargs="*", help=f"Kinds to reindex: {', '.join(SOURCES)} (default: all)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        unknown = set(options["kinds"]) - SOURCES.keys()
+        if unknown:
+            raise CommandError(f"Unknown kinds: {', '.join(sorted(unknown))}")
+
+        counts = rebuild(options["kinds"], batch_size=options["batch_size"])
+        for kind, count in counts.items():
+            self.stdout.write(f"{kind}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {sum(counts.values())} documents."))
@@ -0,0 +1,234 @@
+"""
+Per-subject mastery: how well a user knows each subject, kept up to date
+as results come in, so AI generation can target the weakest topics.
+
+    mastery.add_responses(user.pk, rows, when)   # a practice test's QuestionResponse rows
+    mastery.result_saved(result, created, update_fields)   # an essay's grade (post_save)
+    topics = mastery.weakest(user.pk)            # lowest estimated skill first
+    mastery.focus_prompt(topics, "keep it short")
+
+One SubjectMastery row per (user, subject) holds answer counts and `skill`,
+an exponentially weighted moving average of correctness (ALPHA per answer).
+n answers with accuracy a move it as
+    skill = skill * (1 - alpha)^n + (1 - (1 - alpha)^n) * a
+which is exactly n single-answer steps at the batch's mean. The row also
+carries the user's Elo rating in the subject (see myapp/adaptive.py). A
+submission is one upsert for all its subjects, so concurrent results can't
+lose updates.
+
+Reading applies forgetting: the further the last practice lies back, the
+closer the estimate drifts to PRIOR ("unknown"), with a half-life of
+MASTERY["half_life_days"]. The prompt gets a line per weak subject instead
+of the user's raw result history.
+
+`manage.py rebuild_mastery` replays the stored responses and graded essays.
+Responses older than QUESTION_RESPONSES["retention_days"] are gone by then.
+"""
+
+import heapq
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import QuestionResponse, SubjectMastery, WritingTaskResult
+
+PRIOR = 0.5  # skill of a subject nobody has evidence about
+
+DEFAULTS = {
+    "alpha": 0.1,
+    "half_life_days": 30,
+    "writing_weight": 5,
+    "min_answers": 3,
+    "topics": 3,
+}
+
+
+def _conf():
+    return {**DEFAULTS, **getattr(settings, "MASTERY", {})}
+
+
+def normalize_subject(subject: Optional[str]) -> str:
+    return " ".join((subject or "").split())[:100] or "General"
+
+
+@dataclass
+class Estimate:
+    subject: str
+    skill: float          # 0-1, after forgetting
+    accuracy: float       # share correct over every recorded answer
+    answers: int
+    days_idle: int        # since the subject was last practised
+
+
+# ============================== UPDATES ==============================
+
+def _decay(weight: float, alpha: float) -> float:
+    return (1 - alpha) ** weight
+
+
+def _upsert(owner_id, batches: Dict[str, Tuple[int, float, float, float]], when: datetime):
+    """
+    Add {subject: (answers, correct, weight, rating change)} to the owner's
+    rows. New rows start from PRIOR and the default rating; existing ones
+    take the decayed update in the same INSERT ... ON CONFLICT statement.
+    """
+    if not batches:
+        return
+    alpha = _conf()["alpha"]
+    table = connection.ops.quote_name(SubjectMastery._meta.db_table)
+    q = connection.ops.quote_name
+    when = connection.ops.adapt_datetimefield_value(when)
+    initial_rating = SubjectMastery._meta.get_field("rating").default
+
+    values, params, cases, case_params = [], [], [], []
+    for subject, (answers, correct, weight, rating_change) in batches.items():
+        decay = _decay(weight, alpha)
+        accuracy = correct / answers
+        values.append("(%s, %s, %s, %s, %s, %s, %s)")
+        params += [owner_id, subject, answers, correct, PRIOR * decay + (1 - decay) * accuracy,
+                   initial_rating + rating_change, when]
+        cases.append("WHEN %s THEN %s")
+        case_params += [subject, decay]
+
+    # EXCLUDED.skill is the update applied to PRIOR, so old*d + (1-d)*a == EXCLUDED.skill + d*(old - PRIOR)
+    sql = (
+        f"INSERT INTO {table} ({q('owner_id')}, {q('subject')}, {q('answers')}, {q('correct')}, "
+        f"{q('skill')}, {q('rating')}, {q('last_practiced')}) VALUES {', '.join(values)} "
+        f"ON CONFLICT ({q('owner_id')}, {q('subject')}) DO UPDATE SET "
+        f"{q('answers')} = {table}.{q('answers')} + EXCLUDED.{q('answers')}, "
+        f"{q('correct')} = {table}.{q('correct')} + EXCLUDED.{q('correct')}, "
+        f"{q('skill')} = EXCLUDED.{q('skill')} + (CASE EXCLUDED.{q('subject')} {' '.join(cases)} END) "
+        f"* ({table}.{q('skill')} - %s), "
+        f"{q('rating')} = {table}.{q('rating')} + EXCLUDED.{q('rating')} - %s, "
+        f"{q('last_practiced')} = EXCLUDED.{q('last_practiced')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + case_params + [PRIOR, initial_rating])
+
+
+def add_responses(owner_id, responses: Iterable[QuestionResponse], when: datetime,
+                  rating_changes: Optional[Dict[str, float]] = None):
+    """
+    Add one submission's graded answers (see myapp/responses.py), grouped by
+    subject, and the user's rating changes from myapp/adaptive.py.
+    """
+    rating_changes = rating_changes or {}
+    batches = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for response in responses:
+        subject = normalize_subject(response.subject)
+        batch = batches[subject]
+        batch[0] += 1
+        batch[1] += int(response.is_correct)
+        batch[2] += 1
+        batch[3] = rating_changes.get(subject, 0.0)
+    _upsert(owner_id, {subject: tuple(batch) for subject, batch in batches.items()}, when)
+
+
+def _essay_accuracy(score) -> float:
+    return min(max(float(score or 0) / 100, 0.0), 1.0)
+
+
+def result_saved(result, created: bool, update_fields=None):
+    """An essay counts once graded: saved with update_fields including "feedback" (as in catalog.py)."""
+    if created or not isinstance(result, WritingTaskResult):
+        return
+    if not (update_fields and "feedback" in update_fields) or result.owner_id is None:
+        return
+    subject = normalize_subject(result.writing_task.subject)
+    _upsert(result.owner_id, {subject: (1, _essay_accuracy(result.score), _conf()["writing_weight"], 0.0)},
+            timezone.now())
+
+
+def rebuild() -> int:
+    """
+    Recompute every user's rows by replaying responses and graded essays in
+    time order. Ratings can't be replayed (they depend on every user's
+    answers in turn), so they are kept. Returns rows written.
+    """
+    conf = _conf()
+    ratings = {(owner_id, subject): rating for owner_id, subject, rating
+               in SubjectMastery.objects.values_list("owner_id", "subject", "rating")}
+    answers = QuestionResponse.objects.order_by("owner_id", "answered_at", "pk").values_list(
+        "owner_id", "answered_at", "subject", "is_correct")
+    essays = WritingTaskResult.objects.exclude(owner=None).exclude(feedback=None).order_by(
+        "owner_id", "taken_at", "pk").values_list("owner_id", "taken_at", "writing_task__subject", "score")
+    events = heapq.merge(
+        ((owner, at, subject, float(correct), 1) for owner, at, subject, correct in answers.iterator()),
+        ((owner, at, subject, _essay_accuracy(score), conf["writing_weight"])
+         for owner, at, subject, score in essays.iterator()),
+        key=lambda event: (event[0], event[1]),
+    )
+
+    rows = {}
+    for owner_id, at, subject, accuracy, weight in events:
+        key = (owner_id, normalize_subject(subject))
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = SubjectMastery(owner_id=owner_id, subject=key[1], skill=PRIOR)
+            if key in ratings:
+                row.rating = ratings[key]
+        decay = _decay(weight, conf["alpha"])
+        row.answers += 1
+        row.correct += accuracy
+        row.skill = row.skill * decay + (1 - decay) * accuracy
+        row.last_practiced = at
+
+    with transaction.atomic():
+        SubjectMastery.objects.all().delete()
+        SubjectMastery.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+# ============================== READING ==============================
+
+def estimates(owner_id, now: Optional[datetime] = None) -> List[Estimate]:
+    """Every subject of the user, lowest skill first."""
+    conf = _conf()
+    now = now or timezone.now()
+    result = []
+    for row in SubjectMastery.objects.filter(owner_id=owner_id):
+        days = max((now - row.last_practiced).total_seconds() / 86400, 0.0)
+        retained = 0.5 ** (days / conf["half_life_days"])
+        result.append(Estimate(
+            subject=row.subject,
+            skill=PRIOR + (row.skill - PRIOR) * retained,
+            accuracy=row.correct / row.answers if row.answers else 0.0,
+            answers=row.answers,
+            days_idle=int(days),
+        ))
+    result.sort(key=lambda estimate: (estimate.skill, estimate.subject))
+    return result
+
+
+def weakest(owner_id, n: Optional[int] = None, now: Optional[datetime] = None) -> List[Estimate]:
+    """The n subjects with the lowest skill among those with enough answers to judge."""
+    conf = _conf()
+    ranked = [e for e in estimates(owner_id, now) if e.answers >= conf["min_answers"]]
+    return ranked[:n or conf["topics"]]
+
+
+def summary(topics: Iterable[Estimate]) -> str:
+    """One short line per subject, for prompts."""
+    return "\n".join(
+        f"- {e.subject}: skill {e.skill:.2f}, {e.accuracy:.0%} correct over {e.answers} answers, "
+        f"last practised {e.days_idle} days ago"
+        for e in topics
+    )
+
+
+def focus_prompt(topics: List[Estimate], instructions: str = "") -> str:
+    """Generation prompt aimed at the given weak subjects."""
+    prompt = (
+        "Create practice for a student in their weakest subjects. Skill is 0 (nothing known) to 1 "
+        "(mastered). Give more items to lower skills, pitch each subject slightly above its current "
+        "level, and set each item's subject to the subject it belongs to.\n"
+        f"{summary(topics)}"
+    )
+    if instructions.strip():
+        prompt += f"\n\nAdditional instructions from the student: {instructions.strip()}"
+    return prompt
@@ -0,0 +1,414 @@
+"""
+In-process metrics registry exposed in Prometheus text format.
+
+    AI_TOKENS = Counter("ai_tokens_total", "Tokens consumed", ["task"])
+    AI_TOKENS.labels(task="chatbot").inc(812)
+
+Counters, gauges and histograms work across multiple worker processes when
+settings.METRICS_DIR is set. Each process then writes its values into its own
+memory-mapped file in that directory, and a scrape merges every file.
+Counters and histograms are summed over all files, including those of workers
+that have exited. Gauges are summed over live processes only. Without
+METRICS_DIR everything stays in memory (single process, e.g. runserver).
+"""
+
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+AI_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+_INITIAL_SIZE = 64 * 1024
+_HEADER = struct.Struct("i")
+_KEY_LEN = struct.Struct("i")
+_VALUE = struct.Struct("d")
+
+
+# ======================== STORAGE ========================
+
+class MmapStore:
+    """
+    Append-only key -> float64 map in a memory-mapped file.
+
+    Layout: [int32 used bytes][padding] then entries of
+    [int32 key length][utf-8 key padded to 8 bytes][float64 value].
+    Only the owning process writes; readers just scan the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._positions: Dict[str, int] = {}
+        exists = os.path.exists(path)
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists or os.path.getsize(path) == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._capacity = os.path.getsize(path)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or 8
+        for key, _, pos in self._scan(self._map, self._used):
+            self._positions[key] = pos
+
+    @staticmethod
+    def _scan(data, used) -> Iterable[Tuple[str, float, int]]:
+        pos = 8
+        while pos < used:
+            key_len = _KEY_LEN.unpack_from(data, pos)[0]
+            padded = key_len + (-(4 + key_len) % 8)
+            key = bytes(data[pos + 4:pos + 4 + key_len]).decode()
+            value_pos = pos + 4 + padded
+            yield key, _VALUE.unpack_from(data, value_pos)[0], value_pos
+            pos = value_pos + 8
+
+    @classmethod
+    def read_file(cls, path: str) -> Dict[str, float]:
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < 8:
+            return {}
+        used = _HEADER.unpack_from(data, 0)[0]
+        return {key: value for key, value, _ in cls._scan(data, used)}
+
+    def _add_key(self, key: str) -> int:
+        encoded = key.encode()
+        padded = len(encoded) + (-(4 + len(encoded)) % 8)
+        entry_size = 4 + padded + 8
+        while self._used + entry_size > self._capacity:
+            self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        pos = self._used
+        _KEY_LEN.pack_into(self._map, pos, len(encoded))
+        self._map[pos + 4:pos + 4 + len(encoded)] = encoded
+        value_pos = pos + 4 + padded
+        _VALUE.pack_into(self._map, value_pos, 0.0)
+        self._used += entry_size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_pos
+        return value_pos
+
+    def get(self, key: str) -> float:
+        pos = self._positions.get(key)
+        return 0.0 if pos is None else _VALUE.unpack_from(self._map, pos)[0]
+
+    def set(self, key: str, value: float):
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._add_key(key)
+        _VALUE.pack_into(self._map, pos, value)
+
+    def items(self) -> Dict[str, float]:
+        return {key: _VALUE.unpack_from(self._map, pos)[0] for key, pos in self._positions.items()}
+
+
+class MemoryStore:
+    def __init__(self):
+        self._values: Dict[str, float] = {}
+
+    def get(self, key: str) -> float:
+        return self._values.get(key, 0.0)
+
+    def set(self, key: str, value: float):
+        self._values[key] = value
+
+    def items(self) -> Dict[str, float]:
+        return dict(self._values)
+
+
+class Backend:
+    """Picks memory or per-process mmap stores and merges them at scrape time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stores: Dict[str, object] = {}
+        self._pid: Optional[int] = None
+
+    @property
+    def directory(self) -> str:
+        return getattr(settings, "METRICS_DIR", "") or ""
+
+    def store(self, kind: str):
+        """kind is 'counter' (summed forever) or 'gauge' (summed over live processes)."""
+        pid = os.getpid()
+        if pid != self._pid:  # forked worker: start fresh files
+            self._stores, self._pid = {}, pid
+        if kind not in self._stores:
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                self._stores[kind] = MmapStore(os.path.join(self.directory, f"{kind}_{pid}.db"))
+            else:
+                self._stores[kind] = MemoryStore()
+        return self._stores[kind]
+
+    def update(self, kind: str, key: str, fn: Callable[[float], float]):
+        with self._lock:
+            store = self.store(kind)
+            store.set(key, fn(store.get(key)))
+
+    def collect(self) -> Dict[str, float]:
+        with self._lock:
+            if not self.directory:
+                merged: Dict[str, float] = {}
+                for store in self._stores.values():
+                    for key, value in store.items().items():
+                        merged[key] = merged.get(key, 0.0) + value
+                return merged
+
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, "*.db")):
+            kind, _, pid = os.path.basename(path)[:-3].partition("_")
+            if kind == "gauge" and not _pid_alive(int(pid)):
+                continue
+            for key, value in MmapStore.read_file(path).items():
+                merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+backend = Backend()
+
+
+# ======================== METRIC TYPES ========================
+
+def _key(name: str, labels: Sequence[Tuple[str, str]]) -> str:
+    return json.dumps([name, list(labels)])
+
+
+class _Child:
+    def __init__(self, metric: "Metric", labels: Tuple[Tuple[str, str], ...]):
+        self._metric = metric
+        self._labels = labels
+
+    def inc(self, amount: float = 1):
+        self._metric._update(self._labels, "", lambda v: v + amount)
+
+    def dec(self, amount: float = 1):
+        self._metric._update(self._labels, "", lambda v: v - amount)
+
+    def set(self, value: float):
+        self._metric._update(self._labels, "", lambda v: value)
+
+    def observe(self, value: float):
+        metric = self._metric
+        for bound in metric.buckets:
+            if value <= bound:
+                metric._update(self._labels + (("le", _format_float(bound)),), "_bucket", lambda v: v + 1)
+                break
+        else:
+            metric._update(self._labels + (("le", "+Inf"),), "_bucket", lambda v: v + 1)
+        metric._update(self._labels, "_sum", lambda v: v + value)
+        metric._update(self._labels, "_count", lambda v: v + 1)
+
+
+class Metric:
+    kind = "counter"
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        registry.register(self)
+
+    def labels(self, **labels) -> _Child:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return _Child(self, tuple((name, str(labels[name])) for name in self.labelnames))
+
+    def _update(self, labels, suffix: str, fn):
+        backend.update(self.kind, _key(self.name + suffix, labels), fn)
+
+    # unlabelled shortcuts
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class Counter(Metric):
+    pass
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    type_name = "gauge"
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+
+# ======================== REGISTRY / EXPOSITION ========================
+
+def _format_float(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else f"{value:.1f}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample_line(name: str, labels: Sequence[Tuple[str, str]], value: float) -> str:
+    label_text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels)
+    label_text = f"{{{label_text}}}" if label_text else ""
+    return f"{name}{label_text} {int(value) if float(value).is_integer() else repr(float(value))}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def register_collector(self, collector):
+        """
+        Register a callable evaluated at scrape time. It yields
+        (name, type, help, labels, value) tuples for values that are cheaper to read
+        than to track (e.g. queue depth from the database).
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def generate_latest(self) -> str:
+        values = backend.collect()
+        by_name: Dict[str, List[Tuple[Tuple, float]]] = {}
+        for key, value in values.items():
+            name, labels = json.loads(key)
+            by_name.setdefault(name, []).append((tuple(tuple(pair) for pair in labels), value))
+
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            if isinstance(metric, Histogram):
+                lines.extend(self._histogram_lines(metric, by_name))
+            else:
+                for labels, value in sorted(by_name.get(metric.name, [])):
+                    lines.append(_sample_line(metric.name, labels, value))
+
+        for collector in self._collectors:
+            seen = set()
+            for name, type_name, documentation, labels, value in collector():
+                if name not in seen:
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {type_name}")
+                    seen.add(name)
+                lines.append(_sample_line(name, tuple(labels.items()), value))
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(metric: Histogram, by_name) -> List[str]:
+        series: Dict[Tuple, Dict] = {}
+        for labels, value in by_name.get(metric.name + "_bucket", []):
+            base = tuple(pair for pair in labels if pair[0] != "le")
+            le = dict(labels)["le"]
+            series.setdefault(base, {})[le] = value
+
+        lines = []
+        for base in sorted(series):
+            cumulative = 0.0
+            for bound in [_format_float(b) for b in metric.buckets] + ["+Inf"]:
+                cumulative += series[base].get(bound, 0.0)
+                lines.append(_sample_line(metric.name + "_bucket", base + (("le", bound),), cumulative))
+            for suffix in ("_sum", "_count"):
+                value = dict(by_name.get(metric.name + suffix, [])).get(base, 0.0)
+                lines.append(_sample_line(metric.name + suffix, base, value))
+        return lines
+
+
+registry = Registry()
+
+
+# ======================== APP METRICS ========================
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by URL name", ["view", "method", "status"],
+)
+AI_REQUESTS = Counter("ai_requests_total", "AI model calls by task, model and outcome", ["task", "model", "outcome"])
+AI_REQUEST_SECONDS = Histogram(
+    "ai_request_duration_seconds", "AI model call latency", ["task", "model"], buckets=AI_BUCKETS,
+)
+AI_ROUTER_DECISIONS = Counter(
+    "ai_router_decisions_total", "Model router decisions by task, model and reason", ["task", "model", "reason"],
+)
+AI_TOKENS = Counter("ai_tokens_total", "Tokens consumed by AI calls", ["kind"])
+AI_CREDITS_DEDUCTED = Counter("ai_credits_deducted_total", "AI credits deducted from users")
+AI_ACTIVITY_GENERATIONS = Counter(
+    "ai_activity_generations_total", "AI activity generations by type and outcome", ["activity_type", "outcome"],
+)
+ESSAY_GRADING_IN_PROGRESS = Gauge("essay_grading_in_progress", "Essays currently being graded")
+ESSAY_GRADING_SECONDS = Histogram("essay_grading_duration_seconds", "End-to-end essay grading time", buckets=AI_BUCKETS)
+CACHE_LOOKUPS = Counter(
+    "app_cache_lookups_total", "Tiered cache lookups by namespace and the tier that answered", ["namespace", "tier"],
+)
+FLASHCARD_ACTIONS = Counter("flashcard_actions_total", "Flashcard endpoint calls by action", ["action"])
+STRIPE_WEBHOOK_EVENTS = Counter("stripe_webhook_events_total", "Stripe webhook events received", ["type"])
+STRIPE_WEBHOOK_LAG_SECONDS = Histogram(
+    "stripe_webhook_lag_seconds", "Delay between Stripe creating an event and us receiving it",
+    buckets=(1, 5, 15, 30, 60, 300, 900, 3600),
+)
+STRIPE_WEBHOOK_DUPLICATES = Counter("stripe_webhook_duplicates_total", "Stripe webhook redeliveries of events already stored")
+STRIPE_WEBHOOK_PROCESSED = Counter(
+    "stripe_webhook_processed_total", "Stripe webhook events run by the worker, by outcome (done/retry/failed)",
+    ["type", "outcome"],
+)
+SEARCH_QUERY_SECONDS = Histogram("search_query_duration_seconds", "Full-text search query time", ["backend"])
+NEAR_DUPLICATES_SKIPPED = Counter(
+    "near_duplicates_skipped_total", "Generated questions/cards dropped as near-duplicates", ["kind"],
+)
+
+
+@registry.register_collector
+def grading_queue_depth():
+    """Essay submissions still waiting for AI feedback (read from the DB at scrape time)."""
+    from .models import WritingTaskResult
+
+    pending = WritingTaskResult.objects.filter(feedback__isnull=True).count()
+    yield ("essay_grading_queue_depth", "gauge", "Essay submissions awaiting AI grading", {}, pending)
+
+
+@registry.register_collector
+def stripe_webhook_backlog():
+    """Stored Stripe events not yet applied, and those given up on (read from the DB at scrape time)."""
+    from django.db.models import Count
+    from accounts.models import StripeWebhookEvent
+
+    counts = dict(
+        StripeWebhookEvent.objects.exclude(status=StripeWebhookEvent.DONE)
+        .values_list("status").annotate(n=Count("pk")).values_list("status", "n")
+    )
+    for status in (StripeWebhookEvent.PENDING, StripeWebhookEvent.PROCESSING, StripeWebhookEvent.FAILED):
+        yield ("stripe_webhook_backlog", "gauge", "Stored Stripe webhook events by status", {"status": status},
+               counts.get(status, 0))
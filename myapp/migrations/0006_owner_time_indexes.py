@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_flashcardsetprogress_last_reviewed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcardset',
+            index=models.Index(fields=['owner', 'created_at'], name='flashcardset_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flashcardsetprogress',
+            index=models.Index(fields=['owner', 'last_reviewed'], name='fsprogress_owner_reviewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicetest',
+            index=models.Index(fields=['owner', 'created_at'], name='practicetest_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicetestresult',
+            index=models.Index(fields=['owner', 'taken_at'], name='ptresult_owner_taken_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='writingtask',
+            index=models.Index(fields=['owner', 'created_at'], name='writingtask_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='writingtaskresult',
+            index=models.Index(fields=['owner', 'taken_at'], name='wtresult_owner_taken_idx'),
+        ),
+    ]
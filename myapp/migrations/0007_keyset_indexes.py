@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_owner_time_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='flashcardset',
+            name='flashcardset_owner_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='practicetest',
+            name='practicetest_owner_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='writingtask',
+            name='writingtask_owner_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='flashcardset',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='flashcardset_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practicetest',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='practicetest_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='writingtask',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='writingtask_owner_created_idx'),
+        ),
+    ]
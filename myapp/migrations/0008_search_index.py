@@ -0,0 +1,89 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:06
+
+from django.db import migrations, models
+
+# Full-text index over SearchDocument (see myapp/search.py). SQLite gets an
+# external-content FTS5 table kept in step by triggers; Postgres gets a GIN
+# index on the same weighted tsvector expression the search query uses.
+
+FTS_TABLE = "myapp_searchdocument_fts"
+
+SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, body, scope,
+        content='myapp_searchdocument', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER myapp_searchdocument_ai AFTER INSERT ON myapp_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body, scope) VALUES (new.id, new.title, new.body, new.scope);
+    END""",
+    f"""CREATE TRIGGER myapp_searchdocument_ad AFTER DELETE ON myapp_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body, scope)
+        VALUES ('delete', old.id, old.title, old.body, old.scope);
+    END""",
+    f"""CREATE TRIGGER myapp_searchdocument_au AFTER UPDATE ON myapp_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body, scope)
+        VALUES ('delete', old.id, old.title, old.body, old.scope);
+        INSERT INTO {FTS_TABLE}(rowid, title, body, scope) VALUES (new.id, new.title, new.body, new.scope);
+    END""",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS myapp_searchdocument_ai",
+    "DROP TRIGGER IF EXISTS myapp_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS myapp_searchdocument_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _postgres_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    vector = SearchVector("title", weight="A", config="english") + SearchVector("body", weight="B", config="english")
+    return GinIndex(vector, name="searchdoc_vector_idx")
+
+
+def create_full_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for sql in SQLITE_CREATE:
+            schema_editor.execute(sql)
+    elif vendor == "postgresql":
+        schema_editor.add_index(apps.get_model("myapp", "SearchDocument"), _postgres_index())
+
+
+def drop_full_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for sql in SQLITE_DROP:
+            schema_editor.execute(sql)
+    elif vendor == "postgresql":
+        schema_editor.remove_index(apps.get_model("myapp", "SearchDocument"), _postgres_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.CharField(max_length=36)),
+                ('parent_id', models.CharField(blank=True, max_length=36)),
+                ('scope', models.CharField(max_length=24)),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='searchdoc_kind_object_uniq')],
+            },
+        ),
+        migrations.RunPython(create_full_text_index, drop_full_text_index),
+    ]
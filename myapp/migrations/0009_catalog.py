@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcardset',
+            name='copied_from',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='copies', to='myapp.flashcardset'),
+        ),
+        migrations.AddField(
+            model_name='practicetest',
+            name='copied_from',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='copies', to='myapp.practicetest'),
+        ),
+        migrations.AddField(
+            model_name='writingtask',
+            name='copied_from',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='copies', to='myapp.writingtask'),
+        ),
+        migrations.CreateModel(
+            name='CatalogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True, max_length=300)),
+                ('subject', models.CharField(blank=True, max_length=100)),
+                ('difficulty', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('scored_attempts', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('copies', models.PositiveIntegerField(default=0)),
+                ('popularity', models.FloatField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'popularity', 'id'], name='catalog_kind_popular_idx'), models.Index(fields=['kind', 'subject', 'popularity', 'id'], name='catalog_subject_popular_idx'), models.Index(fields=['kind', 'difficulty', 'popularity', 'id'], name='catalog_difficulty_popular_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='catalog_kind_object_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_lsh_buckets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(blank=True, max_length=100)),
+                ('text', models.CharField(blank=True, max_length=500)),
+                ('is_correct', models.BooleanField()),
+                ('similarity', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('answered_at', models.DateTimeField()),
+                ('option', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='myapp.option')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='myapp.question')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='myapp.practicetestresult')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'is_correct'], name='qresponse_question_idx'), models.Index(fields=['owner', 'subject', 'answered_at'], name='qresponse_owner_subject_idx'), models.Index(fields=['answered_at'], name='qresponse_answered_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_question_responses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OptionStats',
+            fields=[
+                ('option', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='myapp.option')),
+                ('picks', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='myapp.question')),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sq_sum', models.FloatField(default=0)),
+                ('correct_score_sum', models.FloatField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_item_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubjectMastery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=100)),
+                ('answers', models.PositiveIntegerField(default=0)),
+                ('correct', models.FloatField(default=0)),
+                ('skill', models.FloatField(default=0.5)),
+                ('last_practiced', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mastery', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('owner', 'subject'), name='mastery_owner_subject_uniq')],
+            },
+        ),
+    ]
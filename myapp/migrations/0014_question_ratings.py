@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_subject_mastery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='rating',
+            field=models.FloatField(default=1500, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subjectmastery',
+            name='rating',
+            field=models.FloatField(default=1500),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', 'rating'], name='question_subject_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_question_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='source',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='myapp.question'),
+        ),
+    ]
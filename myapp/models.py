@@ -12,6 +12,9 @@ class BaseTest(models.Model):
     duration = models.IntegerField(help_text="Duration in minutes", default=30, blank=True, null=True)
     is_public = models.BooleanField(default=True)
     difficulty = models.CharField(max_length=50, blank=True, null=True)  # e.g., Easy, Medium, Hard
+    # the catalog original this was added from; attempts on the copy count towards it (see myapp/catalog.py)
+    copied_from = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL,
+                                    related_name='copies', editable=False)
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
@@ -23,7 +26,8 @@ class BaseTest(models.Model):
 
 
 class PracticeTest(BaseTest): # add an auto add questions field
-    pass
+    class Meta:
+        indexes = [models.Index(fields=["owner", "created_at", "id"], name="practicetest_owner_created_idx")]
 
 QUESTION_TYPES = (
     ('mcq', 'Multiple Choice'),
@@ -39,10 +43,17 @@ class Question(models.Model):
 
     answer = models.CharField(max_length=200, blank=True, null=True)  # Correct answer for text types
     explanation = models.TextField(blank=True, null=True, max_length=5000)  # Optional explanation field
+    rating = models.FloatField(default=1500, editable=False)  # Elo difficulty (see myapp/adaptive.py)
+    # bank question an adaptive test's copy was made from; answers to the copy rate this one
+    source = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+                               editable=False)
 
     def __str__(self):
         return self.text[:50]  # Display first 50 characters of the question text
 
+    class Meta:
+        indexes = [models.Index(fields=["subject", "rating"], name="question_subject_rating_idx")]
+
 class Option(models.Model):
     question = models.ForeignKey(Question, related_name='options', on_delete=models.CASCADE)
     text = models.CharField(max_length=200)
@@ -63,6 +74,9 @@ class WritingTask(BaseTest):
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [models.Index(fields=["owner", "created_at", "id"], name="writingtask_owner_created_idx")]
+
 # -------------------------------Test Results-----------------------------------------
 
 class TestResult(models.Model):
@@ -88,15 +102,22 @@ class TestResult(models.Model):
 class PracticeTestResult(TestResult):
     practice_test = models.ForeignKey(PracticeTest, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [models.Index(fields=["owner", "taken_at"], name="ptresult_owner_taken_idx")]
+
 class WritingTaskResult(TestResult):
     writing_task = models.ForeignKey(WritingTask, on_delete=models.CASCADE)
     content = models.TextField(max_length=10000, blank=True, null=True)  # User's written content
     feedback = models.TextField(max_length=5000, blank=True, null=True)  # Feedback from AI or human grader
 
+    class Meta:
+        indexes = [models.Index(fields=["owner", "taken_at"], name="wtresult_owner_taken_idx")]
+
 # --------------------------------Flashcards------------------------------------------
 
 class FlashcardSet(BaseTest):
-    pass
+    class Meta:
+        indexes = [models.Index(fields=["owner", "created_at", "id"], name="flashcardset_owner_created_idx")]
     
 class Flashcard(models.Model):
     flashcard_set = models.ForeignKey(FlashcardSet, related_name='flashcards', on_delete=models.CASCADE)
@@ -116,4 +137,145 @@ class FlashcardSetProgress(models.Model): # track progress of flashcard sets (wi
     last_reviewed = models.DateTimeField(auto_now=True)  
 
     def __str__(self):
-        return f"{self.owner.email} - {self.flashcard_set.title} - {self.current_index}"
\ No newline at end of file
+        return f"{self.owner.email} - {self.flashcard_set.title} - {self.current_index}"
+
+    class Meta:
+        indexes = [models.Index(fields=["owner", "last_reviewed"], name="fsprogress_owner_reviewed_idx")]
+
+# --------------------------------Search------------------------------------------
+
+class SearchDocument(models.Model):
+    """
+    One searchable row per test, question, flashcard set, flashcard, writing task
+    or blog, kept in sync by myapp/signals.py (see myapp/search.py).
+    """
+    kind = models.CharField(max_length=20)
+    object_id = models.CharField(max_length=36)
+    parent_id = models.CharField(max_length=36, blank=True)  # the test/set a question or card belongs to
+    scope = models.CharField(max_length=24)  # "u<owner id>", or "public" for blogs
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["kind", "object_id"], name="searchdoc_kind_object_uniq")]
+
+
+# --------------------------------Catalog------------------------------------------
+
+class CatalogEntry(models.Model):
+    """
+    A public, original test, flashcard set or writing task, with usage counters
+    and a popularity score kept up to date incrementally (see myapp/catalog.py).
+    """
+    kind = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    title = models.CharField(max_length=200)
+    description = models.TextField(max_length=300, blank=True)
+    subject = models.CharField(max_length=100, blank=True)
+    difficulty = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField()
+
+    attempts = models.PositiveIntegerField(default=0)         # results and study sessions, copies included
+    scored_attempts = models.PositiveIntegerField(default=0)  # attempts that produced a 0-100 score
+    score_sum = models.FloatField(default=0)
+    copies = models.PositiveIntegerField(default=0)
+    popularity = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["kind", "object_id"], name="catalog_kind_object_uniq")]
+        indexes = [
+            models.Index(fields=["kind", "popularity", "id"], name="catalog_kind_popular_idx"),
+            models.Index(fields=["kind", "subject", "popularity", "id"], name="catalog_subject_popular_idx"),
+            models.Index(fields=["kind", "difficulty", "popularity", "id"], name="catalog_difficulty_popular_idx"),
+        ]
+
+
+# --------------------------------Near duplicates------------------------------------------
+
+class LSHBucket(models.Model):
+    """
+    One MinHash band of a question's or flashcard's text (see myapp/dedup.py).
+    Items sharing a bucket with the same owner are near-duplicate candidates.
+    """
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    parent_id = models.UUIDField()  # the test or set the item belongs to
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "bucket"], name="lshbucket_owner_bucket_idx"),
+            models.Index(fields=["kind", "object_id"], name="lshbucket_object_idx"),
+        ]
+
+
+# --------------------------------Question responses------------------------------------------
+
+class QuestionResponse(models.Model):
+    """
+    One graded answer from a practice test submission (see myapp/responses.py).
+    owner, subject and answered_at are copied from the result and question so
+    per-user and per-subject aggregates don't need joins.
+    """
+    result = models.ForeignKey(PracticeTestResult, related_name="responses", on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, related_name="responses", on_delete=models.CASCADE)
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    subject = models.CharField(max_length=100, blank=True)
+    option = models.ForeignKey(Option, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    text = models.CharField(max_length=500, blank=True)  # free-text answers only
+    is_correct = models.BooleanField()
+    similarity = models.PositiveSmallIntegerField(null=True, blank=True)  # 0-100, free-text answers only
+    answered_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["question", "is_correct"], name="qresponse_question_idx"),
+            models.Index(fields=["owner", "subject", "answered_at"], name="qresponse_owner_subject_idx"),
+            models.Index(fields=["answered_at"], name="qresponse_answered_idx"),
+        ]
+
+
+class QuestionStats(models.Model):
+    """
+    Running sums over every graded answer to a question (see myapp/item_analysis.py);
+    `score` is the submission's total test score.
+    """
+    question = models.OneToOneField(Question, primary_key=True, related_name="stats", on_delete=models.CASCADE)
+    responses = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sq_sum = models.FloatField(default=0)
+    correct_score_sum = models.FloatField(default=0)
+
+
+class OptionStats(models.Model):
+    """How often an option was chosen, and the total score of those who chose it."""
+    option = models.OneToOneField(Option, primary_key=True, related_name="stats", on_delete=models.CASCADE)
+    picks = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+
+
+class SubjectMastery(models.Model):
+    """
+    A user's running record in one subject (see myapp/mastery.py): answer
+    counts, and `skill`, an exponentially weighted average of correctness.
+    """
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="mastery")
+    subject = models.CharField(max_length=100)
+    answers = models.PositiveIntegerField(default=0)
+    correct = models.FloatField(default=0)  # essays add their score as a fraction
+    skill = models.FloatField(default=0.5)
+    rating = models.FloatField(default=1500)  # Elo rating against question ratings (see myapp/adaptive.py)
+    last_practiced = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["owner", "subject"], name="mastery_owner_subject_uniq")]
@@ -0,0 +1,225 @@
+"""
+N+1 query detection.
+
+Patches Django's related-object descriptors to notice *lazy* related loads,
+i.e. a foreign key, reverse one-to-one or related manager that hits the
+database because it was not covered by select_related()/prefetch_related().
+A single lazy load is fine; the problem is the same relation being loaded
+lazily for several instances that came out of one queryset:
+
+    for result in PracticeTestResult.objects.filter(owner=user):
+        result.practice_test.title          # one query per row
+
+NPlusOneMiddleware watches every request. With NPLUSONE_RAISE (set by
+myapp.testing.TestRunner) the second lazy load raises NPlusOneError at the offending
+line, so a test exercising the view fails. Otherwise (DEBUG) it logs a
+warning on the "myapp.nplusone" logger naming the view, model and attribute.
+
+Known-acceptable relations can be listed in settings.NPLUSONE_IGNORE as
+("app_label.Model", "attribute") pairs.
+"""
+
+import itertools
+import logging
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db.models import query
+from django.db.models.fields import related_descriptors
+
+from . import instrumentation
+
+logger = logging.getLogger("myapp.nplusone")
+
+_current: ContextVar[Optional["Detector"]] = ContextVar("nplusone_detector", default=None)
+_in_prefetch: ContextVar[bool] = ContextVar("nplusone_in_prefetch", default=False)
+_groups = itertools.count(1)
+
+GROUP_ATTR = "_nplusone_group"
+
+
+class NPlusOneError(Exception):
+    """Raised (in tests) when a relation is lazily loaded for several rows of one queryset."""
+
+
+class Detector:
+    """Per-request record of lazy related loads, grouped by the queryset the instances came from."""
+
+    def __init__(self, request=None, raise_errors: bool = False, threshold: int = 2):
+        self.request = request
+        self.raise_errors = raise_errors
+        self.threshold = threshold
+        self.loads: Dict[Tuple[int, str, str], int] = {}
+        self.reported: Set[Tuple[str, str]] = set()
+        self.ignored = {tuple(pair) for pair in getattr(settings, "NPLUSONE_IGNORE", ())}
+
+    @property
+    def view_name(self) -> str:
+        match = getattr(self.request, "resolver_match", None)
+        if match:
+            return match.view_name
+        return getattr(self.request, "path", "") or "<no request>"
+
+    def record(self, instance, attr: str):
+        group = instance.__dict__.get(GROUP_ATTR)
+        if group is None:  # loaded on its own, not part of a multi-row queryset
+            return
+        model = instance._meta.label
+        if (model, attr) in self.ignored:
+            return
+
+        key = (group, model, attr)
+        self.loads[key] = self.loads.get(key, 0) + 1
+        if self.loads[key] == self.threshold and (model, attr) not in self.reported:
+            self.reported.add((model, attr))
+            self.report(model, attr)
+
+    def report(self, model: str, attr: str):
+        message = (
+            f"N+1 query in view '{self.view_name}': {model}.{attr} is loaded lazily per row. "
+            f"Add select_related('{attr}') or prefetch_related('{attr}') to the queryset."
+        )
+        instrumentation.event("nplusone", view=self.view_name, model=model, attr=attr)
+        if self.raise_errors:
+            raise NPlusOneError(message)
+        caller = "".join(traceback.format_stack(limit=8)[:-3])
+        logger.warning(f"{message}\n{caller}")
+
+
+@contextmanager
+def detect(request=None, raise_errors: bool = False):
+    """Detect N+1 loads inside the block (the middleware wraps each request in this)."""
+    token = _current.set(Detector(request, raise_errors, getattr(settings, "NPLUSONE_THRESHOLD", 2)))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def _record(instance, attr: str):
+    detector = _current.get()
+    if detector is not None and instance is not None and not _in_prefetch.get():
+        detector.record(instance, attr)
+
+
+# ======================== PATCHES ========================
+
+def _patch_fetch_all():
+    """Tag instances that were fetched together so their lazy loads can be grouped."""
+    original = query.QuerySet._fetch_all
+
+    def _fetch_all(self):
+        fresh = self._result_cache is None
+        original(self)
+        if (
+            fresh
+            and _current.get() is not None
+            and self._iterable_class is query.ModelIterable
+            and len(self._result_cache) > 1
+        ):
+            group = next(_groups)
+            for obj in self._result_cache:
+                obj.__dict__[GROUP_ATTR] = group
+
+    query.QuerySet._fetch_all = _fetch_all
+
+
+def _patch_prefetch():
+    """
+    prefetch_related() builds each instance's related manager queryset while
+    attaching the batched results; those are cache fills, not lazy loads.
+    """
+    original = query.prefetch_one_level
+
+    def prefetch_one_level(*args, **kwargs):
+        token = _in_prefetch.set(True)
+        try:
+            return original(*args, **kwargs)
+        finally:
+            _in_prefetch.reset(token)
+
+    query.prefetch_one_level = prefetch_one_level
+
+
+def _patch_forward_descriptor():
+    """ForeignKey / OneToOneField access that misses the field cache."""
+    original = related_descriptors.ForwardManyToOneDescriptor.get_object
+
+    def get_object(self, instance):
+        _record(instance, self.field.name)
+        return original(self, instance)
+
+    related_descriptors.ForwardManyToOneDescriptor.get_object = get_object
+
+
+def _patch_reverse_one_to_one():
+    """user.profile style access that misses the related-object cache."""
+    original = related_descriptors.ReverseOneToOneDescriptor.__get__
+
+    def __get__(self, instance, cls=None):
+        if instance is not None and not self.related.is_cached(instance):
+            _record(instance, self.related.get_accessor_name())
+        return original(self, instance, cls)
+
+    related_descriptors.ReverseOneToOneDescriptor.__get__ = __get__
+
+
+def _patch_manager_factory(name: str, accessor):
+    """
+    Reverse FK and many-to-many managers are built per relation by factory
+    functions. Wrap the factory so every manager class records a load whenever
+    it queries instead of reading a prefetched cache (outside of
+    prefetch_one_level, _apply_rel_filters is only reached on that path).
+    """
+    factory = getattr(related_descriptors, name)
+
+    def create(*args):
+        manager_cls = factory(*args)
+        attr = accessor(*args)
+        original = manager_cls._apply_rel_filters
+
+        def _apply_rel_filters(self, queryset):
+            _record(self.instance, attr)
+            return original(self, queryset)
+
+        manager_cls._apply_rel_filters = _apply_rel_filters
+        return manager_cls
+
+    setattr(related_descriptors, name, create)
+
+
+def install():
+    """Install the descriptor patches. Called from MyappConfig.ready(); safe to call twice."""
+    if getattr(related_descriptors, "_nplusone_installed", False):
+        return
+    _patch_fetch_all()
+    _patch_prefetch()
+    _patch_forward_descriptor()
+    _patch_reverse_one_to_one()
+    _patch_manager_factory(
+        "create_reverse_many_to_one_manager",
+        lambda superclass, rel: rel.get_accessor_name(),
+    )
+    _patch_manager_factory(
+        "create_forward_many_to_many_manager",
+        lambda superclass, rel, reverse: rel.get_accessor_name() if reverse else rel.field.name,
+    )
+    related_descriptors._nplusone_installed = True
+
+
+# ======================== MIDDLEWARE ========================
+
+class NPlusOneMiddleware:
+    """Runs every request under a Detector when NPLUSONE_ENABLED is on."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "NPLUSONE_ENABLED", False):
+            return self.get_response(request)
+        with detect(request, raise_errors=getattr(settings, "NPLUSONE_RAISE", False)):
+            return self.get_response(request)
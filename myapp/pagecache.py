@@ -0,0 +1,166 @@
+"""
+Full-page cache for anonymous visitors.
+
+    @anonymous_page_cache(tags=["blog"])
+    def view_blogs(request): ...
+
+Only anonymous GET/HEAD requests that carry no session or messages cookie are
+served from or stored in the cache. Anyone logged in always gets a fresh render.
+A cached page is stored together with its status and headers in the tiered
+cache (myapp/cache.py), keyed by host, full path and active language. Hits
+return a fresh HttpResponse without touching the ORM or the template engine.
+
+Each page has a fresh lifetime (`timeout`) followed by a `stale` window. During
+that window the cached copy is still served and one background thread
+re-renders the page. Pages are tagged; purge("blog") drops every page tagged
+"blog" at once by bumping the tag version, which is what the Blog and
+SubscriptionPlan signals in myapp/signals.py do. purge() with no tags drops
+every cached page (e.g. after a deploy; see `manage.py purge_page_cache`).
+"""
+
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils import translation
+
+from . import instrumentation, metrics
+from .cache import _MISSING, tiered
+
+logger = logging.getLogger(__name__)
+
+ALL_PAGES = "*"  # tag carried by every page, bumped by purge()
+
+_refreshing = set()
+_refresh_lock = threading.Lock()
+
+
+def _conf():
+    return {"enabled": True, "timeout": 300, "stale": 3600, **getattr(settings, "PAGE_CACHE", {})}
+
+
+def is_cacheable_request(request) -> bool:
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES or "messages" in request.COOKIES:
+        return False
+    user = getattr(request, "user", None)
+    return not (user and user.is_authenticated)
+
+
+def is_cacheable_response(response) -> bool:
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and "private" not in response.get("Cache-Control", "")
+    )
+
+
+def page_key(request, tags) -> str:
+    versions = ".".join(str(tiered.version(f"page:{tag}")) for tag in (ALL_PAGES, *tags))
+    return f"page:{request.get_host()}:{request.get_full_path()}:{translation.get_language()}:{versions}"
+
+
+def purge(*tags):
+    """Drop every cached page with any of these tags, or every page if none given."""
+    for tag in tags or (ALL_PAGES,):
+        tiered.bump(f"page:{tag}")
+
+
+def _store(key, response, timeout, stale):
+    entry = {
+        "content": response.content,
+        "status": response.status_code,
+        "headers": dict(response.items()),
+        "created": time.time(),
+    }
+    ttl = timeout + stale
+    tiered.shared.set(key, entry, ttl)
+    tiered.local.set(key, entry, min(ttl, tiered.conf["local_timeout"]))
+
+
+def _load(key):
+    entry = tiered.local.get(key)
+    if entry is not _MISSING:
+        return entry
+    entry = tiered.shared.get(key)
+    if entry is not None:
+        tiered.local.set(key, entry, tiered.conf["local_timeout"])
+    return entry
+
+
+def _respond(entry, state: str) -> HttpResponse:
+    response = HttpResponse(entry["content"], status=entry["status"])
+    for header, value in entry["headers"].items():
+        response[header] = value
+    response["Age"] = str(int(time.time() - entry["created"]))
+    response["X-Page-Cache"] = state
+    return response
+
+
+def _refresh_in_background(key, view, request, args, kwargs, timeout, stale):
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            if is_cacheable_response(response):
+                _store(key, response, timeout, stale)
+        except Exception:
+            logger.exception(f"Background refresh of {request.path} failed")
+        finally:
+            connections.close_all()
+            with _refresh_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, daemon=True, name=f"page-refresh {request.path}").start()
+
+
+def anonymous_page_cache(timeout=None, stale=None, tags=()):
+    """Serve anonymous GETs of this view from the page cache (see module docstring)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            conf = _conf()
+            if not conf["enabled"] or not is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            fresh_for = conf["timeout"] if timeout is None else timeout
+            stale_for = conf["stale"] if stale is None else stale
+            key = page_key(request, tags)
+
+            entry = _load(key)
+            if entry is not None:
+                age = time.time() - entry["created"]
+                instrumentation.record_cache(hit=True)
+                if age <= fresh_for:
+                    metrics.CACHE_LOOKUPS.labels(namespace="page", tier="fresh").inc()
+                    return _respond(entry, "HIT")
+                if age <= fresh_for + stale_for:
+                    metrics.CACHE_LOOKUPS.labels(namespace="page", tier="stale").inc()
+                    _refresh_in_background(key, view, request, args, kwargs, fresh_for, stale_for)
+                    return _respond(entry, "STALE")
+
+            instrumentation.record_cache(hit=False)
+            metrics.CACHE_LOOKUPS.labels(namespace="page", tier="miss").inc()
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            if is_cacheable_response(response):
+                response["Cache-Control"] = f"public, max-age={fresh_for}, stale-while-revalidate={stale_for}"
+                response["Vary"] = "Accept-Language, Cookie"
+                _store(key, response, fresh_for, stale_for)
+                response["X-Page-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,110 @@
+"""
+Keyset (cursor) pagination on (created_at, pk), newest first, or on another
+ordered field such as a score.
+
+    page = keyset_page(PracticeTest.objects.filter(owner=user), cursor=request.GET.get("cursor"))
+    page.items, page.next_cursor
+
+Unlike OFFSET, each page is an index range scan that starts right after the
+last row of the previous page. Page N costs the same as page 1, and rows
+created meanwhile don't shift or duplicate items. The list pages render the
+first page. Their *_feed endpoints return the following pages as JSON
+(rendered cards plus the next cursor) for infinite scroll.
+
+Cursors are opaque URL-safe strings. A tampered cursor raises InvalidCursor,
+which views turn into a 400.
+"""
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    items: List
+    next_cursor: Optional[str]
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+
+def encode_cursor(value, pk) -> str:
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value, str(pk)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, model, field: str = "created_at"):
+    """(value, pk) from a cursor, validated against `model`'s `field` and primary key."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        value = model._meta.get_field(field).to_python(value)
+        if value is None:
+            raise ValueError("empty cursor value")
+        return value, model._meta.pk.to_python(pk)
+    except (ValueError, TypeError, ValidationError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def page_size(request, default=DEFAULT_PAGE_SIZE) -> int:
+    try:
+        return max(1, min(int(request.GET.get("size", default)), MAX_PAGE_SIZE))
+    except ValueError:
+        return default
+
+
+def related_count(model, fk: str):
+    """
+    Per-row count of `model` rows pointing at the outer row, as a correlated
+    subquery. Count() over a join would GROUP BY the whole range before the
+    LIMIT applies. The subquery runs only for the rows on the page.
+    """
+    counts = model.objects.filter(**{fk: OuterRef("pk")}).order_by().values(fk).annotate(n=Count("pk")).values("n")
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def keyset_queryset(queryset, cursor: Optional[str] = None, field: str = "created_at"):
+    """`queryset` ordered by (-field, -pk) and restricted to rows after `cursor`."""
+    queryset = queryset.order_by(f"-{field}", "-pk")
+    if cursor:
+        value, pk = decode_cursor(cursor, queryset.model, field)
+        # The <= bound gives SQLite an index range; the OR breaks ties on equal values
+        queryset = queryset.filter(**{f"{field}__lte": value}).filter(
+            Q(**{f"{field}__lt": value}) | Q(pk__lt=pk)
+        )
+    return queryset
+
+
+def keyset_page(queryset, cursor: Optional[str] = None, size: int = DEFAULT_PAGE_SIZE,
+                field: str = "created_at") -> KeysetPage:
+    """One page of `queryset` ordered by (-field, -pk), starting after `cursor`."""
+    items = list(keyset_queryset(queryset, cursor, field)[:size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(items, next_cursor)
+
+
+def feed_response(request, page: KeysetPage, template: str, context_name: str) -> JsonResponse:
+    """JSON for infinite scroll: the page's cards rendered with `template`, plus the next cursor."""
+    html = render_to_string(template, {context_name: page.items}, request=request)
+    return JsonResponse({"html": html, "count": len(page.items), "next_cursor": page.next_cursor})
@@ -0,0 +1,350 @@
+"""
+"Related material": tests, flashcard sets and writing tasks whose text is
+closest to a given activity, among the user's own library and the public
+catalog.
+
+    items = related_for(request.user, "practice_test", test.pk)   # [RelatedItem(kind, title, url, ...), ...]
+
+The index is a TF-IDF matrix over each activity's text (title, description,
+subject, plus its questions, cards or prompt), built offline by
+`manage.py build_related_index`. It lives in settings.RELATED_INDEX["path"]
+as a manifest (document count, document frequencies) and immutable segments:
+
+    segment-N.json  the segment's documents and, per term, its span of postings
+    segment-N.bin   int32 document numbers, then float32 weights (the term-major,
+                    i.e. CSC, layout of the sparse matrix)
+
+Segments are memory-mapped, so workers share the pages and load nothing up
+front. Rows are L2-normalized tf-idf (sublinear tf) at build time. A query
+is the activity's own vector, so the cosine with a document is the dot
+product over the query's terms. Only the postings of those terms are read,
+never the whole matrix. Terms in more than MAX_DF of the documents carry
+next to no signal and are skipped.
+
+`build_related_index --append` indexes only activities created since the
+last build, as a new segment. IDF is recomputed at query time from the
+updated counts. Once there are max_segments segments, an append rebuilds
+everything instead. A rebuild also picks up edits. Deleted or unpublished
+items simply drop out, because candidates are fetched with the usual
+owner/catalog filters.
+"""
+
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import cached_per_user
+from .models import CatalogEntry, FlashcardSet, PracticeTest, WritingTask
+
+DEFAULTS = {
+    "path": "related_index",
+    "max_segments": 8,
+}
+
+MAX_DF = 0.5           # skip query terms found in more than this share of documents
+MAX_QUERY_TERMS = 32   # the query's highest-weighted terms only
+MIN_SIMILARITY = 0.1   # below this, items share little more than boilerplate such as the default subject
+MANIFEST = "manifest.json"
+
+STOPWORDS = frozenset("""
+    a about above after again all also an and any are as at be because been before being below between both but by
+    can could did do does doing down during each few for from further had has have having he her here hers him his
+    how if in into is it its just me more most my no nor not now of off on once only or other our out over own same
+    she should so some such than that the their them then there these they this those through to too under until up
+    very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+# kind -> (model, take url name, text of the activity's children)
+KINDS = {
+    "practice_test": (PracticeTest, "take_practice_test", ("questions", ("text",))),
+    "flashcard_set": (FlashcardSet, "take_flashcard_set", ("flashcards", ("front", "back"))),
+    "writing_task": (WritingTask, "take_writing_task", None),
+}
+
+
+def _conf():
+    return {**DEFAULTS, **getattr(settings, "RELATED_INDEX", {})}
+
+
+# ============================== VECTORS ==============================
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in re.findall(r"[^\W\d_]{2,}", (text or "").lower()) if word not in STOPWORDS]
+
+
+def _activity_texts(kind: str, activities: List) -> Dict:
+    """pk -> the activity's text, with the children's text fetched in one query for the whole batch."""
+    model, _, children = KINDS[kind]
+    texts = {
+        a.pk: [a.title, a.title, a.description or "", a.subject or "", getattr(a, "prompt", "") or ""]
+        for a in activities
+    }
+    if children:
+        related_name, fields = children
+        fk = model._meta.get_field(related_name).field
+        rows = fk.model.objects.filter(**{f"{fk.name}__in": list(texts)}).values_list(fk.attname, *fields)
+        for parent_id, *parts in rows:
+            texts[parent_id].extend(parts)
+    return {pk: "\n".join(part for part in parts if part) for pk, parts in texts.items()}
+
+
+def _tf(text: str) -> Dict[str, float]:
+    """Sublinear term frequencies."""
+    return {term: 1.0 + math.log(n) for term, n in Counter(tokenize(text)).items()}
+
+
+def _idf(df: int, n_docs: int) -> float:
+    return math.log((1 + n_docs) / (1 + df)) + 1.0
+
+
+def _normalized(weights: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {term: w / norm for term, w in weights.items()} if norm else {}
+
+
+# ============================== STORAGE ==============================
+
+class Segment:
+    """One immutable, memory-mapped slice of the matrix."""
+
+    def __init__(self, directory: str, name: str):
+        with open(os.path.join(directory, f"{name}.json")) as f:
+            meta = json.load(f)
+        self.docs: List[Tuple[str, str]] = [tuple(doc) for doc in meta["docs"]]
+        self.terms: Dict[str, Tuple[int, int]] = meta["terms"]
+        size = meta["postings"]
+        self._file = open(os.path.join(directory, f"{name}.bin"), "rb")
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._map)
+            self.doc_numbers = view[:size * 4].cast("i")
+            self.weights = view[size * 4:size * 8].cast("f")
+        else:
+            self.doc_numbers = self.weights = memoryview(b"")
+
+    def postings(self, term: str):
+        span = self.terms.get(term)
+        if span is None:
+            return ()
+        start, count = span
+        return zip(self.doc_numbers[start:start + count], self.weights[start:start + count])
+
+
+def _write_segment(directory: str, name: str, rows: List[Tuple[Tuple[str, str], Dict[str, float]]]):
+    """Write documents and their normalized vectors as one segment (transposed to term-major)."""
+    by_term = defaultdict(list)
+    for number, (_, vector) in enumerate(rows):
+        for term, weight in vector.items():
+            by_term[term].append((number, weight))
+
+    doc_numbers, weights, terms = array("i"), array("f"), {}
+    for term in sorted(by_term):
+        terms[term] = (len(doc_numbers), len(by_term[term]))
+        for number, weight in by_term[term]:
+            doc_numbers.append(number)
+            weights.append(weight)
+
+    with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+        doc_numbers.tofile(f)
+        weights.tofile(f)
+    with open(os.path.join(directory, f"{name}.json"), "w") as f:
+        json.dump({"docs": [doc for doc, _ in rows], "terms": terms, "postings": len(doc_numbers)}, f)
+
+
+def _read_manifest(directory: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(directory: str, manifest: Dict):
+    tmp = os.path.join(directory, f"{MANIFEST}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(directory, MANIFEST))  # readers see the old or the new index, never half of one
+
+
+# ============================== BUILDING ==============================
+
+def _documents(since=None, batch_size: int = 500) -> Iterable[Tuple[Tuple[str, str], Dict[str, float]]]:
+    """((kind, id), term frequencies) for every activity, or those created after `since`."""
+    for kind, (model, _, _) in KINDS.items():
+        activities = model.objects.order_by("created_at", "pk")
+        if since is not None:
+            activities = activities.filter(created_at__gt=since)
+        batch = []
+        for activity in activities.iterator(chunk_size=batch_size):
+            batch.append(activity)
+            if len(batch) == batch_size:
+                yield from _batch_documents(kind, batch)
+                batch = []
+        yield from _batch_documents(kind, batch)
+
+
+def _batch_documents(kind, activities):
+    if not activities:
+        return
+    texts = _activity_texts(kind, activities)
+    for activity in activities:
+        tf = _tf(texts[activity.pk])
+        if tf:
+            yield (kind, str(activity.pk)), tf
+
+
+def _index_segment(directory: str, name: str, documents: List, df: Dict[str, int], n_docs: int):
+    rows = [(doc, _normalized({t: w * _idf(df[t], n_docs) for t, w in tf.items()})) for doc, tf in documents]
+    _write_segment(directory, name, rows)
+
+
+def build(directory: Optional[str] = None, append: bool = False) -> Dict:
+    """
+    (Re)build the index, or with append=True add a segment for activities
+    created since the last build. Returns the new manifest.
+    """
+    conf = _conf()
+    directory = directory or conf["path"]
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory) if append else None
+    if manifest is not None and len(manifest["segments"]) >= conf["max_segments"]:
+        manifest = None  # too fragmented: start over
+
+    started = timezone.now()
+    since = parse_datetime(manifest["built_at"]) if manifest else None
+    documents = list(_documents(since))
+
+    df = Counter(manifest["df"]) if manifest else Counter()
+    for _, tf in documents:
+        df.update(tf.keys())
+    n_docs = (manifest["docs"] if manifest else 0) + len(documents)
+
+    segments = list(manifest["segments"]) if manifest else []
+    # never reuse a name: other workers may still have the old files mapped
+    existing = [int(f.split("-")[1].split(".")[0]) for f in os.listdir(directory) if f.startswith("segment-")]
+    name = f"segment-{max(existing, default=0) + 1}"
+    _index_segment(directory, name, documents, df, n_docs)
+    segments.append(name)
+
+    old = set(os.listdir(directory))
+    manifest = {"segments": segments, "df": dict(df), "docs": n_docs, "built_at": started.isoformat()}
+    _write_manifest(directory, manifest)
+    # drop files of segments the new manifest no longer lists
+    keep = {f"{segment}.{ext}" for segment in segments for ext in ("json", "bin")} | {MANIFEST}
+    for filename in old - keep:
+        if filename.startswith("segment-"):
+            os.remove(os.path.join(directory, filename))
+    return manifest
+
+
+# ============================== QUERIES ==============================
+
+class Index:
+    def __init__(self, directory: str, manifest: Dict):
+        self.df: Dict[str, int] = manifest["df"]
+        self.n_docs: int = manifest["docs"]
+        self.segments = [Segment(directory, name) for name in manifest["segments"]]
+
+    def query_vector(self, text: str) -> Dict[str, float]:
+        weights = {
+            term: w * _idf(self.df.get(term, 0), self.n_docs)
+            for term, w in _tf(text).items()
+            if self.df.get(term, 0) <= MAX_DF * self.n_docs or self.n_docs < 20
+        }
+        top = heapq.nlargest(MAX_QUERY_TERMS, weights.items(), key=lambda item: item[1])
+        return _normalized(dict(top))
+
+    def top_k(self, text: str, k: int, exclude: Tuple[str, str] = None) -> List[Tuple[Tuple[str, str], float]]:
+        """The k documents most similar to `text`, as ((kind, id), cosine)."""
+        scores = defaultdict(float)
+        for term, q in self.query_vector(text).items():
+            for s, segment in enumerate(self.segments):
+                for number, weight in segment.postings(term):
+                    scores[s, number] += q * weight
+        results, seen = [], {exclude}
+        # an activity created while an append ran can sit in two segments
+        for (s, number), score in heapq.nlargest(2 * k + 1, scores.items(), key=lambda item: item[1]):
+            doc = self.segments[s].docs[number]
+            if doc not in seen and score >= MIN_SIMILARITY:
+                seen.add(doc)
+                results.append((doc, score))
+        return results[:k]
+
+
+_loaded: Dict[str, Tuple[float, Index]] = {}
+_lock = threading.Lock()
+
+
+def get_index(directory: Optional[str] = None) -> Optional[Index]:
+    """The index at `directory`, reloaded when a build replaces its manifest. None if never built."""
+    directory = directory or _conf()["path"]
+    try:
+        mtime = os.stat(os.path.join(directory, MANIFEST)).st_mtime
+    except FileNotFoundError:
+        return None
+    with _lock:
+        cached = _loaded.get(directory)
+        if cached is None or cached[0] != mtime:
+            manifest = _read_manifest(directory)
+            if manifest is None:
+                return None
+            cached = _loaded[directory] = (mtime, Index(directory, manifest))
+    return cached[1]
+
+
+@dataclass
+class RelatedItem:
+    kind: str
+    title: str
+    url: str
+    in_library: bool   # False: a public catalog item, added with the "add to library" form
+    score: float
+
+
+def related(user, kind: str, activity, k: int = 6) -> List[RelatedItem]:
+    """Up to `k` of the user's own activities or public catalog items most similar to `activity`."""
+    index = get_index()
+    if index is None:
+        return []
+    text = _activity_texts(kind, [activity])[activity.pk]
+    # over-fetch: some candidates belong to other users and aren't in the catalog
+    candidates = index.top_k(text, k * 4, exclude=(kind, str(activity.pk)))
+    if not candidates:
+        return []
+
+    ids_by_kind = defaultdict(list)
+    for (candidate_kind, object_id), _ in candidates:
+        ids_by_kind[candidate_kind].append(object_id)
+    found = {}
+    for candidate_kind, ids in ids_by_kind.items():
+        model, url_name, _ = KINDS[candidate_kind]
+        for pk, title in model.objects.filter(owner=user, pk__in=ids).values_list("pk", "title"):
+            found[candidate_kind, str(pk)] = (title, reverse(url_name, args=[pk]), True)
+    catalog = CatalogEntry.objects.filter(
+        kind__in=list(ids_by_kind), object_id__in=[object_id for ids in ids_by_kind.values() for object_id in ids],
+    ).exclude(owner=user).values_list("kind", "object_id", "pk", "title")
+    for entry_kind, object_id, entry_pk, title in catalog:
+        found.setdefault((entry_kind, str(object_id)), (title, reverse("add_to_library", args=[entry_pk]), False))
+
+    items = [RelatedItem(doc[0], *found[doc], round(score, 4)) for doc, score in candidates if doc in found]
+    return items[:k]
+
+
+@cached_per_user("related", timeout=600)
+def related_for(user, kind: str, pk, k: int = 6) -> List[RelatedItem]:
+    """related() for one of the user's activities, cached per user (an index rebuild shows within the timeout)."""
+    activity = KINDS[kind][0].objects.filter(owner=user, pk=pk).first()
+    return related(user, kind, activity, k) if activity else []
@@ -0,0 +1,85 @@
+"""
+Per-answer records of practice test submissions.
+
+    graded = [Answer(question, "42", is_correct=True, similarity=None), ...]
+    record(result, graded)    # one INSERT for the whole submission
+
+take_practice_test grades every answer anyway. Keeping the outcome lets
+later analytics (per-question difficulty, per-subject mastery) aggregate
+rows instead of re-grading submissions. Rows are narrow: the chosen option
+for multiple choice, and otherwise the answer text cut to
+QUESTION_RESPONSES["max_text"] characters, plus its fuzzy similarity.
+
+Retention: `manage.py prune_responses` (daily from cron) deletes rows older
+than QUESTION_RESPONSES["retention_days"]. It deletes in primary-key
+batches, so SQLite never holds the write lock for long. The aggregate score
+stays on PracticeTestResult forever.
+"""
+
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Question, QuestionResponse
+
+DEFAULTS = {
+    "enabled": True,
+    "retention_days": 365,
+    "batch_size": 5000,
+    "max_text": 500,
+}
+
+
+def _conf():
+    return {**DEFAULTS, **getattr(settings, "QUESTION_RESPONSES", {})}
+
+
+@dataclass
+class Answer:
+    question: Question
+    user_answer: str          # "" when unanswered
+    is_correct: bool
+    similarity: Optional[int] = None
+
+
+def _chosen_option(question: Question, user_answer: str):
+    """The option an MCQ answer refers to, from the prefetched options (None if it isn't one of them)."""
+    return next((option for option in question.options.all() if str(option.pk) == user_answer), None)
+
+
+def record(result, answers: Iterable[Answer]) -> List[QuestionResponse]:
+    """
+    Store a submission's graded answers with a single bulk_create. The rows are
+    returned (unsaved when storing is disabled) for myapp/item_analysis.py.
+    """
+    conf = _conf()
+    rows = []
+    for answer in answers:
+        question = answer.question
+        is_mcq = (question.question_type or "").lower() in ("mcq", "multiple choice")
+        option = _chosen_option(question, answer.user_answer) if is_mcq else None
+        rows.append(QuestionResponse(
+            result=result, question=question, owner_id=result.owner_id, subject=question.subject or "",
+            option=option, text="" if option else answer.user_answer[:conf["max_text"]],
+            is_correct=bool(answer.is_correct), similarity=answer.similarity, answered_at=result.taken_at,
+        ))
+    return QuestionResponse.objects.bulk_create(rows) if conf["enabled"] else rows
+
+
+def prune(days: Optional[int] = None, batch_size: Optional[int] = None) -> int:
+    """Delete responses older than the retention period. Returns rows deleted."""
+    conf = _conf()
+    cutoff = timezone.now() - timedelta(days=days if days is not None else conf["retention_days"])
+    batch_size = batch_size or conf["batch_size"]
+    deleted = 0
+    while True:
+        ids = list(
+            QuestionResponse.objects.filter(answered_at__lt=cutoff).order_by("answered_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += QuestionResponse.objects.filter(pk__in=ids).delete()[0]  # nothing cascades: one DELETE
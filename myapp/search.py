@@ -0,0 +1,292 @@
+"""
+Full-text search over a user's library (tests, questions, flashcard sets,
+flashcards, writing tasks) plus the public blog.
+
+    hits = search(request.user, "photosynthesis light", kinds=["flashcard"])
+    hits[0].title, hits[0].snippet, hits[0].url
+
+Every searchable row has one SearchDocument (kind, object id, owner scope,
+title, body). myapp/signals.py upserts or deletes it on post_save/post_delete.
+Bulk operations (bulk_create, queryset.update) bypass the signals, so run
+`manage.py rebuild_search_index` after them.
+
+The documents are indexed by the database itself (migration 0008):
+
+- SQLite: an external-content FTS5 table over title/body/scope, kept in step
+  by triggers. The owner scope is an indexed column, so the query intersects
+  the owner's doclist with the term doclists instead of filtering every
+  match. Results are ranked with bm25 (title weighted 10x body).
+- Postgres: a GIN index on a weighted tsvector of title/body, ranked with
+  ts_rank and highlighted with ts_headline.
+
+User input is never passed through as query syntax. It is split into word
+terms; every term must match, and the last one also matches as a prefix, so
+results update while the user is still typing.
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from . import metrics
+from .models import FlashcardSet, PracticeTest, SearchDocument
+
+FTS_TABLE = "myapp_searchdocument_fts"
+PUBLIC = "public"
+MAX_TERMS = 8
+DEFAULT_LIMIT = 20
+
+# Highlight markers; escaped text never contains them, so they're swapped for <mark> afterwards
+START, STOP = "\x02", "\x03"
+
+
+# ============================== DOCUMENTS ==============================
+
+def _scope(owner_id) -> Optional[str]:
+    return f"u{owner_id}" if owner_id else None
+
+
+def _join(*parts) -> str:
+    return "\n".join(part for part in parts if part)
+
+
+def _title_and_rest(text: str) -> Tuple[str, str]:
+    """A title-length prefix of `text`, and the full text again if it didn't fit."""
+    title = Truncator(text or "").chars(200)
+    return title, ("" if title == text else text)
+
+
+def parent_owner(instance, field: str, parent_model):
+    """Owner id of a question's test or a card's set, without loading the parent when it isn't cached."""
+    if getattr(type(instance), field).is_cached(instance):
+        return getattr(instance, field).owner_id
+    parent_id = getattr(instance, f"{field}_id")
+    return parent_model.objects.filter(pk=parent_id).values_list("owner_id", flat=True).first()
+
+
+def _activity_document(activity, *extra) -> Tuple:
+    return _scope(activity.owner_id), "", activity.title, _join(activity.description, activity.subject, *extra)
+
+
+def _question_document(question) -> Tuple:
+    title, rest = _title_and_rest(question.text)
+    owner_id = parent_owner(question, "practice_test", PracticeTest)
+    return _scope(owner_id), str(question.practice_test_id), title, _join(rest, question.answer, question.explanation)
+
+
+def _flashcard_document(card) -> Tuple:
+    title, rest = _title_and_rest(card.front)
+    owner_id = parent_owner(card, "flashcard_set", FlashcardSet)
+    return _scope(owner_id), str(card.flashcard_set_id), title, _join(rest, card.back)
+
+
+def _blog_document(blog) -> Tuple:
+    return PUBLIC, "", blog.title, strip_tags(blog.content)
+
+
+@dataclass(frozen=True)
+class Source:
+    kind: str
+    model: str                    # app label, so service.Blog needn't be imported here
+    document: Callable            # instance -> (scope, parent id, title, body); scope None = don't index
+    url_name: str                 # reversed with the object's id, or its parent's for child rows
+    of_parent: bool = False
+    related: Tuple[str, ...] = ()  # select_related() for rebuilds, so documents don't query per row
+
+
+SOURCES = {
+    source.kind: source for source in (
+        Source("practice_test", "myapp.PracticeTest", _activity_document, "take_practice_test"),
+        Source("question", "myapp.Question", _question_document, "take_practice_test",
+               of_parent=True, related=("practice_test",)),
+        Source("flashcard_set", "myapp.FlashcardSet", _activity_document, "take_flashcard_set"),
+        Source("flashcard", "myapp.Flashcard", _flashcard_document, "take_flashcard_set",
+               of_parent=True, related=("flashcard_set",)),
+        Source("writing_task", "myapp.WritingTask", lambda task: _activity_document(task, task.prompt),
+               "take_writing_task"),
+        Source("blog", "service.Blog", _blog_document, "service:blog"),
+    )
+}
+SOURCES_BY_MODEL = {source.model: source for source in SOURCES.values()}
+
+
+def _document(source: Source, instance) -> Optional[SearchDocument]:
+    scope, parent_id, title, body = source.document(instance)
+    if scope is None:
+        return None
+    return SearchDocument(kind=source.kind, object_id=str(instance.pk), parent_id=parent_id,
+                          scope=scope, title=title, body=body)
+
+
+def _upsert(documents: List[SearchDocument]):
+    SearchDocument.objects.bulk_create(
+        documents, update_conflicts=True, unique_fields=["kind", "object_id"],
+        update_fields=["parent_id", "scope", "title", "body", "updated_at"],
+    )
+
+
+def index_instance(instance):
+    """Insert or refresh the search document for one saved object (one query)."""
+    source = SOURCES_BY_MODEL[instance._meta.label]
+    document = _document(source, instance)
+    if document is not None:
+        _upsert([document])
+
+
+def index_instances(instances: Iterable):
+    """index_instance() for many objects of one model in one query, e.g. after bulk_create()."""
+    instances = list(instances)
+    if not instances:
+        return
+    source = SOURCES_BY_MODEL[instances[0]._meta.label]
+    documents = [document for document in (_document(source, i) for i in instances) if document is not None]
+    if documents:
+        _upsert(documents)
+
+
+def remove_instance(instance):
+    source = SOURCES_BY_MODEL[instance._meta.label]
+    SearchDocument.objects.filter(kind=source.kind, object_id=str(instance.pk)).delete()
+
+
+def _model(source: Source):
+    from django.apps import apps
+
+    return apps.get_model(source.model)
+
+
+def rebuild(kinds: Optional[Iterable[str]] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """Reindex every object of the given kinds (default: all). Returns kind -> documents indexed."""
+    counts = {}
+    for kind in kinds or SOURCES:
+        source = SOURCES[kind]
+        queryset = _model(source).objects.select_related(*source.related).order_by()
+        with transaction.atomic():
+            SearchDocument.objects.filter(kind=kind).delete()
+            batch, counts[kind] = [], 0
+            for instance in queryset.iterator(chunk_size=batch_size):
+                document = _document(source, instance)
+                if document is not None:
+                    batch.append(document)
+                if len(batch) >= batch_size:
+                    SearchDocument.objects.bulk_create(batch)
+                    counts[kind] += len(batch)
+                    batch = []
+            SearchDocument.objects.bulk_create(batch)
+            counts[kind] += len(batch)
+    optimize()
+    return counts
+
+
+def optimize():
+    """Merge the FTS5 index segments after a bulk load (a no-op elsewhere)."""
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+# =============================== QUERIES ===============================
+
+@dataclass
+class SearchHit:
+    kind: str
+    object_id: str
+    parent_id: str
+    title: str      # HTML with <mark> around matched terms
+    snippet: str    # HTML excerpt of the body with <mark> around matched terms
+    rank: float     # higher is better
+
+    @property
+    def url(self) -> str:
+        source = SOURCES[self.kind]
+        return reverse(source.url_name, args=[self.parent_id if source.of_parent else self.object_id])
+
+    def as_dict(self) -> Dict:
+        return {"kind": self.kind, "id": self.object_id, "title": self.title, "snippet": self.snippet,
+                "url": self.url, "rank": round(self.rank, 4)}
+
+
+def parse_query(query: str) -> List[str]:
+    """Word terms of the user's query, lowercased; everything else is dropped."""
+    return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+def _marked(text: str) -> str:
+    return mark_safe(escape(text or "").replace(START, "<mark>").replace(STOP, "</mark>"))
+
+
+def _search_sqlite(terms: List[str], scopes: Sequence[str], kinds: Sequence[str], limit: int) -> List[SearchHit]:
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += "*"
+    scope_match = " OR ".join(f'scope:"{scope}"' for scope in scopes)
+    match = f"({scope_match}) AND {{title body}}: ({' '.join(phrases)})"
+    kind_filter = f"AND d.kind IN ({', '.join(['%s'] * len(kinds))})" if kinds else ""
+
+    sql = f"""
+        SELECT d.kind, d.object_id, d.parent_id,
+               highlight({FTS_TABLE}, 0, %s, %s),
+               snippet({FTS_TABLE}, 1, %s, %s, '…', 16),
+               bm25({FTS_TABLE}, 10.0, 1.0, 0.0) AS score
+        FROM {FTS_TABLE} JOIN myapp_searchdocument d ON d.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s {kind_filter}
+        ORDER BY score
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [START, STOP, START, STOP, match, *kinds, limit])
+        rows = cursor.fetchall()
+    # bm25 is lower-is-better
+    return [SearchHit(kind, object_id, parent_id, _marked(title), _marked(snippet), -score)
+            for kind, object_id, parent_id, title, snippet, score in rows]
+
+
+def document_vector():
+    """The weighted tsvector the Postgres GIN index (migration 0008) is built on."""
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector("title", weight="A", config="english") + SearchVector("body", weight="B", config="english")
+
+
+def _search_postgres(terms: List[str], scopes: Sequence[str], kinds: Sequence[str], limit: int) -> List[SearchHit]:
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+
+    lexemes = [f"'{term}'" for term in terms]
+    lexemes[-1] += ":*"
+    query = SearchQuery(" & ".join(lexemes), search_type="raw", config="english")
+    headline = dict(start_sel=START, stop_sel=STOP, config="english")
+
+    documents = SearchDocument.objects.annotate(vector=document_vector()).filter(vector=query, scope__in=scopes)
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    documents = documents.annotate(
+        score=SearchRank(document_vector(), query),
+        title_marked=SearchHeadline("title", query, highlight_all=True, **headline),
+        snippet=SearchHeadline("body", query, max_words=24, min_words=8, **headline),
+    ).order_by("-score")[:limit]
+    return [SearchHit(d.kind, d.object_id, d.parent_id, _marked(d.title_marked), _marked(d.snippet), d.score)
+            for d in documents]
+
+
+BACKENDS = {"sqlite": _search_sqlite, "postgresql": _search_postgres}
+
+
+def search(user, query: str, kinds: Optional[Iterable[str]] = None, limit: int = DEFAULT_LIMIT) -> List[SearchHit]:
+    """The best `limit` matches for `query` among `user`'s own documents and the public blog."""
+    terms = parse_query(query)
+    if not terms:
+        return []
+    kinds = [kind for kind in kinds or () if kind in SOURCES]
+    scopes = [_scope(user.pk), PUBLIC]
+
+    backend = BACKENDS[connection.vendor]
+    start = time.perf_counter()
+    hits = backend(terms, scopes, kinds, limit)
+    metrics.SEARCH_QUERY_SECONDS.labels(backend=connection.vendor).observe(time.perf_counter() - start)
+    return hits
@@ -0,0 +1,142 @@
+"""
+Cache invalidation on model changes (see myapp/cache.py and myapp/pagecache.py).
+
+Anything a user owns bumps that user's cache version. Child rows (questions,
+options, flashcards) bump their parent's object version without loading the
+parent. Searchable models also keep their search document in step (see
+myapp/search.py), and activities and results their catalog entry (see
+myapp/catalog.py). Questions and flashcards also keep their near-duplicate
+buckets (see myapp/dedup.py), and graded essays update the writer's subject
+mastery (see myapp/mastery.py). Connected from MyappConfig.ready().
+"""
+
+from django.db.models.signals import post_delete, post_save
+
+from . import catalog, dedup, mastery, search
+from .cache import invalidate_global, invalidate_object, invalidate_user
+from .pagecache import purge as purge_pages
+from .models import (
+    Flashcard, FlashcardSet, FlashcardSetProgress, Option, PracticeTest, PracticeTestResult,
+    Question, WritingTask, WritingTaskResult,
+)
+
+OWNED_MODELS = (
+    PracticeTest, WritingTask, FlashcardSet,
+    PracticeTestResult, WritingTaskResult, FlashcardSetProgress,
+)
+
+# child model -> (parent model, fk attname)
+CHILD_MODELS = {
+    Question: (PracticeTest, "practice_test_id"),
+    Option: (Question, "question_id"),
+    Flashcard: (FlashcardSet, "flashcard_set_id"),
+}
+
+# models from other apps (lazy senders) -> user fk attname
+USER_MODELS = {
+    "accounts.UserSubscription": "user_id",
+    "extras.UserAchievement": "user_id",
+}
+
+
+def owned_changed(sender, instance, **kwargs):
+    if instance.owner_id:
+        invalidate_user(instance.owner_id)
+    invalidate_object(instance)
+
+
+def child_changed(sender, instance, **kwargs):
+    parent_model, attname = CHILD_MODELS[sender]
+    invalidate_object(model=parent_model, pk=getattr(instance, attname))
+    if sender is Question and instance.practice_test_id:
+        # list pages show per-test question counts
+        if Question.practice_test.is_cached(instance):
+            owner_id = instance.practice_test.owner_id
+        else:
+            owner_id = PracticeTest.objects.filter(pk=instance.practice_test_id).values_list("owner_id", flat=True).first()
+        if owner_id:
+            invalidate_user(owner_id)
+
+
+def user_row_changed(sender, instance, **kwargs):
+    invalidate_user(getattr(instance, USER_MODELS[sender._meta.label]))
+
+
+def user_created_or_deleted(sender, instance, created=True, **kwargs):
+    # Profile edits, points and credits aren't part of any cached computation; a new
+    # or deleted account resets the scope so a reused primary key starts clean.
+    if created:
+        invalidate_user(instance.pk)
+
+
+def achievement_changed(sender, instance, **kwargs):
+    invalidate_global()
+
+
+# models from other apps -> page-cache tag to purge (see myapp/pagecache.py)
+PAGE_TAGS = {
+    "service.Blog": "blog",
+    "accounts.SubscriptionPlan": "plans",
+}
+
+
+def page_content_changed(sender, instance, **kwargs):
+    purge_pages(PAGE_TAGS[sender._meta.label])
+
+
+def search_document_saved(sender, instance, **kwargs):
+    search.index_instance(instance)
+
+
+def search_document_deleted(sender, instance, **kwargs):
+    search.remove_instance(instance)
+
+
+def dedup_item_saved(sender, instance, **kwargs):
+    dedup.index_instance(instance)
+
+
+def dedup_item_deleted(sender, instance, **kwargs):
+    dedup.remove_instance(instance)
+
+
+def catalog_activity_saved(sender, instance, **kwargs):
+    catalog.sync_entry(instance)
+
+
+def catalog_activity_deleted(sender, instance, **kwargs):
+    catalog.remove_entry(instance)
+
+
+def catalog_result_saved(sender, instance, created, update_fields=None, **kwargs):
+    catalog.result_saved(instance, created, update_fields)
+
+
+def mastery_essay_graded(sender, instance, created, update_fields=None, **kwargs):
+    mastery.result_saved(instance, created, update_fields)
+
+
+def connect():
+    for signal in (post_save, post_delete):
+        for model in OWNED_MODELS:
+            signal.connect(owned_changed, sender=model, dispatch_uid=f"appcache-{model.__name__}")
+        for model in CHILD_MODELS:
+            signal.connect(child_changed, sender=model, dispatch_uid=f"appcache-{model.__name__}")
+        for label in USER_MODELS:
+            signal.connect(user_row_changed, sender=label, dispatch_uid=f"appcache-{label}")
+        signal.connect(user_created_or_deleted, sender="accounts.CustomUser", dispatch_uid="appcache-user")
+        signal.connect(achievement_changed, sender="extras.Achievement", dispatch_uid="appcache-achievement")
+        for label in PAGE_TAGS:
+            signal.connect(page_content_changed, sender=label, dispatch_uid=f"pagecache-{label}")
+    for label in search.SOURCES_BY_MODEL:
+        post_save.connect(search_document_saved, sender=label, dispatch_uid=f"search-{label}")
+        post_delete.connect(search_document_deleted, sender=label, dispatch_uid=f"search-{label}")
+    for model in dedup.KIND_OF:
+        post_save.connect(dedup_item_saved, sender=model, dispatch_uid=f"dedup-{model.__name__}")
+        post_delete.connect(dedup_item_deleted, sender=model, dispatch_uid=f"dedup-{model.__name__}")
+    for model in catalog.KIND_OF:
+        post_save.connect(catalog_activity_saved, sender=model, dispatch_uid=f"catalog-{model.__name__}")
+        post_delete.connect(catalog_activity_deleted, sender=model, dispatch_uid=f"catalog-{model.__name__}")
+    for model in catalog.RESULTS:
+        post_save.connect(catalog_result_saved, sender=model, dispatch_uid=f"catalog-{model.__name__}")
+    post_save.connect(mastery_essay_graded, sender=WritingTaskResult, dispatch_uid="mastery-WritingTaskResult")
@@ -0,0 +1,103 @@
+"""
+SQLite production profile.
+
+configure_connection() runs on every new SQLite connection (connection_created
+signal, connected from MyappConfig.ready()) and applies the pragmas in
+settings.SQLITE_TUNING:
+
+- journal_mode=WAL: readers no longer block the writer, or the writer readers.
+- synchronous=NORMAL: no fsync per commit. With WAL a power cut can lose the
+  last commits, but it can't corrupt the file.
+- busy_timeout: wait for the write lock instead of failing at once.
+- cache_size, mmap_size, temp_store: keep hot pages and temp b-trees in memory.
+
+Settings pair this with persistent connections (CONN_MAX_AGE) and
+OPTIONS["transaction_mode"] = "IMMEDIATE". That mode takes the write lock at
+BEGIN, so a transaction never has to upgrade a read lock halfway through.
+Such an upgrade fails with "database is locked" without waiting for
+busy_timeout.
+
+Short write transactions can be wrapped in @retry_on_locked(). It runs the
+function in transaction.atomic() and reruns it with a jittered backoff when
+SQLite still reports the database as locked or busy.
+"""
+
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "enabled": True,
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,       # ms
+    "cache_size": -64000,       # negative = KiB, i.e. 64 MB
+    "mmap_size": 268435456,     # 256 MB
+    "temp_store": "MEMORY",
+    "retry_attempts": 5,
+    "retry_base_delay": 0.05,   # seconds, doubled per attempt
+}
+
+PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store")
+
+
+def _conf():
+    return {**DEFAULTS, **getattr(settings, "SQLITE_TUNING", {})}
+
+
+def apply_pragmas(cursor, conf=None):
+    conf = conf or _conf()
+    for pragma in PRAGMAS:
+        if conf.get(pragma) is not None:
+            cursor.execute(f"PRAGMA {pragma} = {conf[pragma]}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    conf = _conf()
+    if conf["enabled"]:
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, conf)
+
+
+def is_locked_error(exc) -> bool:
+    message = str(exc).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def retry_on_locked(attempts=None, base_delay=None):
+    """
+    Run the function in its own transaction and retry it when SQLite reports a lock.
+
+    Inside an outer atomic() block there is nothing to retry safely (the outer
+    transaction is already poisoned), so the function just runs once.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if connection.in_atomic_block:
+                return fn(*args, **kwargs)
+            conf = _conf()
+            tries = attempts or conf["retry_attempts"]
+            delay = base_delay or conf["retry_base_delay"]
+            for attempt in range(1, tries + 1):
+                try:
+                    with transaction.atomic():
+                        return fn(*args, **kwargs)
+                except OperationalError as exc:
+                    if not is_locked_error(exc) or attempt == tries:
+                        raise
+                    instrumentation.event("sqlite.lock_retry", function=fn.__qualname__, attempt=attempt)
+                    logger.info(f"{fn.__qualname__}: database locked, retry {attempt}/{tries - 1}")
+                    time.sleep(delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        return wrapper
+    return decorator
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .cache import tiered
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Project test runner:
+    - any N+1 query detected in a request fails the test (myapp/nplusone.py)
+    - caches are in-memory so tests never read or write the developer's cache directory
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_ENABLED = True
+        settings.NPLUSONE_RAISE = True
+        self._cache_settings = override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"},
+        })
+        self._cache_settings.enable()
+        tiered.clear_local()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
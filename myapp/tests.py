@@ -1,3 +1,730 @@
-from django.test import TestCase
+import math
+import shutil
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import OperationalError, connection
+from django.db.models import F, Prefetch
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+
+from accounts.models import CustomUser
+
+from .adaptive import assemble
+from .ai_router import ModelRouter
+from .benchmarks import load_budgets, run_benchmarks, seed_benchmark_data
+from .cache import LocalLRU, cached_per_user
+from .catalog import rebuild as rebuild_catalog
+from .cloning import clone_activity
+from .dedup import duplicate_clusters, find_duplicates, jaccard, shingles
+from .item_analysis import analyze, rebuild as rebuild_item_stats
+from .mastery import focus_prompt, rebuild as rebuild_mastery, weakest
+from .models import (
+    CatalogEntry, Flashcard, FlashcardSet, FlashcardSetProgress, LSHBucket, Option, PracticeTest, PracticeTestResult, Question,
+    QuestionResponse, SearchDocument, SubjectMastery, WritingTask, WritingTaskResult,
+)
+from .nplusone import NPlusOneError, detect
+from .pagination import encode_cursor, keyset_queryset, related_count
+from .related import build as build_related_index, related as related_items
+from .responses import prune as prune_responses
+from .search import rebuild
+from .sqlite import retry_on_locked
+from .utils import save_activity_from_json
+
+
+ROUTES = {
+    "grading": {
+        "models": ["big", "small"],
+        "plans": {"free": ["small", "big"]},
+        "latency_budget_ms": 1000,
+    },
+}
+ROUTER = {"window": 20, "failure_threshold": 2, "max_error_rate": 0.5, "min_samples": 5, "cooldown_seconds": 60}
+
+
+@override_settings(AI_MODEL_ROUTES=ROUTES, AI_ROUTER=ROUTER)
+class ModelRouterTests(TestCase):
+
+    def setUp(self):
+        self.router = ModelRouter()
+
+    def test_plan_tier_picks_route(self):
+        self.assertEqual(self.router.candidates("grading", plan="pro")[0], ("big", "primary"))
+        self.assertEqual(self.router.candidates("grading", plan="free")[0], ("small", "plan:free"))
+
+    def test_fails_over_and_opens_circuit(self):
+        calls = []
+
+        def call(model):
+            calls.append(model)
+            if model == "big":
+                raise TimeoutError("upstream slow")
+            return model
+
+        self.assertEqual(self.router.run("grading", call, plan="pro"), "small")
+        self.assertEqual(self.router.run("grading", call, plan="pro"), "small")
+        # two consecutive failures open the circuit, so "big" is skipped now
+        self.assertEqual(self.router.run("grading", call, plan="pro"), "small")
+        self.assertEqual(calls.count("big"), 2)
+        self.assertEqual(self.router.snapshot()["models"]["big"]["circuit"], "open")
+
+    def test_slow_primary_is_demoted(self):
+        for _ in range(5):
+            self.router.health("big").record(5000, True, self.router.conf)
+            self.router.health("small").record(200, True, self.router.conf)
+        self.assertEqual(self.router.candidates("grading", plan="pro")[0], ("small", "latency"))
+
+    def test_raises_when_every_tier_fails(self):
+        def call(model):
+            raise ConnectionError(model)
+
+        with self.assertRaises(ConnectionError):
+            self.router.run("grading", call, plan="pro")
+
+
+class ViewQueryBudgetTests(TestCase):
+    """Fail when a hot view issues more SQL queries than fixtures/view_budgets.json allows."""
+
+    def test_views_within_query_budgets(self):
+        user = seed_benchmark_data()
+        budgets = {
+            name: {"max_queries": budget["max_queries"]}
+            for name, budget in load_budgets().items()
+        }
+        report = run_benchmarks(user, budgets, iterations=1)
+
+        self.assertEqual(len(report["results"]), len(budgets))
+        for result in report["results"]:
+            with self.subTest(view=result["name"]):
+                self.assertEqual(result["violations"], [])
+
+
+class PerformanceMiddlewareTests(TestCase):
+
+    def test_server_timing_header_and_staff_page(self):
+        user = CustomUser.objects.create_user(email="staff@example.com", password="pw", is_staff=True)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("dashboard"))
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+
+        response = self.client.get(reverse("performance_overview"))
+        self.assertContains(response, "dashboard")
+
+
+class MetricsEndpointTests(TestCase):
+
+    def test_requires_staff_or_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        with override_settings(METRICS_TOKEN="s3cret"):
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        with override_settings(METRICS_TOKEN="s3cret"):
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cre")
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN=""):
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, 403)
+
+    def test_exposes_request_histogram(self):
+        user = CustomUser.objects.create_user(email="ops@example.com", password="pw", is_staff=True)
+        self.client.force_login(user)
+        self.client.get(reverse("dashboard"))
+
+        response = self.client.get(reverse("metrics"))
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", body)
+        self.assertIn('http_request_duration_seconds_count{view="dashboard",method="GET",status="2xx"}', body)
+        self.assertIn("essay_grading_queue_depth 0", body)
+
+
+class NPlusOneDetectorTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="np@example.com", password="pw", is_staff=True, is_superuser=True)
+        for i in range(3):
+            test = PracticeTest.objects.create(owner=self.user, title=f"Test {i}")
+            PracticeTestResult.objects.create(owner=self.user, practice_test=test, score=50)
+
+    def test_lazy_loads_in_a_loop_raise(self):
+        with detect(raise_errors=True), self.assertRaisesMessage(NPlusOneError, "PracticeTestResult.practice_test"):
+            for result in PracticeTestResult.objects.all():
+                result.practice_test.title
+
+    def test_select_related_and_single_loads_pass(self):
+        with detect(raise_errors=True):
+            for result in PracticeTestResult.objects.select_related("practice_test"):
+                result.practice_test.title
+            PracticeTestResult.objects.first().practice_test.title
+            PracticeTestResult.objects.last().practice_test.title
+
+    def test_admin_user_changelist(self):
+        self.client.force_login(self.user)
+        for i in range(3):
+            CustomUser.objects.create_user(email=f"member{i}@example.com", password="pw")
+        response = self.client.get(reverse("admin:accounts_customuser_changelist"))
+        self.assertEqual(response.status_code, 200)
+
+
+calls = []
+
+
+@cached_per_user("test_results_count")
+def results_count(user):
+    calls.append(user.pk)
+    return PracticeTestResult.objects.filter(owner=user).count()
+
+
+class TieredCacheTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        with self.captureOnCommitCallbacks(execute=True):  # versions are bumped on commit
+            self.user = CustomUser.objects.create_user(email="cache@example.com", password="pw")
+        self.test = PracticeTest.objects.create(owner=self.user, title="T")
+
+    def test_cached_until_a_result_changes(self):
+        self.assertEqual(results_count(self.user), 0)
+        self.assertEqual(results_count(self.user), 0)
+        self.assertEqual(len(calls), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PracticeTestResult.objects.create(owner=self.user, practice_test=self.test, score=80)
+        self.assertEqual(results_count(self.user), 1)
+        self.assertEqual(len(calls), 2)
+
+    def test_invalidation_waits_for_commit(self):
+        self.assertEqual(results_count(self.user), 0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            PracticeTestResult.objects.create(owner=self.user, practice_test=self.test, score=80)
+            self.assertEqual(results_count(self.user), 0)  # uncommitted: the old version stays
+        for callback in callbacks:
+            callback()
+        self.assertEqual(results_count(self.user), 1)
+
+    def test_local_tier_evicts_least_recently_used(self):
+        lru = LocalLRU(max_entries=2)
+        lru.set("a", 1, 60)
+        lru.set("b", 2, 60)
+        lru.get("a")
+        lru.set("c", 3, 60)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual(len(lru), 2)
+        self.assertNotEqual(lru.get("b"), 2)
+
+    def test_dashboard_served_from_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("dashboard"))
+        with self.assertNumQueries(2):  # session + user only
+            response = self.client.get(reverse("dashboard"))
+        self.assertIn("cache;desc=", response["Server-Timing"])
+
+
+class SQLiteTuningTests(TransactionTestCase):
+
+    def test_pragmas_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute("PRAGMA busy_timeout").fetchone()[0], 5000)
+            self.assertEqual(cursor.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+
+    def test_retry_on_locked_reruns_the_transaction(self):
+        user = CustomUser.objects.create_user(email="writer@example.com", password="pw")
+        calls = []
+
+        @retry_on_locked(base_delay=0.001)
+        def flaky_award():
+            calls.append(1)
+            CustomUser.objects.filter(pk=user.pk).update(points=F("points") + 10)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+
+        flaky_award()
+        user.refresh_from_db()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(user.points, 10)  # the first attempt was rolled back
+
+
+class HotQueryIndexTests(TestCase):
+    """Each owner/time query behind the dashboard, progress and list pages is served by a composite index."""
+
+    def test_hot_queries_use_owner_time_indexes(self):
+        user = CustomUser.objects.create_user(email="plans@example.com", password="pw")
+        since = timezone.now() - timedelta(days=7)
+        hot_queries = {
+            "ptresult_owner_taken_idx": [
+                PracticeTestResult.objects.filter(owner=user).order_by("-taken_at")[:4],
+                PracticeTestResult.objects.filter(owner=user, taken_at__gte=since),
+            ],
+            "wtresult_owner_taken_idx": [
+                WritingTaskResult.objects.filter(owner=user).order_by("-taken_at")[:4],
+                WritingTaskResult.objects.filter(owner=user, taken_at__gte=since),
+            ],
+            "fsprogress_owner_reviewed_idx": [
+                FlashcardSetProgress.objects.filter(owner=user).order_by("-last_reviewed")[:4],
+                FlashcardSetProgress.objects.filter(owner=user, last_reviewed__gte=since),
+            ],
+            "practicetest_owner_created_idx": [PracticeTest.objects.filter(owner=user).order_by("-created_at")],
+            "writingtask_owner_created_idx": [WritingTask.objects.filter(owner=user).order_by("-created_at")],
+            "flashcardset_owner_created_idx": [FlashcardSet.objects.filter(owner=user).order_by("-created_at")],
+        }
+        for index, querysets in hot_queries.items():
+            for qs in querysets:
+                plan = qs.explain()
+                with self.subTest(query=str(qs.query)):
+                    self.assertIn(index, plan)
+                    self.assertNotIn("TEMP B-TREE", plan)  # no separate sort step
+
+
+@override_settings(APP_CACHE={"enabled": False})
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="library@example.com", password="pw")
+        self.client.force_login(self.user)
+        tests = [PracticeTest.objects.create(title=f"Test {i}", owner=self.user) for i in range(7)]
+        # identical timestamps for some rows exercise the pk tie-breaker
+        PracticeTest.objects.filter(pk__in=[t.pk for t in tests[2:5]]).update(created_at=tests[2].created_at)
+        Question.objects.create(practice_test=tests[0], text="Q?")
+        self.expected = list(PracticeTest.objects.order_by("-created_at", "-pk").values_list("pk", flat=True))
+
+    def test_feed_walks_every_row_once_with_constant_queries(self):
+        response = self.client.get(reverse("practice_tests"), {"size": 3})
+        seen = [test.pk for test in response.context["tests"]]
+        cursor = response.context["page"].next_cursor
+
+        while cursor:
+            with self.assertNumQueries(3):  # session, user, page
+                data = self.client.get(reverse("practice_tests_feed"), {"cursor": cursor, "size": 3}).json()
+            self.assertLessEqual(data["count"], 3)
+            seen += [pk for pk in self.expected if str(pk) in data["html"] and pk not in seen]
+            cursor = data["next_cursor"]
+
+        self.assertEqual(seen, self.expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get(reverse("practice_tests_feed"), {"cursor": "bogus"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("practice_tests"), {"cursor": "bogus"}).status_code, 400)
+
+    def test_deep_page_uses_index_without_sorting(self):
+        tests = PracticeTest.objects.filter(owner=self.user).annotate(
+            question_count=related_count(Question, "practice_test")
+        )
+        cursor = encode_cursor(timezone.now(), self.expected[0])
+        plan = keyset_queryset(tests, cursor)[:25].explain()
+        self.assertIn("practicetest_owner_created_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="reader@example.com", password="pw")
+        self.other = CustomUser.objects.create_user(email="other@example.com", password="pw")
+        self.client.force_login(self.user)
+        self.test = PracticeTest.objects.create(title="Cell biology", owner=self.user)
+        self.question = Question.objects.create(practice_test=self.test, text="Where does <b>photosynthesis</b> happen?",
+                                                explanation="In the chloroplasts of plant cells.")
+        cards = FlashcardSet.objects.create(title="Plants", owner=self.other)
+        Flashcard.objects.create(flashcard_set=cards, front="Photosynthesis", back="Light into sugar")
+
+    def results(self, q, **params):
+        return self.client.get(reverse("search"), {"q": q, **params}).json()["results"]
+
+    def test_results_are_owner_scoped_ranked_and_escaped(self):
+        results = self.results("photosynth")  # prefix of the last term
+        self.assertEqual([(r["kind"], r["url"]) for r in results],
+                         [("question", reverse("take_practice_test", args=[self.test.pk]))])
+        self.assertIn("&lt;b&gt;<mark>photosynthesis</mark>&lt;/b&gt;", results[0]["title"])
+
+        self.assertEqual(self.results("chloroplast cells")[0]["snippet"].count("<mark>"), 2)
+        self.assertEqual(self.results("cell", type="practice_test")[0]["kind"], "practice_test")
+        self.assertEqual(self.results('"cell" OR scope:u1 NEAR('), [])  # query syntax isn't passed through
+
+    def test_index_follows_saves_and_deletes(self):
+        self.question.text = "What is osmosis?"
+        self.question.save()
+        self.assertEqual(self.results("photosynthesis"), [])
+        self.assertEqual(len(self.results("osmosis")), 1)
+
+        self.test.delete()
+        self.assertEqual(self.results("osmosis"), [])
+        self.assertFalse(SearchDocument.objects.filter(scope=f"u{self.user.pk}").exists())
+
+    def test_rebuild_restores_documents(self):
+        SearchDocument.objects.all().delete()
+        counts = rebuild()
+        self.assertEqual((counts["question"], counts["flashcard"], counts["practice_test"]), (1, 1, 1))
+        self.assertEqual(len(self.results("chloroplasts")), 1)
+
+
+class CatalogTests(TestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(email="author@example.com", password="pw")
+        self.student = CustomUser.objects.create_user(email="student@example.com", password="pw")
+        self.client.force_login(self.student)
+        self.test = PracticeTest.objects.create(title="Algebra", subject="Math", difficulty="Easy", owner=self.author)
+        for i in range(3):
+            question = Question.objects.create(practice_test=self.test, text=f"Solve x + {i} = 5")
+            Option.objects.create(question=question, text=str(5 - i), is_correct=True)
+        PracticeTest.objects.create(title="Private", owner=self.author, is_public=False)
+        self.entry = CatalogEntry.objects.get()
+
+    def test_add_to_library_copies_in_fixed_queries_and_credits_original(self):
+        with self.assertNumQueries(16):  # independent of the number of questions
+            response = self.client.post(reverse("add_to_library", args=[self.entry.pk]))
+        copy = PracticeTest.objects.get(owner=self.student)
+        self.assertRedirects(response, reverse("take_practice_test", args=[copy.pk]), fetch_redirect_response=False)
+        self.assertEqual((copy.copied_from, copy.is_public), (self.test, False))
+        self.assertEqual(Option.objects.filter(question__practice_test=copy, is_correct=True).count(), 3)
+        self.assertEqual(CatalogEntry.objects.count(), 1)  # copies aren't listed
+
+        PracticeTestResult.objects.create(owner=self.student, practice_test=copy, score=90)
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.copies, self.entry.attempts, self.entry.score_sum), (1, 1, 90))
+        self.assertGreater(self.entry.popularity, 0)
+
+        counters = lambda: CatalogEntry.objects.values_list("copies", "attempts", "score_sum", "popularity").get()
+        before = counters()
+        rebuild_catalog()
+        self.assertEqual(counters(), before)
+
+    def test_browse_orders_by_popularity_and_filters(self):
+        popular = PracticeTest.objects.create(title="Geometry", subject="Math", difficulty="Hard", owner=self.author)
+        PracticeTestResult.objects.create(owner=self.author, practice_test=popular, score=80)
+
+        response = self.client.get(reverse("catalog"), {"subject": "Math"})
+        self.assertEqual([e.title for e in response.context["entries"]], ["Geometry", "Algebra"])
+        response = self.client.get(reverse("catalog"), {"difficulty": "Easy"})
+        self.assertEqual([e.title for e in response.context["entries"]], ["Algebra"])
+        self.assertEqual(response.context["filters"]["subjects"], ["Math"])
+
+        popular.is_public = False
+        popular.save()
+        self.assertFalse(CatalogEntry.objects.filter(title="Geometry").exists())
+
+
+class CloningTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="cloner@example.com", password="pw")
+        self.client.force_login(self.user)
+
+    def make_test(self, questions):
+        test = PracticeTest.objects.create(title="Chemistry", owner=self.user)
+        for q in Question.objects.bulk_create(
+            [Question(practice_test=test, text=f"Q{i}?") for i in range(questions)]
+        ):
+            Option.objects.bulk_create([Option(question=q, text=f"{q.text} {j}", is_correct=j == 0) for j in range(3)])
+        return test
+
+    def test_query_count_does_not_grow_with_test_size(self):
+        counts = []
+        for size in (2, 40):
+            test = self.make_test(size)
+            with CaptureQueriesContext(connection) as ctx:
+                copy = clone_activity(test, self.user)
+            counts.append(len(ctx.captured_queries))
+            self.assertEqual(Option.objects.filter(question__practice_test=copy).count(), size * 3)
+            self.assertEqual(
+                sorted(Option.objects.filter(question__practice_test=copy, is_correct=True).values_list("text", flat=True)),
+                sorted(f"Q{i}? 0" for i in range(size)),
+            )
+        self.assertEqual(counts[0], counts[1])
+
+    def test_duplicate_endpoint_copies_own_items_only(self):
+        test = self.make_test(2)
+        response = self.client.post(reverse("duplicate_practice_test", args=[test.pk]))
+        copy = PracticeTest.objects.exclude(pk=test.pk).get()
+        self.assertRedirects(response, reverse("edit_practice_test", args=[copy.pk]), fetch_redirect_response=False)
+        self.assertEqual((copy.title, copy.copied_from_id, copy.questions.count()), ("Chemistry (copy)", None, 2))
+
+        other = CustomUser.objects.create_user(email="not-owner@example.com", password="pw")
+        self.client.force_login(other)
+        self.assertEqual(self.client.post(reverse("duplicate_practice_test", args=[test.pk])).status_code, 404)
+
+
+class NearDuplicateTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="dedup@example.com", password="pw")
+        self.test = PracticeTest.objects.create(title="Biology", owner=self.user)
+        self.original = Question.objects.create(
+            practice_test=self.test, text="What is the powerhouse of the cell?", answer="Mitochondria",
+        )
+
+    def test_lookup_finds_reworded_question_of_same_owner_only(self):
+        matches = find_duplicates(self.user, "question", "what is the POWERHOUSE of the cell!")
+        self.assertEqual([pk for pk, _ in matches], [self.original.pk])
+        self.assertEqual(find_duplicates(self.user, "question", "Name the stages of mitosis."), [])
+        # one different word is a different question
+        self.assertEqual(find_duplicates(self.user, "question", "What is the powerhouse of the plant cell?"), [])
+        self.assertLess(jaccard(shingles("What is 2+3?"), shingles("What is 2+4?")), 0.8)
+
+        other = CustomUser.objects.create_user(email="other-dedup@example.com", password="pw")
+        self.assertEqual(find_duplicates(other, "question", "What is the powerhouse of the cell?"), [])
+
+        self.original.delete()
+        self.assertFalse(LSHBucket.objects.exists())
+
+    def test_generated_duplicates_are_skipped(self):
+        generated = {"PracticeTest": {"title": "Cells", "questions": [
+            {"text": "What is the powerhouse of the cell??", "question_type": "short"},
+            {"text": "Which organelle contains chlorophyll?", "question_type": "short"},
+            {"text": "Which organelle contains Chlorophyll!", "question_type": "short"},
+            {"text": "What is 2+3?", "question_type": "short"},
+            {"text": "What is 2+4?", "question_type": "short"},
+        ]}}
+        with override_settings(NEAR_DUPLICATES={"scope": "owner"}):
+            test = save_activity_from_json(generated, self.user, "practice_test")
+        self.assertEqual(test.skipped_duplicates, 2)
+        self.assertEqual(list(test.questions.values_list("text", flat=True)),
+                         ["Which organelle contains chlorophyll?", "What is 2+3?", "What is 2+4?"])
+
+        test = save_activity_from_json(generated, self.user, "practice_test")  # default: within the test only
+        self.assertEqual((test.skipped_duplicates, test.questions.count()), (1, 4))
+
+    def test_generation_left_empty_creates_nothing(self):
+        generated = {"PracticeTest": {"title": "Cells", "questions": [
+            {"text": "What is the powerhouse of the cell?", "question_type": "short"},
+        ]}}
+        tests = PracticeTest.objects.count()
+        with override_settings(NEAR_DUPLICATES={"scope": "owner"}), self.assertRaises(ValueError):
+            save_activity_from_json(generated, self.user, "practice_test")
+        self.assertEqual(PracticeTest.objects.count(), tests)
+
+    def test_clusters_in_library(self):
+        copy = clone_activity(self.test, self.user, link_original=False)
+        Question.objects.create(practice_test=self.test, text="Define osmosis.")
+        self.assertEqual(
+            duplicate_clusters(self.user, "question"), [[self.original.pk, copy.questions.get().pk]],
+        )
+        self.assertEqual(duplicate_clusters(self.user, "question", scope="activity"), [])
+
+
+class RelatedMaterialTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="related@example.com", password="pw")
+        self.author = CustomUser.objects.create_user(email="related-author@example.com", password="pw")
+        self.client.force_login(self.user)
+        self.test = PracticeTest.objects.create(title="Photosynthesis quiz", owner=self.user)
+        Question.objects.create(practice_test=self.test, text="Where does photosynthesis capture light energy?")
+        self.own_set = FlashcardSet.objects.create(title="Chloroplast cards", owner=self.user)
+        Flashcard.objects.create(flashcard_set=self.own_set, front="Chloroplast", back="Site of photosynthesis")
+        self.public = FlashcardSet.objects.create(title="Light reactions of photosynthesis", owner=self.author)
+        FlashcardSet.objects.create(title="Photosynthesis notes", owner=self.author, is_public=False)
+        FlashcardSet.objects.create(title="French verbs", owner=self.user)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.settings_override = override_settings(RELATED_INDEX={"path": self.directory})
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_related_are_own_or_public_and_similar(self):
+        build_related_index()
+        items = self.related("practice_test", self.test)
+        # not the author's private set, nor the unrelated one
+        self.assertEqual(sorted((item.title, item.in_library) for item in items),
+                         [("Chloroplast cards", True), ("Light reactions of photosynthesis", False)])
+
+        response = self.client.get(reverse("related_material", args=["practice_test", self.test.pk]))
+        self.assertEqual(response.json()["count"], 2)
+        self.assertIn(reverse("add_to_library", args=[CatalogEntry.objects.get(object_id=self.public.pk).pk]),
+                      response.json()["html"])
+
+    def test_append_adds_a_segment_for_new_activities(self):
+        build_related_index()
+        newer = WritingTask.objects.create(title="Essay on photosynthesis", prompt="Explain photosynthesis", owner=self.user)
+        manifest = build_related_index(append=True)
+        self.assertEqual((len(manifest["segments"]), manifest["docs"]), (2, 6))
+        self.assertIn(newer.title, [item.title for item in self.related("practice_test", self.test)])
+
+    def related(self, kind, activity):
+        return related_items(self.user, kind, activity)
+
+
+class QuestionResponseTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="responses@example.com", password="pw")
+        self.client.force_login(self.user)
+        self.test = PracticeTest.objects.create(title="Capitals", subject="Geography", owner=self.user)
+        self.mcq = Question.objects.create(practice_test=self.test, text="Capital of France?", subject="Geography")
+        self.paris = Option.objects.create(question=self.mcq, text="Paris", is_correct=True)
+        Option.objects.create(question=self.mcq, text="Lyon")
+        self.text = Question.objects.create(practice_test=self.test, text="Capital of Spain?", question_type="text",
+                                            answer="Madrid", subject="Geography")
+        self.skipped = Question.objects.create(practice_test=self.test, text="Capital of Peru?", question_type="text",
+                                               answer="Lima")
+
+    def test_submission_stores_one_row_per_question(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse("take_practice_test", args=[self.test.pk]), {
+                f"question_{self.mcq.pk}": str(self.paris.pk), f"question_{self.text.pk}": "Madird",
+            })
+        self.assertEqual(sum('INSERT INTO "myapp_questionresponse"' in q["sql"] for q in ctx.captured_queries), 1)
+
+        rows = {r.question_id: r for r in QuestionResponse.objects.filter(result__practice_test=self.test)}
+        self.assertEqual((rows[self.mcq.pk].option, rows[self.mcq.pk].text, rows[self.mcq.pk].is_correct),
+                         (self.paris, "", True))
+        self.assertEqual((rows[self.text.pk].text, rows[self.text.pk].is_correct), ("Madird", True))
+        self.assertLess(rows[self.text.pk].similarity, 100)
+        self.assertEqual((rows[self.skipped.pk].text, rows[self.skipped.pk].is_correct), ("", False))
+        self.assertEqual({r.owner_id for r in rows.values()}, {self.user.pk})
+
+    def test_prune_deletes_only_expired_rows(self):
+        self.client.post(reverse("take_practice_test", args=[self.test.pk]), {})
+        QuestionResponse.objects.filter(question=self.mcq).update(answered_at=timezone.now() - timedelta(days=400))
+        self.assertEqual(prune_responses(days=365, batch_size=1), 1)
+        self.assertEqual(QuestionResponse.objects.count(), 2)
+
+
+class ItemAnalysisTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="items@example.com", password="pw")
+        self.client.force_login(self.user)
+        self.test = PracticeTest.objects.create(title="Arithmetic", owner=self.user)
+        self.q1 = Question.objects.create(practice_test=self.test, text="2 + 2?", question_type="text", answer="4")
+        self.q2 = Question.objects.create(practice_test=self.test, text="3 * 3?")
+        self.right = Option.objects.create(question=self.q2, text="9", is_correct=True)
+        self.wrong = Option.objects.create(question=self.q2, text="6")
+        self.unused = Option.objects.create(question=self.q2, text="33")
+
+    def submit(self, q1, q2):
+        self.client.post(reverse("take_practice_test", args=[self.test.pk]), {
+            f"question_{self.q1.pk}": q1, f"question_{self.q2.pk}": str(q2.pk),
+        })
+
+    def test_indices_update_with_each_submission_and_match_rebuild(self):
+        for q1, q2 in [("4", self.right), ("4", self.right), ("4", self.wrong), ("5", self.wrong), ("5", self.right)]:
+            self.submit(q1, q2)
+
+        def analysis():
+            questions = self.test.questions.select_related("stats").prefetch_related(
+                Prefetch("options", queryset=Option.objects.select_related("stats").order_by("pk")))
+            return {q.pk: analyze(q) for q in questions}
+
+        items = analysis()
+        self.assertAlmostEqual(items[self.q2.pk].p_value, 0.6)
+        # totals 100, 100, 50, 0, 50: q2 correct -> mean 83.3, incorrect -> 25, variance 1400
+        self.assertAlmostEqual(items[self.q2.pk].discrimination, (250 / 3 - 25) / math.sqrt(1400) * math.sqrt(0.24))
+        rates = [(o.rate, o.flags) for o in items[self.q2.pk].options]
+        self.assertEqual(rates, [(0.6, []), (0.4, []), (0.0, ["never chosen"])])
+
+        rebuild_item_stats()
+        self.assertEqual(analysis(), items)
+
+        self.assertContains(self.client.get(reverse("edit_practice_test", args=[self.test.pk])), "60% correct")
+
+
+class MasteryTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="mastery@example.com", password="pw")
+        self.client.force_login(self.user)
+        self.test = PracticeTest.objects.create(title="Mixed", owner=self.user)
+        self.algebra = Question.objects.create(practice_test=self.test, text="x + 1 = 3?", subject="Algebra",
+                                               question_type="text", answer="2")
+        self.biology = Question.objects.create(practice_test=self.test, text="Unit of life?", subject="Biology",
+                                               question_type="text", answer="cell")
+
+    def skills(self):
+        return dict(SubjectMastery.objects.filter(owner=self.user).values_list("subject", "skill"))
+
+    def test_results_update_skills_that_rank_weak_subjects_first(self):
+        response = self.client.post(reverse("create_ai_activity", args=["practice_test"]), {"mode": "weakest"})
+        self.assertFalse(response.json()["success"])  # no history yet
+
+        for _ in range(3):
+            self.client.post(reverse("take_practice_test", args=[self.test.pk]), {
+                f"question_{self.algebra.pk}": "7", f"question_{self.biology.pk}": "cell",
+            })
+        skills = self.skills()
+        self.assertAlmostEqual(skills["Algebra"], 0.5 * 0.9 ** 3)
+        self.assertAlmostEqual(skills["Biology"], 1 - 0.5 * 0.9 ** 3)
+
+        task = WritingTask.objects.create(title="Essay", prompt="Rome", subject="History", owner=self.user)
+        essay = WritingTaskResult.objects.create(owner=self.user, writing_task=task, score=0)
+        essay.score, essay.feedback = 80, "Good"
+        essay.save(update_fields=["score", "feedback"])
+        self.assertAlmostEqual(self.skills()["History"], 0.5 * 0.9 ** 5 + (1 - 0.9 ** 5) * 0.8)
+
+        topics = weakest(self.user.pk)
+        self.assertEqual([t.subject for t in topics], ["Algebra", "Biology"])  # History has one answer
+        self.assertEqual((topics[0].answers, topics[0].accuracy), (3, 0.0))
+        prompt = focus_prompt(topics, "short questions")
+        self.assertIn("- Algebra: skill 0.36, 0% correct over 3 answers", prompt)
+        self.assertIn("short questions", prompt)
+        # unpractised subjects drift back towards "unknown"
+        later = weakest(self.user.pk, now=timezone.now() + timedelta(days=30))
+        self.assertAlmostEqual(later[0].skill, 0.5 + (0.5 * 0.9 ** 3 - 0.5) / 2, places=3)
+
+        before = self.skills()
+        rebuild_mastery()
+        for subject, skill in self.skills().items():
+            self.assertAlmostEqual(skill, before[subject])
+
+
+class AdaptiveAssemblyTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="adaptive@example.com", password="pw")
+        other = CustomUser.objects.create_user(email="author@example.com", password="pw")
+        self.client.force_login(self.user)
+        own = PracticeTest.objects.create(title="Mine", owner=self.user, is_public=False)
+        public = PracticeTest.objects.create(title="Public", owner=other, is_public=True)
+        private = PracticeTest.objects.create(title="Private", owner=other, is_public=False)
+        for test, ratings in [(own, [1100, 1400, 2000]), (public, [1300, 1350]), (private, [1360])]:
+            for rating in ratings:
+                question = Question.objects.create(practice_test=test, text=f"{test.title} {rating}?",
+                                                   subject="Chemistry", answer="yes", question_type="text")
+                Question.objects.filter(pk=question.pk).update(rating=rating)
+        Option.objects.create(question=Question.objects.get(text="Public 1350?"), text="yes", is_correct=True)
+
+    def test_assembles_from_own_and_public_questions_and_updates_ratings(self):
+        test = assemble(self.user, "Chemistry", 2)
+        self.assertFalse(test.is_public)
+        # target for a 1500 user is 1500 - 400 * log10(0.7 / 0.3), about 1353: two of the four nearest
+        picked = {q.text for q in test.questions.all()}
+        self.assertEqual(len(picked), 2)
+        self.assertLessEqual(picked, {"Public 1350?", "Mine 1400?", "Public 1300?", "Mine 1100?"})
+        response = self.client.post(reverse("adaptive_practice_test"), {"subject": "Alchemy"})
+        self.assertFalse(response.json()["success"])
+        response = self.client.post(reverse("adaptive_practice_test"), {"subject": "Chemistry", "amount": 3})
+        self.assertTrue(response.json()["success"])
+
+        test = assemble(self.user, "Chemistry", 10)
+        questions = list(test.questions.order_by("rating").prefetch_related("options"))
+        self.assertEqual([q.text for q in questions],
+                         ["Mine 1100?", "Public 1300?", "Public 1350?", "Mine 1400?", "Mine 2000?"])
+        self.assertEqual([o.text for o in questions[2].options.all()], ["yes"])
+
+        self.client.post(reverse("take_practice_test", args=[test.pk]), {f"question_{q.pk}": "yes" for q in questions})
+        surprises = [1 - 1 / (1 + 10 ** ((q.rating - 1500) / 400)) for q in questions]
+        mastery = SubjectMastery.objects.get(owner=self.user, subject="Chemistry")
+        self.assertAlmostEqual(mastery.rating, 1500 + 16 * sum(surprises))
+        for question, surprise in zip(questions, surprises):
+            self.assertAlmostEqual(Question.objects.get(pk=question.pk).rating, question.rating - 8 * surprise)
+
+        # everything in the bank has just been answered right
+        response = self.client.post(reverse("adaptive_practice_test"), {"subject": "Chemistry", "amount": 3})
+        self.assertFalse(response.json()["success"])
+
+    def test_answers_to_copies_rate_and_retire_the_bank_questions(self):
+        test = assemble(self.user, "Chemistry", 3)
+        copies = list(test.questions.select_related("source"))
+        self.assertTrue(all(q.source_id and q.source.text == q.text for q in copies))
+        self.client.post(reverse("take_practice_test", args=[test.pk]), {f"question_{q.pk}": "yes" for q in copies})
+        for question in copies:
+            self.assertLess(Question.objects.get(pk=question.source_id).rating, question.rating)
+
+        # answered right through the copies, so neither the originals nor the copies come back
+        again = assemble(self.user, "Chemistry", 3)
+        self.assertFalse({q.text for q in again.questions.all()} & {q.text for q in copies})
+        self.assertFalse(again.questions.filter(source__in=[q.pk for q in copies]).exists())
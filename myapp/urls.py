@@ -7,33 +7,48 @@ urlpatterns = [
 
     # Practice tests URLs
     path('practice-tests/', views.practice_tests, name='practice_tests'),
+    path('practice-tests/feed/', views.practice_tests_feed, name='practice_tests_feed'),
     path('practice-tests/<uuid:pk>/take/', views.take_practice_test, name='take_practice_test'),
     path("practice_tests/create/", views.practice_test_form, name="create_practice_test"),
     path("practice_tests/<uuid:pk>/edit/", views.practice_test_form, name="edit_practice_test"),
     path("practice_tests/<uuid:pk>/delete/", views.delete_practice_test, name="delete_practice_test"),
+    path("practice_tests/<uuid:pk>/duplicate/", views.duplicate_practice_test, name="duplicate_practice_test"),
 
     path('create-ai-activity/<str:activity_type>/', views.create_ai_activity, name='create_ai_activity'),
+    path('practice-tests/adaptive/', views.adaptive_practice_test, name='adaptive_practice_test'),
     
 
     # Writing tasks URLs
     path('writing-tasks/', views.writing_tasks, name='writing_tasks'),
+    path('writing-tasks/feed/', views.writing_tasks_feed, name='writing_tasks_feed'),
     path("writing-task/<uuid:pk>/take/", views.take_writing_task, name="take_writing_task"),
     path("writing-task/<uuid:pk>/results/", views.writing_task_result, name="writing_task_result"),
     path('writing-task/<uuid:pk>/loading/', views.writing_task_loading, name='writing_task_loading'),
+    path('search/', views.search_library, name='search'),
+    path('related/<str:kind>/<uuid:pk>/', views.related_material, name='related_material'),
+    path('catalog/', views.catalog_page, name='catalog'),
+    path('catalog/feed/', views.catalog_feed, name='catalog_feed'),
+    path('catalog/<int:pk>/add/', views.add_to_library, name='add_to_library'),
     path('ai-chat/', views.ai_chat, name='ai_chat'),
+    path('ai-router/metrics/', views.ai_router_metrics, name='ai_router_metrics'),
+    path('staff/performance/', views.performance_overview, name='performance_overview'),
+    path('metrics', views.metrics_view, name='metrics'),
 
     path("writing-tasks/create/", views.writing_task_form, name="create_writing_task"),
     path("writing-tasks/<uuid:pk>/edit/", views.writing_task_form, name="edit_writing_task"),
     path("writing-tasks/<uuid:pk>/delete/", views.writing_task_form, name="delete_writing_task"),
+    path("writing-tasks/<uuid:pk>/duplicate/", views.duplicate_writing_task, name="duplicate_writing_task"),
 
     # Flashcards URLs
     path('flashcards/', views.flashcard_sets, name='flashcard_sets'),
+    path('flashcards/feed/', views.flashcard_sets_feed, name='flashcard_sets_feed'),
     path('flashcards/create/', views.flashcard_set_form, name='create_flashcard_set'),
     path('flashcards/<uuid:set_id>/take/', views.take_flashcard_set, name='take_flashcard_set'),
     path('flashcards/<uuid:set_id>/summary/', views.flashcard_summary, name='flashcard_summary'),
 
     path('flashcards/<uuid:set_id>/edit/', views.flashcard_set_form, name='edit_flashcard_set'),
     path('flashcards/<uuid:set_id>/delete/', views.flashcard_set_form, name='delete_flashcard_set'),
+    path('flashcards/<uuid:set_id>/duplicate/', views.duplicate_flashcard_set, name='duplicate_flashcard_set'),
     
 
     path('answer-flashcard/<uuid:set_id>/<str:action>/', views.answer_flashcard, name='answer_flashcard'),
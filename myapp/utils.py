@@ -1,4 +1,5 @@
 import json
+import logging
 import openai
 import os
 from dotenv import load_dotenv
@@ -9,16 +10,28 @@ from PyPDF2 import PdfReader
 from django.http import JsonResponse
 from .validate_json import ai_prompt
 from docx import Document
+from .ai_router import router
+from . import dedup, instrumentation, metrics
+from .sqlite import retry_on_locked
+from django.db.models import F
+from accounts.entitlements import get_entitlements
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()  # Load environment variables from .env file
 
+from django.conf import settings
 from openai import OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY") or settings.OPENAI_API_KEY,
+    base_url=settings.OPENAI_BASE_URL,  # None -> api.openai.com
+    timeout=settings.OPENAI_TIMEOUT,
+)
 
 
 
 
-def calculate_points(task, score):
+def calculate_points(task, score, question_count=None):
     if score == 0:  # 0 points awarded for failure
         return 0
 
@@ -39,8 +52,10 @@ def calculate_points(task, score):
 
     # Extra points for number of questions (for practice tests)
     question_points = 0
-    if hasattr(task, 'questions'):
-        question_points = min(task.questions.count() * 2, 100)  # 2 points per question, max 100
+    if question_count is None and hasattr(task, 'questions'):
+        question_count = task.questions.count()
+    if question_count is not None:
+        question_points = min(question_count * 2, 100)  # 2 points per question, max 100
 
     total_points = round(difficulty_points + time_points + accuracy_points + question_points)
 
@@ -122,9 +137,10 @@ from openai import OpenAI
 #         ai_content = response.output_text
 #         usage = response.usage if hasattr(response, "usage") else {}
 
-def generate_activity(prompt, amount, difficulty, activity_type, extra_file_data=None):
+def generate_activity(prompt, amount, difficulty, activity_type, extra_file_data=None, plan="free"):
     """
     Generate an AI-powered activity (practice test or flashcards) safely.
+    The model is picked by the AI router ("activity" task) for the user's plan tier.
     Returns: (dict, usage) OR (None, None) if error.
     """
 
@@ -135,20 +151,25 @@ def generate_activity(prompt, amount, difficulty, activity_type, extra_file_data
         if extra_file_data:
             full_prompt += f"\n\nUse the following file content as context:\n{extra_file_data}"
 
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": (
-                    "You are a helpful assistant that creates educational content in valid JSON format. "
-                    "Return only JSON. Avoid extra text."
-                )},
-                {"role": "user", "content": ai_prompt(full_prompt, amount, difficulty, activity_type, extra_file_data)}
-            ],
-            response_format={"type": "json_object"},
-            max_tokens=3000,
-            temperature=0.7,
+        user_content = ai_prompt(full_prompt, amount, difficulty, activity_type, extra_file_data)
+
+        response = router.run(
+            "activity",
+            lambda model: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": (
+                        "You are a helpful assistant that creates educational content in valid JSON format. "
+                        "Return only JSON. Avoid extra text."
+                    )},
+                    {"role": "user", "content": user_content}
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=3000,
+                temperature=0.7,
+            ),
+            prompt_chars=len(user_content),
+            plan=plan,
         )
         
         ai_content = response.choices[0].message.content
@@ -165,30 +186,57 @@ def generate_activity(prompt, amount, difficulty, activity_type, extra_file_data
                 errors.append(str(e))
 
         if parsed_content is None:
-            print("❌ AI JSON parse errors:", errors)
-            print("AI raw output (first 300 chars):", ai_content[:300])
+            instrumentation.event("ai.activity.parse_failed", errors=errors, raw_output=ai_content[:300])
+            logger.warning(f"AI {activity_type} output is not valid JSON: {errors}")
+            metrics.AI_ACTIVITY_GENERATIONS.labels(activity_type=activity_type, outcome="parse_error").inc()
             return None, None
 
         usage = response.usage if hasattr(response, "usage") else {}
+        metrics.AI_ACTIVITY_GENERATIONS.labels(activity_type=activity_type, outcome="ok").inc()
         return parsed_content, usage
 
     except Exception as e:
-        print(f"❌ Error in generate_activity: {e}")
+        instrumentation.event("ai.activity.failed", error=str(e))
+        logger.exception(f"AI {activity_type} generation failed: {e}")
+        metrics.AI_ACTIVITY_GENERATIONS.labels(activity_type=activity_type, outcome="error").inc()
         return None, None
  
     
+def _without_duplicates(user, kind, items, text_key):
+    """The generated items that aren't near-duplicates (see myapp/dedup.py), and how many were dropped."""
+    checker = dedup.DuplicateChecker(user, kind)
+    kept = []
+    for item in items:
+        if checker.is_duplicate(item.get(text_key, "")):
+            continue
+        checker.add(item.get(text_key, ""))
+        kept.append(item)
+    return kept, len(items) - len(kept)
+
+
+def _nothing_left(items, skipped):
+    if skipped:
+        return f"All {skipped} generated {items} duplicated ones you already have, so nothing was saved."
+    return f"The AI returned no {items}. Please try again."
+
+
 def save_activity_from_json(json_data, user, activity_type, duration=30):
     """
     Saves AI-generated activities (PracticeTest or FlashcardSet) into the database.
     :param json_data: dict (parsed JSON from AI)
     :param user: CustomUser instance (the owner)
     :param activity_type: 'practice_test' or 'flashcards'
-    :return: Created model instance
+    :return: Created model instance, with `skipped_duplicates` set to the number of
+             questions/cards dropped as near-duplicates (see myapp/dedup.py)
+    :raises ValueError: when no question/card is left to save, so nothing empty is created
     """
 
     if activity_type == "practice_test":
         # Ensure we’re inside the right JSON object
         data = json_data.get("PracticeTest", json_data)
+        questions, skipped = _without_duplicates(user, "question", data.get("questions", []), "text")
+        if not questions:
+            raise ValueError(_nothing_left("questions", skipped))
 
         practice_test = PracticeTest.objects.create(
             title=data.get("title", "Untitled Test"),
@@ -200,8 +248,7 @@ def save_activity_from_json(json_data, user, activity_type, duration=30):
             owner=user
         )
 
-        # Loop through questions
-        for q in data.get("questions", []):
+        for q in questions:
             question = Question.objects.create(
                 practice_test=practice_test,
                 text=q.get("text", ""),
@@ -220,10 +267,16 @@ def save_activity_from_json(json_data, user, activity_type, duration=30):
                         is_correct=opt.get("is_correct", False)
                     )
 
+        if skipped:
+            metrics.NEAR_DUPLICATES_SKIPPED.labels(kind="question").inc(skipped)
+        practice_test.skipped_duplicates = skipped
         return practice_test
 
     elif activity_type == "flashcards":
         data = json_data.get("FlashcardSet", json_data)
+        cards, skipped = _without_duplicates(user, "flashcard", data.get("flashcards", []), "front")
+        if not cards:
+            raise ValueError(_nothing_left("flashcards", skipped))
 
         flashcard_set = FlashcardSet.objects.create(
             title=data.get("title", "Untitled Flashcards"),
@@ -233,13 +286,16 @@ def save_activity_from_json(json_data, user, activity_type, duration=30):
             owner=user
         )
 
-        for card in data.get("flashcards", []):
+        for card in cards:
             Flashcard.objects.create(
                 flashcard_set=flashcard_set,
                 front=card.get("front", ""),
                 back=card.get("back", "")
             )
 
+        if skipped:
+            metrics.NEAR_DUPLICATES_SKIPPED.labels(kind="flashcard").inc(skipped)
+        flashcard_set.skipped_duplicates = skipped
         return flashcard_set
 
     else:
@@ -266,40 +322,66 @@ def deduct_credits(usage, user):
     """
     # Make sure usage is not None
     if usage is None:
-        print("Usage was found to be none, exiting deduct_credits function (located in myapp/utils.py)")
+        instrumentation.event("ai.usage_missing")
         return
 
     # Access attributes directly
     prompt_tokens = getattr(usage, "prompt_tokens", 0)
     completion_tokens = getattr(usage, "completion_tokens", 0)
     total_tokens = getattr(usage, "total_tokens", 0)
+    instrumentation.record_ai_tokens(total_tokens)
+    metrics.AI_TOKENS.labels(kind="prompt").inc(prompt_tokens or 0)
+    metrics.AI_TOKENS.labels(kind="completion").inc(completion_tokens or 0)
+    metrics.AI_CREDITS_DEDUCTED.inc(total_tokens or 0)
+
+    charge_credits(user, total_tokens or 0)
 
-    user.ai_credits -= total_tokens
-    user.save()
+
+@retry_on_locked()
+def charge_credits(user, tokens: int):
+    """Subtract credits in SQL (a full user.save() would overwrite concurrent changes)."""
+    user._meta.model.objects.filter(pk=user.pk).update(ai_credits=F("ai_credits") - tokens)
+    user.ai_credits -= tokens
+
+
+def plan_tier(user):
+    """Return the lowercase plan name used for model routing ('free' when unsubscribed)."""
+    if not getattr(user, "is_authenticated", False):
+        return "free"
+    return get_entitlements(user).plan
 
 
 # this returns ai_content, automatically deducts credits
-def ai_chat_response(prompt, system_content, user, model="gpt-4o-mini", response_format="text", max_tokens=3000, temperature=0.7, stream=False):
+# `task` selects the model tiers from settings.AI_MODEL_ROUTES (see ai_router.py)
+def ai_chat_response(prompt, system_content, user, task="chatbot", response_format="text", max_tokens=3000, temperature=0.7, stream=False):
     try:
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_content},
-                {"role": "user", "content": prompt},
-            ],
-            max_tokens=max_tokens,
-            temperature=temperature,
-            stream=stream,
-            response_format={"type": response_format}
+        response = router.run(
+            task,
+            lambda model: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_content},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=stream,
+                stream_options={"include_usage": True} if stream else None,
+                response_format={"type": response_format}
+            ),
+            prompt_chars=len(prompt),
+            plan=plan_tier(user),
         )
 
         if stream:
             ai_content = ""
-            for chunk in response:
-                delta = chunk.choices[0].delta.get("content", "")
-                ai_content += delta
             usage = {}
+            for chunk in response:
+                if chunk.choices:
+                    ai_content += chunk.choices[0].delta.content or ""
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
         else:
             ai_content = response.choices[0].message.content
             usage = response.usage if hasattr(response, "usage") else {}
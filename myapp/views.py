@@ -6,17 +6,24 @@ Refactored views.py following DRY principles
 - Maintained all existing functionality
 """
 
+import hmac
 import json
 import logging
+import time
 from typing import Any, Dict, Optional, List, Tuple
 from dataclasses import dataclass
 from functools import wraps
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db import transaction
-from django.http import HttpRequest, HttpResponse, JsonResponse, Http404
+from django.db.models import Count, F, Prefetch
+from django.db.models.functions import TruncDate
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse, Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.safestring import mark_safe
@@ -24,6 +31,7 @@ from accounts.subscriptions import get_subscription_features
 from django.utils.timezone import now, timedelta
 from django.utils import timezone
 from collections import Counter
+from urllib.parse import urlencode
 
 from myapp.models import PracticeTestResult, WritingTaskResult, FlashcardSetProgress
 
@@ -35,13 +43,23 @@ from .forms import (
 from .models import (
     PracticeTest, Question, Option, PracticeTestResult,
     WritingTask, WritingTaskResult,
-    FlashcardSet, Flashcard, FlashcardSetProgress,
+    FlashcardSet, Flashcard, FlashcardSetProgress, CatalogEntry,
 )
 from .utils import (
     ai_chat_response, calculate_points, is_similar_answer,
     decode_uploaded_file, generate_activity, save_activity_from_json,
-    deduct_credits,
+    deduct_credits, plan_tier,
 )
+from .ai_router import router
+from .cloning import clone_activity, copy_title
+from .cache import cached_per_user
+from .pagecache import anonymous_page_cache
+from .pagination import (
+    DEFAULT_PAGE_SIZE, InvalidCursor, KeysetPage, feed_response, keyset_page, page_size, related_count,
+)
+from .sqlite import retry_on_locked
+from . import adaptive, catalog, instrumentation, item_analysis, mastery, metrics, related, responses, search
+from .instrumentation import endpoint_stats
 
 logger = logging.getLogger(__name__)
 
@@ -57,11 +75,13 @@ def get_owned_object_or_404(model, pk: int, user):
         raise
 
 
-def award_points(user, activity, score: int):
+@retry_on_locked()
+def award_points(user, activity, score: int, question_count: Optional[int] = None):
     """Award points to user based on activity and score."""
-    points = calculate_points(activity, score)
+    points = calculate_points(activity, score, question_count)
+    # Increment in SQL so concurrent awards don't overwrite each other
+    user._meta.model.objects.filter(pk=user.pk).update(points=F("points") + points)
     user.points = (getattr(user, "points", 0) or 0) + points
-    user.save(update_fields=["points"])
     return points
 
 
@@ -196,16 +216,60 @@ class FormProcessor:
             return False, {'form': form, 'formset': formset}
 
 
+# ======================== CACHED LISTS ========================
+
+# One keyset page per call (see myapp/pagination.py); each page is cached separately.
+
+@cached_per_user("practice_tests")
+def user_practice_tests(user, cursor=None, size=DEFAULT_PAGE_SIZE) -> KeysetPage:
+    tests = PracticeTest.objects.filter(owner=user).annotate(question_count=related_count(Question, "practice_test"))
+    return keyset_page(tests, cursor, size)
+
+
+@cached_per_user("writing_tasks")
+def user_writing_tasks(user, cursor=None, size=DEFAULT_PAGE_SIZE) -> KeysetPage:
+    return keyset_page(WritingTask.objects.filter(owner=user), cursor, size)
+
+
+@cached_per_user("flashcard_sets")
+def user_flashcard_sets(user, cursor=None, size=DEFAULT_PAGE_SIZE) -> KeysetPage:
+    sets = FlashcardSet.objects.filter(owner=user).annotate(card_count=related_count(Flashcard, "flashcard_set"))
+    return keyset_page(sets, cursor, size)
+
+
+def _list_page(request, loader, template, context_name):
+    """Render the first (or ?cursor=) page of a keyset-paginated list."""
+    try:
+        page = loader(request.user, request.GET.get("cursor"), page_size(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    return render(request, template, {context_name: page.items, "page": page})
+
+
+def _list_feed(request, loader, template, context_name):
+    """The next page of a list as JSON for infinite scroll."""
+    try:
+        page = loader(request.user, request.GET.get("cursor"), page_size(request))
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return feed_response(request, page, template, context_name)
+
+
 # ======================== PRACTICE TEST VIEWS ========================
 
 @login_required
 def practice_tests(request: HttpRequest) -> HttpResponse:
-    """List all practice tests for current user."""
-    tests = PracticeTest.objects.filter(owner=request.user).order_by("-created_at")
-    return render(request, "myapp/main/tests/practice_tests.html", {"tests": tests})
+    """List practice tests for current user, newest first."""
+    return _list_page(request, user_practice_tests, "myapp/main/tests/practice_tests.html", "tests")
+
+
+@login_required
+def practice_tests_feed(request: HttpRequest) -> JsonResponse:
+    return _list_feed(request, user_practice_tests, "myapp/main/tests/_practice_test_cards.html", "tests")
 
 
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
 from django.contrib import messages
@@ -228,13 +292,13 @@ def practice_test_form(request, pk=None):
 
     if editing:
         practice_test = get_object_or_404(PracticeTest, pk=pk, owner=request.user)
-        questions = practice_test.questions.all()
-        print(f"[DEBUG] Editing PracticeTest {practice_test.id} with {questions.count()} questions")
-        for question in questions:
-            print(f"[DEBUG] Question {question.id} belongs to PracticeTest {question.practice_test.id}")
+        questions = practice_test.questions.select_related("stats").prefetch_related(
+            Prefetch("options", queryset=Option.objects.select_related("stats").order_by("pk"))
+        )
+        instrumentation.event("practice_test.edit", test_id=practice_test.id)
     else:
         questions = Question.objects.none()
-        print("[DEBUG] Creating new PracticeTest")
+        instrumentation.event("practice_test.create")
 
     if request.method == "POST":
         test_form = PracticeTestForm(request.POST, instance=practice_test)
@@ -244,24 +308,23 @@ def practice_test_form(request, pk=None):
             queryset=questions
         )
 
-        print(f"[DEBUG] Test form valid: {test_form.is_valid()}, Question formset valid: {question_formset.is_valid()}")
-
         if test_form.is_valid() and question_formset.is_valid():
             with transaction.atomic():
                 practice_test = test_form.save(commit=False)
                 practice_test.owner = request.user
                 practice_test.save()
-                print(f"[DEBUG] Saved PracticeTest ID: {practice_test.id}")
+                instrumentation.event("practice_test.saved", test_id=practice_test.id)
 
                 for q_idx, q_form in enumerate(question_formset):
                     question = q_form.save(commit=False)
                     question.practice_test = practice_test
                     if q_form.cleaned_data.get("DELETE") and question.pk:
-                        print(f"[DEBUG] Deleting Question ID: {question.id}")
+                        instrumentation.event("practice_test.question_deleted", question_id=question.id)
                         question.delete()
                         continue
                     question.save()
-                    print(f"[DEBUG] Saved Question ID: {question.id}, Type: {question.question_type}")
+                    instrumentation.event("practice_test.question_saved", question_id=question.id,
+                                          question_type=question.question_type)
 
                     if question.question_type in ["mcq", "tf"]:
                         option_formset = OptionFormSet(
@@ -273,20 +336,19 @@ def practice_test_form(request, pk=None):
                             for opt in option_formset.save(commit=False):
                                 opt.question = question
                                 opt.save()
-                                print(f"[DEBUG] Saved Option ID: {opt.id}, Text: {opt.text}")
+                                instrumentation.event("practice_test.option_saved", option_id=opt.id)
                             for opt in option_formset.deleted_objects:
-                                print(f"[DEBUG] Deleted Option ID: {opt.id}")
+                                instrumentation.event("practice_test.option_deleted", option_id=opt.id)
                                 opt.delete()
                         else:
-                            print(f"[ERROR] Invalid options for Question {q_idx + 1}")
-                            print(option_formset.errors)
+                            instrumentation.event("practice_test.invalid_options", question_number=q_idx + 1,
+                                                  errors=option_formset.errors)
 
             messages.success(request, f"Practice test {'updated' if editing else 'created'} successfully!")
             return redirect("practice_tests")
         else:
-            print("[DEBUG] Validation errors found")
-            print("Form errors:", test_form.errors)
-            print("Formset errors:", question_formset.errors)
+            instrumentation.event("practice_test.validation_failed",
+                                  form_errors=test_form.errors, formset_errors=question_formset.errors)
             for q_idx, q_form in enumerate(question_formset.forms):
                 q_form.option_formset = OptionFormSet(
                     request.POST,
@@ -303,13 +365,17 @@ def practice_test_form(request, pk=None):
 
     # Build html_questions for the template
     for question in questions:
+        question.analysis = item_analysis.analyze(question) if editing else None
         question_data = {
             "id": question.id,
             "text": question.text,
             "question_type": question.question_type,
         }
         if question.question_type in ["mcq", "tf"]:
-            question_data["options"] = list(question.options.all().values("id", "text", "is_correct"))
+            question_data["options"] = [
+                {"id": option.id, "text": option.text, "is_correct": option.is_correct}
+                for option in question.options.all()
+            ]
         html_questions.append(question_data)
 
     # Empty option form for JS dynamic adding
@@ -340,10 +406,11 @@ class QuestionGrader:
     """Handles grading logic for different question types."""
     
     @staticmethod
-    def grade_question(question: Question, user_answer: str) -> Tuple[bool, Optional[Dict]]:
+    def grade_question(question: Question, user_answer: str) -> Tuple[bool, Optional[Dict], Optional[int]]:
         """
-        Grade a question and return (is_correct, typo_warning).
-        typo_warning is dict with similarity info if applicable.
+        Grade a question and return (is_correct, typo_warning, similarity).
+        typo_warning is dict with similarity info if applicable; similarity
+        (0-100) is only computed for text answers.
         """
         qtype = (question.question_type or "").lower()
         user_answer = user_answer.strip()
@@ -355,23 +422,24 @@ class QuestionGrader:
         elif qtype == "text":
             return QuestionGrader._grade_text(question, user_answer)
         
-        return False, None
+        return False, None, None
     
     @staticmethod
-    def _grade_mcq(question: Question, user_answer: str) -> Tuple[bool, None]:
-        correct_option = question.options.filter(is_correct=True).first()
+    def _grade_mcq(question: Question, user_answer: str) -> Tuple[bool, None, None]:
+        # from the prefetched options, not one query per question
+        correct_option = next((option for option in question.options.all() if option.is_correct), None)
         is_correct = correct_option and user_answer == str(correct_option.id)
-        return is_correct, None
+        return is_correct, None, None
     
     @staticmethod
-    def _grade_tf(question: Question, user_answer: str) -> Tuple[bool, None]:
+    def _grade_tf(question: Question, user_answer: str) -> Tuple[bool, None, None]:
         is_correct = user_answer.lower() == (question.answer or "").lower()
-        return is_correct, None
+        return is_correct, None, None
     
     @staticmethod
-    def _grade_text(question: Question, user_answer: str) -> Tuple[bool, Optional[Dict]]:
+    def _grade_text(question: Question, user_answer: str) -> Tuple[bool, Optional[Dict], Optional[int]]:
         if not question.answer:
-            return False, None
+            return False, None, None
             
         matched, similarity = is_similar_answer(question.answer, user_answer)
         typo_warning = None
@@ -384,20 +452,22 @@ class QuestionGrader:
                 "similarity": similarity,
             }
         
-        return matched, typo_warning
+        return matched, typo_warning, similarity
 
 
 @login_required
 def take_practice_test(request: HttpRequest, pk: int) -> HttpResponse:
     """Take and grade a practice test."""
     test = get_owned_object_or_404(PracticeTest, pk, request.user)
-    questions = test.questions.prefetch_related("options").all()
+    questions = test.questions.select_related("source").prefetch_related("options").all()
 
     if request.method == "POST":
-        total_questions = questions.count()
+        questions = list(questions)  # counted and graded from one fetch
+        total_questions = len(questions)
         correct_answers = 0
         user_answers_list = []
         potential_typos = []
+        graded = []
 
         for question in questions:
             user_answer = request.POST.get(f"question_{question.id}")
@@ -405,9 +475,10 @@ def take_practice_test(request: HttpRequest, pk: int) -> HttpResponse:
             if not user_answer:
                 # No answer provided — mark as incorrect
                 is_correct = False
-                typo_warning = None
+                typo_warning = similarity = None
             else:
-                is_correct, typo_warning = QuestionGrader.grade_question(question, user_answer)
+                is_correct, typo_warning, similarity = QuestionGrader.grade_question(question, user_answer)
+            graded.append(responses.Answer(question, (user_answer or "").strip(), is_correct, similarity))
             
             if is_correct:
                 correct_answers += 1
@@ -423,9 +494,17 @@ def take_practice_test(request: HttpRequest, pk: int) -> HttpResponse:
             })
 
         score = round((correct_answers / total_questions) * 100) if total_questions else 0
-        points = award_points(request.user, test, score)
-        
-        PracticeTestResult.objects.create(owner=request.user, score=score, practice_test=test)
+
+        @retry_on_locked()
+        def save_result():
+            result = PracticeTestResult.objects.create(owner=request.user, score=score, practice_test=test)
+            rows = responses.record(result, graded)
+            item_analysis.add_submission(score, rows)
+            rating_changes = adaptive.rate_submission(request.user.pk, rows)
+            mastery.add_responses(request.user.pk, rows, result.taken_at, rating_changes)
+            return award_points(request.user, test, score, total_questions)
+
+        points = save_result()
 
         return render(request, "myapp/main/tests/practice_test_result.html", {
             "test": test,
@@ -447,9 +526,13 @@ def take_practice_test(request: HttpRequest, pk: int) -> HttpResponse:
 
 @login_required
 def writing_tasks(request: HttpRequest) -> HttpResponse:
-    """List all writing tasks for current user."""
-    tasks = WritingTask.objects.filter(owner=request.user).order_by("-created_at")
-    return render(request, "myapp/main/writing_tasks/writing_tasks.html", {"tasks": tasks})
+    """List writing tasks for current user, newest first."""
+    return _list_page(request, user_writing_tasks, "myapp/main/writing_tasks/writing_tasks.html", "tasks")
+
+
+@login_required
+def writing_tasks_feed(request: HttpRequest) -> JsonResponse:
+    return _list_feed(request, user_writing_tasks, "myapp/main/writing_tasks/_writing_task_cards.html", "tasks")
 
 
 from django.shortcuts import render, get_object_or_404, redirect
@@ -534,6 +617,16 @@ class EssayGrader:
     @staticmethod
     def grade_essay(task: WritingTask, content: str, user) -> Tuple[int, str]:
         """Grade essay and return (score, feedback)."""
+        metrics.ESSAY_GRADING_IN_PROGRESS.inc()
+        start = time.monotonic()
+        try:
+            return EssayGrader._grade(task, content, user)
+        finally:
+            metrics.ESSAY_GRADING_IN_PROGRESS.dec()
+            metrics.ESSAY_GRADING_SECONDS.observe(time.monotonic() - start)
+
+    @staticmethod
+    def _grade(task: WritingTask, content: str, user) -> Tuple[int, str]:
         grading_prompt = (
             f"You are grading a student essay.\n"
             f"The essay prompt was: \"{task.prompt}\".\n"
@@ -546,7 +639,7 @@ class EssayGrader:
             grading_prompt,
             system_content="You are an essay marker.",
             user=user,
-            model="gpt-4o",
+            task="essay_grading",
             response_format="json_object",
         )
 
@@ -577,14 +670,17 @@ def writing_task_loading(request: HttpRequest, pk: int) -> HttpResponse:
 
     score, feedback = EssayGrader.grade_essay(task, content, request.user)
 
-    with transaction.atomic():
+    @retry_on_locked()
+    def save_grade():
         submission.content = content
         submission.score = score
         submission.feedback = feedback
-        submission.save()
-        
+        # update_fields tells the catalog and mastery this save is the grade (see myapp/catalog.py)
+        submission.save(update_fields=["content", "score", "feedback"])
         award_points(request.user, task, score)
 
+    save_grade()
+
     return redirect("writing_task_result", pk=submission.pk)
 
 
@@ -608,9 +704,13 @@ def writing_task_result(request: HttpRequest, pk: int) -> HttpResponse:
 
 @login_required
 def flashcard_sets(request: HttpRequest) -> HttpResponse:
-    """List all flashcard sets for current user."""
-    sets = FlashcardSet.objects.filter(owner=request.user)
-    return render(request, "myapp/main/flashcards/flashcard_sets.html", {"sets": sets})
+    """List flashcard sets for current user, newest first."""
+    return _list_page(request, user_flashcard_sets, "myapp/main/flashcards/flashcard_sets.html", "sets")
+
+
+@login_required
+def flashcard_sets_feed(request: HttpRequest) -> JsonResponse:
+    return _list_feed(request, user_flashcard_sets, "myapp/main/flashcards/_flashcard_set_cards.html", "sets")
 
 
 @login_required
@@ -681,7 +781,7 @@ class FlashcardManager:
     def reset_progress(request, flashcard_set, mode: str):
         """Reset flashcard progress for a set."""
         FlashcardSetProgress.objects.filter(
-            user=request.user,
+            owner=request.user,
             flashcard_set=flashcard_set
         ).delete()
         
@@ -690,7 +790,7 @@ class FlashcardManager:
         
         if mode == "study":
             FlashcardSetProgress.objects.create(
-                user=request.user,
+                owner=request.user,
                 flashcard_set=flashcard_set,
                 current_index=0,
                 known=0,
@@ -716,6 +816,7 @@ def answer_flashcard_ajax(request: HttpRequest, set_id: int) -> JsonResponse:
         return JsonResponse({"error": "Invalid data format"}, status=400)
     
     FlashcardManager.save_session_summary(request, known, not_known, total)
+    metrics.FLASHCARD_ACTIONS.labels(action="answer").inc()
     return JsonResponse({"completed": True, "known": known, "not_known": not_known, "total": total})
 
 
@@ -742,6 +843,7 @@ def flashcard_nav_ajax(request: HttpRequest, set_id: int) -> JsonResponse:
         current_index = max(current_index - 1, 0)
     
     card = flashcards[current_index]
+    metrics.FLASHCARD_ACTIONS.labels(action=f"nav_{direction if direction in ('next', 'prev') else 'stay'}").inc()
     
     return JsonResponse({
         "current_index": current_index,
@@ -762,6 +864,7 @@ def reset_flashcards_ajax(request: HttpRequest, set_id: int) -> JsonResponse:
     
     mode = data.get("mode", "regular")
     FlashcardManager.reset_progress(request, flashcard_set, mode)
+    metrics.FLASHCARD_ACTIONS.labels(action="reset").inc()
     
     return JsonResponse({"ok": True, "mode": mode})
 
@@ -770,7 +873,7 @@ def reset_flashcards_ajax(request: HttpRequest, set_id: int) -> JsonResponse:
 def answer_flashcard(request: HttpRequest, set_id: int, action: str) -> HttpResponse:
     """Non-AJAX fallback for answering flashcards."""
     flashcard_set = get_owned_object_or_404(FlashcardSet, set_id, request.user)
-    progress = get_object_or_404(FlashcardSetProgress, user=request.user, flashcard_set=flashcard_set)
+    progress = get_object_or_404(FlashcardSetProgress, owner=request.user, flashcard_set=flashcard_set)
 
     if action == "known":
         progress.known += 1
@@ -779,6 +882,7 @@ def answer_flashcard(request: HttpRequest, set_id: int, action: str) -> HttpResp
 
     progress.current_index += 1
     flashcards = list(flashcard_set.flashcards.all())
+    metrics.FLASHCARD_ACTIONS.labels(action="answer_fallback").inc()
 
     if progress.current_index >= len(flashcards):
         FlashcardManager.save_session_summary(
@@ -803,7 +907,7 @@ def flashcard_summary(request: HttpRequest, set_id: int) -> HttpResponse:
     if not summary:
         try:
             progress = FlashcardSetProgress.objects.get(
-                user=request.user,
+                owner=request.user,
                 flashcard_set=flashcard_set
             )
             total = progress.known + progress.not_known
@@ -825,8 +929,122 @@ def flashcard_summary(request: HttpRequest, set_id: int) -> HttpResponse:
     })
 
 
+# ======================== DUPLICATION ========================
+
+def _duplicate(request, model, pk, edit_url: str) -> HttpResponse:
+    """Copy one of the user's own activities (see myapp/cloning.py) and open the copy for editing."""
+    original = get_owned_object_or_404(model, pk, request.user)
+    copy = clone_activity(original, request.user, title=copy_title(original.title), link_original=False)
+    messages.success(request, f"Created “{copy.title}”.")
+    return redirect(edit_url, copy.pk)
+
+
+@login_required
+@require_http_methods(["POST"])
+def duplicate_practice_test(request: HttpRequest, pk) -> HttpResponse:
+    return _duplicate(request, PracticeTest, pk, "edit_practice_test")
+
+
+@login_required
+@require_http_methods(["POST"])
+def duplicate_writing_task(request: HttpRequest, pk) -> HttpResponse:
+    return _duplicate(request, WritingTask, pk, "edit_writing_task")
+
+
+@login_required
+@require_http_methods(["POST"])
+def duplicate_flashcard_set(request: HttpRequest, set_id) -> HttpResponse:
+    return _duplicate(request, FlashcardSet, set_id, "edit_flashcard_set")
+
+
+# ======================== CATALOG ========================
+
+CATALOG_KINDS = [("practice_test", "Practice Tests"), ("flashcard_set", "Flashcard Sets"), ("writing_task", "Writing Tasks")]
+LIBRARY_URLS = {"practice_test": "take_practice_test", "flashcard_set": "take_flashcard_set", "writing_task": "take_writing_task"}
+
+
+def _catalog_page(request):
+    """(filters, page) for the catalog list and feed; raises InvalidCursor."""
+    kind = request.GET.get("kind", "practice_test")
+    if kind not in catalog.KINDS:
+        kind = "practice_test"
+    filters = {"kind": kind, "subject": request.GET.get("subject", ""), "difficulty": request.GET.get("difficulty", "")}
+    page = catalog.browse(kind, filters["subject"], filters["difficulty"], request.GET.get("cursor"), page_size(request))
+    return filters, page
+
+
+@login_required
+def catalog_page(request: HttpRequest) -> HttpResponse:
+    """Public content from all users, most popular first, by type/subject/difficulty."""
+    try:
+        filters, page = _catalog_page(request)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    return render(request, "myapp/main/catalog/catalog.html", {
+        **filters,
+        "entries": page.items,
+        "page": page,
+        "kinds": CATALOG_KINDS,
+        "filters": catalog.filters(filters["kind"]),
+        "filter_query": urlencode(filters),
+    })
+
+
+@login_required
+def catalog_feed(request: HttpRequest) -> JsonResponse:
+    try:
+        _, page = _catalog_page(request)
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return feed_response(request, page, "myapp/main/catalog/_catalog_cards.html", "entries")
+
+
+@login_required
+@require_http_methods(["POST"])
+def add_to_library(request: HttpRequest, pk: int) -> HttpResponse:
+    """Copy a catalog item into the user's library (no AI call) and open the copy."""
+    entry = get_object_or_404(CatalogEntry, pk=pk)
+    if entry.owner_id == request.user.pk:
+        return redirect(LIBRARY_URLS[entry.kind], entry.object_id)
+
+    copy = catalog.add_to_library(entry, request.user)
+    messages.success(request, f"“{copy.title}” was added to your library.")
+    return redirect(LIBRARY_URLS[entry.kind], copy.pk)
+
+
+# ======================== SEARCH ========================
+
+@login_required
+def search_library(request: HttpRequest) -> JsonResponse:
+    """
+    Ranked full-text search over the user's own library and the blog.
+    ?q=terms, optional ?type=question,flashcard and ?size=N (see myapp/search.py).
+    """
+    query = request.GET.get("q", "")
+    kinds = [kind for kind in request.GET.get("type", "").split(",") if kind]
+    hits = search.search(request.user, query, kinds, limit=page_size(request, default=search.DEFAULT_LIMIT))
+    return JsonResponse({"query": query, "results": [hit.as_dict() for hit in hits]})
+
+
+# ======================== RELATED MATERIAL ========================
+
+@login_required
+def related_material(request: HttpRequest, kind: str, pk) -> JsonResponse:
+    """
+    Cards for the user's own and public activities most similar to one of
+    theirs (see myapp/related.py). Fetched by the result/summary pages after
+    they render, so grading never waits on it.
+    """
+    if kind not in related.KINDS:
+        raise Http404
+    items = related.related_for(request.user, kind, pk)
+    html = render_to_string("myapp/main/_related_material.html", {"items": items}, request=request)
+    return JsonResponse({"html": html, "count": len(items)})
+
+
 # ======================== AI & MISC VIEWS ========================
 
+@anonymous_page_cache(tags=["plans"])
 def index(request: HttpRequest) -> HttpResponse:
     """Landing page."""
     if request.user.is_authenticated:
@@ -836,21 +1054,28 @@ def index(request: HttpRequest) -> HttpResponse:
                   {"subscription_features": mark_safe(get_subscription_features())}
             )
 
-@login_required
-def dashboard(request):
-    user = request.user
-
-    # Weekly progress: count activities per day for last 7 days
-    today = now().date()
+@cached_per_user("dashboard", timeout=600)
+def dashboard_data(user, today):
+    """Weekly activity and progress summary; cached per user and day, dropped on any result change."""
     last_7_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
 
-    weekly_progress = []
-    for day in last_7_days:
-        practice_count = PracticeTestResult.objects.filter(owner=user, taken_at__date=day).count()
-        writing_count = WritingTaskResult.objects.filter(owner=user, taken_at__date=day).count()
-        flashcard_count = FlashcardSetProgress.objects.filter(owner=user, last_reviewed__date=day).count()
-        total_count = practice_count + writing_count + flashcard_count
-        weekly_progress.append({'date': day.isoformat(), 'count': total_count})
+    # One grouped query per activity type instead of three counts per day
+    daily_counts = Counter()
+    for model, date_field in (
+        (PracticeTestResult, 'taken_at'),
+        (WritingTaskResult, 'taken_at'),
+        (FlashcardSetProgress, 'last_reviewed'),
+    ):
+        rows = (
+            model.objects.filter(owner=user, **{f'{date_field}__date__gte': last_7_days[0]})
+            .annotate(day=TruncDate(date_field))
+            .values('day')
+            .annotate(n=Count('pk'))
+        )
+        for row in rows:
+            daily_counts[row['day']] += row['n']
+
+    weekly_progress = [{'date': day.isoformat(), 'count': daily_counts[day]} for day in last_7_days]
 
     # ✅ Create progress summary
     total_practice = PracticeTestResult.objects.filter(owner=user).count()
@@ -859,19 +1084,19 @@ def dashboard(request):
 
     # ✅ Example: recent activity list (last 5)
     recent_activity = []
-    for result in PracticeTestResult.objects.filter(owner=user).order_by('-taken_at')[:5]:
+    for result in PracticeTestResult.objects.filter(owner=user).select_related('practice_test').order_by('-taken_at')[:5]:
         recent_activity.append({
             'type': 'Practice Test',
             'name': result.practice_test.title,
             'date': result.taken_at,
         })
-    for result in WritingTaskResult.objects.filter(owner=user).order_by('-taken_at')[:5]:
+    for result in WritingTaskResult.objects.filter(owner=user).select_related('writing_task').order_by('-taken_at')[:5]:
         recent_activity.append({
             'type': 'Writing Task',
             'name': result.writing_task.title,
             'date': result.taken_at,
         })
-    for progress in FlashcardSetProgress.objects.filter(owner=user).order_by('-last_reviewed')[:5]:
+    for progress in FlashcardSetProgress.objects.filter(owner=user).select_related('flashcard_set').order_by('-last_reviewed')[:5]:
         recent_activity.append({
             'type': 'Flashcards',
             'name': progress.flashcard_set.title,
@@ -882,18 +1107,25 @@ def dashboard(request):
     recent_activity.sort(key=lambda x: x['date'], reverse=True)
     recent_activity = recent_activity[:5]  # top 5 overall
 
-    # ✅ Bundle all in progress_data
-    progress_data = {
-        'total_practice': total_practice,
-        'total_writing': total_writing,
-        'total_flashcards': total_flashcards,
-        'recent_activity': recent_activity,
+    return {
+        'weekly_progress': weekly_progress,
+        'progress_data': {
+            'total_practice': total_practice,
+            'total_writing': total_writing,
+            'total_flashcards': total_flashcards,
+            'recent_activity': recent_activity,
+        },
     }
 
+
+@login_required
+def dashboard(request):
+    data = dashboard_data(request.user, now().date())
+
     context = {
-        'user': user,
-        'weekly_progress': weekly_progress,
-        'progress_data': progress_data,  # ✅ Now your HTML will see this
+        'user': request.user,
+        'weekly_progress': data['weekly_progress'],
+        'progress_data': data['progress_data'],  # ✅ Now your HTML will see this
     }
 
     return render(request, "myapp/main/dashboard.html", context)
@@ -919,7 +1151,7 @@ def ai_chat(request: HttpRequest) -> JsonResponse:
             logger.info(f"ai_chat: submission id {submission_id} not found")
 
     prompt = f"Student asked: {message}\nEssay prompt: {essay_text}" if essay_text else f"Student asked: {message}"
-    response = ai_chat_response(prompt, system="You are an AI tutor.", user=getattr(request, "user", None))
+    response = ai_chat_response(prompt, system_content="You are an AI tutor.", user=getattr(request, "user", None), task="tutor")
 
     if isinstance(response, dict):
         reply = response.get("reply") or response.get("content") or json.dumps(response)
@@ -938,7 +1170,16 @@ def create_ai_activity(request: HttpRequest, activity_type: str) -> JsonResponse
         return render(request, "myapp/main/flashcards.html", {"sets": sets})
 
     # POST
-    prompt = request.POST.get("prompt")
+    prompt = request.POST.get("prompt") or ""
+    if request.POST.get("mode") == "weakest":
+        # compact per-subject estimates instead of the raw result history
+        topics = mastery.weakest(request.user.pk)
+        if not topics:
+            return JsonResponse({
+                "success": False,
+                "error": "Complete a few practice tests or writing tasks first so we can find your weakest topics.",
+            })
+        prompt = mastery.focus_prompt(topics, prompt)
     try:
         amount = int(request.POST.get("amount", 5))
         duration = int(request.POST.get("duration", 30))
@@ -957,9 +1198,10 @@ def create_ai_activity(request: HttpRequest, activity_type: str) -> JsonResponse
             difficulty=difficulty,
             activity_type=activity_type,
             extra_file_data=file_data,
+            plan=plan_tier(request.user),
         )
 
-        save_activity_from_json(activity_json, request.user, activity_type, duration)
+        activity = save_activity_from_json(activity_json, request.user, activity_type, duration)
         deduct_credits(usage, request.user)
 
         redirect_map = {
@@ -968,7 +1210,8 @@ def create_ai_activity(request: HttpRequest, activity_type: str) -> JsonResponse
         }
         return JsonResponse({
             "success": True,
-            "redirect_url": redirect_map.get(activity_type, "/")
+            "redirect_url": redirect_map.get(activity_type, "/"),
+            "skipped_duplicates": activity.skipped_duplicates,
         })
 
     except json.JSONDecodeError as e:
@@ -976,4 +1219,65 @@ def create_ai_activity(request: HttpRequest, activity_type: str) -> JsonResponse
         return JsonResponse({"success": False, "error": f"AI returned invalid JSON: {e}"})
     except Exception as e:
         logger.exception(f"Failed to create AI activity: {e}")
-        return JsonResponse({"success": False, "error": str(e)})
\ No newline at end of file
+        return JsonResponse({"success": False, "error": str(e)})
+
+
+@login_required
+@require_http_methods(["POST"])
+def adaptive_practice_test(request: HttpRequest) -> JsonResponse:
+    """Assemble a practice test at the user's level from the question bank (no AI call)."""
+    subject = request.POST.get("subject", "").strip()
+    try:
+        amount = int(request.POST.get("amount", 10))
+    except (ValueError, TypeError):
+        amount = 10
+    if not subject:
+        return JsonResponse({"success": False, "error": "Choose a subject."})
+
+    test = adaptive.assemble(request.user, subject, amount)
+    if test is None:
+        return JsonResponse({"success": False, "error": "There are no questions in this subject to pick from yet."})
+    return JsonResponse({
+        "success": True,
+        "redirect_url": reverse("take_practice_test", args=[test.pk]),
+    })
+
+
+@staff_member_required
+def ai_router_metrics(request: HttpRequest) -> JsonResponse:
+    """Staff-only view of per-model latency/error stats and routing decisions."""
+    return JsonResponse(router.snapshot())
+
+
+@staff_member_required
+def performance_overview(request: HttpRequest) -> HttpResponse:
+    """Staff-only page listing the slowest endpoints seen by this worker."""
+    if request.method == "POST" and "reset" in request.POST:
+        endpoint_stats.reset()
+        return redirect("performance_overview")
+
+    return render(request, "myapp/staff/performance.html", {
+        "endpoints": endpoint_stats.slowest(limit=50),
+        "slow_threshold_ms": getattr(settings, "PERF_SLOW_REQUEST_MS", 500),
+    })
+
+
+def _bearer_token_matches(request: HttpRequest, token: str) -> bool:
+    """Constant-time check of `Authorization: Bearer <token>`. An unset token matches nothing."""
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode())
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """Prometheus scrape endpoint. Staff sessions or `Authorization: Bearer <METRICS_TOKEN>`."""
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if not authorized:
+        authorized = _bearer_token_matches(request, getattr(settings, "METRICS_TOKEN", ""))
+    if not authorized:
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+
+    return HttpResponse(
+        metrics.registry.generate_latest(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
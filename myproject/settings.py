@@ -65,6 +65,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'myapp.instrumentation.PerformanceMiddleware',  # Server-Timing + per-request perf logs
+    'myapp.nplusone.NPlusOneMiddleware',  # lazy related-load (N+1) detection, see NPLUSONE_*
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,6 +89,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.entitlements',
             ],
         },
     },
@@ -173,6 +176,9 @@ CSRF_TRUSTED_ORIGINS = [
 from decouple import config
 
 OPENAI_API_KEY = config('OPENAI_API_KEY')
+# Point at a local stand-in (python manage.py fake_openai) for offline load tests
+OPENAI_BASE_URL = config('OPENAI_BASE_URL', default='') or None
+OPENAI_TIMEOUT = config('OPENAI_TIMEOUT', default=60, cast=float)
 
 from pathlib import Path
 
@@ -208,6 +214,14 @@ STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_KEY = os.getenv("STRIPE_WEBHOOK_KEY")
 STRIPE_TEST_PORTAL_LINK = os.getenv("STRIPE_TEST_PORTAL_LINK")
 
+# Retry policy for `manage.py process_stripe_events` (see accounts/webhooks.py)
+STRIPE_WEBHOOK_QUEUE = {
+    'max_attempts': 8,
+    'backoff_base': 30,   # seconds before the first retry, doubled for each later one
+    'backoff_cap': 3600,
+    'lease': 300,         # seconds a claimed event stays with one worker
+}
+
 COMPRESS_ROOT = BASE_DIR / 'static'
 
 COMPRESS_ENABLED = True
@@ -229,5 +243,169 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Database
 DATABASES = {
-    'default': dj_database_url.config(default='sqlite:///db.sqlite3')
+    'default': dj_database_url.config(
+        default='sqlite:///db.sqlite3',
+        conn_max_age=config('DB_CONN_MAX_AGE', default=600, cast=int),
+        conn_health_checks=True,
+    )
+}
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Take the write lock at BEGIN so transactions queue on busy_timeout instead
+    # of failing on a lock upgrade (see myapp/sqlite.py)
+    DATABASES['default'].setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+
+# Pragmas applied to every SQLite connection (see myapp/sqlite.py)
+SQLITE_TUNING = {
+    'enabled': config('SQLITE_TUNING_ENABLED', default=True, cast=bool),
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,       # ms
+    'cache_size': -64000,       # 64 MB
+    'mmap_size': 268435456,     # 256 MB
+    'temp_store': 'MEMORY',
+    'retry_attempts': 5,
+    'retry_base_delay': 0.05,
+}
+
+# AI model routing (see myapp/ai_router.py)
+# Each task lists model tiers in preference order; the router fails over to the
+# next tier when a model's circuit opens or its p95 exceeds the latency budget.
+# Optional per task: "plans" (tiers per plan) and "small_models" for prompts of
+# at most "small_prompt_chars" characters.
+AI_MODEL_ROUTES = {
+    "activity": {"models": ["gpt-4o-mini", "gpt-3.5-turbo"], "latency_budget_ms": 20000},
+    "insights": {"models": ["gpt-4o-mini", "gpt-3.5-turbo"], "latency_budget_ms": 8000},
+    "essay_grading": {
+        "models": ["gpt-4o", "gpt-4o-mini"],
+        "plans": {"free": ["gpt-4o-mini", "gpt-4o"]},
+        "latency_budget_ms": 15000,
+    },
+    "chatbot": {
+        "models": ["gpt-4o", "gpt-4o-mini"],
+        "plans": {"free": ["gpt-4o-mini", "gpt-4o"]},
+        "small_prompt_chars": 400,
+        "small_models": ["gpt-4o-mini", "gpt-4o"],
+        "latency_budget_ms": 8000,
+    },
+    "tutor": {"models": ["gpt-4o-mini", "gpt-3.5-turbo"], "latency_budget_ms": 6000},
+}
+
+AI_ROUTER = {
+    "window": 50,
+    "failure_threshold": 3,
+    "max_error_rate": 0.5,
+    "min_samples": 10,
+    "cooldown_seconds": 30,
+}
+
+# Per-request performance instrumentation (see myapp/instrumentation.py)
+PERF_INSTRUMENTATION_ENABLED = True
+PERF_SLOW_REQUEST_MS = config('PERF_SLOW_REQUEST_MS', default=500, cast=int)
+
+# Prometheus metrics (see myapp/metrics.py). Set METRICS_DIR to a shared, writable
+# directory when running several worker processes so a scrape sees all of them;
+# clear it on deploy. Scrapers authenticate with `Authorization: Bearer <METRICS_TOKEN>`.
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# N+1 query detection (see myapp/nplusone.py). Warns in development; the test
+# runner (myapp/testing.py) switches NPLUSONE_RAISE on so any N+1 fails the test that hits it.
+NPLUSONE_ENABLED = DEBUG
+NPLUSONE_RAISE = False
+NPLUSONE_IGNORE = []  # ("app_label.Model", "attribute") pairs that are known to be fine
+TEST_RUNNER = 'myapp.testing.TestRunner'
+
+# Shared cache tier. File-based so every worker on the host shares it without an
+# external service; point CACHE_DIR at fast local disk.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / '.cache')),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+}
+
+# Tiered per-user/per-object cache on top of CACHES (see myapp/cache.py)
+APP_CACHE = {
+    'enabled': config('APP_CACHE_ENABLED', default=True, cast=bool),
+    'shared_alias': 'default',
+    'local_max_entries': 1024,
+    'local_timeout': 30,
+    'version_ttl': 2,
+}
+
+# Anonymous full-page cache for landing/support/legal/blog pages (see myapp/pagecache.py)
+PAGE_CACHE = {
+    'enabled': config('PAGE_CACHE_ENABLED', default=True, cast=bool),
+    'timeout': 300,   # seconds a page is served as fresh
+    'stale': 3600,    # further seconds it is served stale while one worker re-renders it
+}
+
+# Per-question answers stored with each practice test result (see myapp/responses.py)
+QUESTION_RESPONSES = {
+    'enabled': True,
+    'retention_days': config('RESPONSE_RETENTION_DAYS', default=365, cast=int),  # manage.py prune_responses
+    'batch_size': 5000,
+    'max_text': 500,    # characters of a free-text answer kept
+}
+
+# Per-subject skill estimates behind "practice my weakest topics" (see myapp/mastery.py)
+MASTERY = {
+    'alpha': 0.1,            # weight of each new answer in the skill average
+    'half_life_days': 30,    # an unpractised subject drifts halfway back to "unknown" in this time
+    'writing_weight': 5,     # a graded essay counts as this many answers
+    'min_answers': 3,        # subjects with fewer answers are not ranked
+    'topics': 3,             # weakest subjects put in a generation prompt
+}
+
+# Adaptive practice tests assembled from the question bank (see myapp/adaptive.py)
+ADAPTIVE = {
+    'k_user': 16,            # Elo step per answer for the user's subject rating
+    'k_question': 8,         # ... and for the question's rating
+    'target': 0.7,           # chance of answering an assembled question correctly
+    'recent_days': 7,        # questions answered correctly this recently are left out
+    'max_questions': 50,
+    'minutes_per_question': 2,
+}
+
+# Scheduled AI insights for active users (see progress/precompute.py; manage.py precompute_insights)
+INSIGHT_PRECOMPUTE = {
+    'checkpoint': config('INSIGHT_CHECKPOINT', default=str(BASE_DIR / '.insights_checkpoint.json')),
+    'active_days': 7,     # users with a result this recent (and newer than their insight) are due
+    'concurrency': 8,     # model calls in flight in live mode
+    'max_tokens': 800,
+}
+
+# TF-IDF index behind "related material" (see myapp/related.py); built by manage.py build_related_index
+RELATED_INDEX = {
+    'path': config('RELATED_INDEX_DIR', default=str(BASE_DIR / '.related_index')),
+    'max_segments': 8,   # appends before the next build starts over
+}
+
+# Near-duplicate questions/cards skipped when saving AI generations (see myapp/dedup.py)
+NEAR_DUPLICATES = {
+    'enabled': config('NEAR_DUPLICATES_ENABLED', default=True, cast=bool),
+    'threshold': 0.8,      # word-pair Jaccard similarity from which two texts are duplicates
+    'scope': 'activity',   # 'activity': only within the new test/set, 'owner': whole library
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "myapp.performance": {
+            "handlers": ["console"],
+            "level": config('PERF_LOG_LEVEL', default='WARNING'),
+            "propagate": False,
+        },
+        "myapp.nplusone": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
 }
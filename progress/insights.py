@@ -0,0 +1,144 @@
+"""
+AI insights on the progress page, stored per user with a fingerprint of the
+results they were generated from.
+
+    data = insights.get(user)   # {"ai_insight", "generated_at", "age_seconds", "stale", "refreshing"}
+
+The input is the user's RECENT latest practice test and writing task
+results. The fingerprint is a SHA-256 over their ids, scores, dates and
+essay lengths, so any new, regraded or deleted result changes it.
+- same fingerprint as the stored insight: the stored text, no model call
+- different fingerprint: the stored (stale) text straight away, while one
+  background thread per user generates a new one (as pagecache.py does for
+  pages); the next request gets it
+- nothing stored yet: generated in the request
+
+Only successful generations are stored, so a failed call is retried on the
+next request rather than cached. `manage.py precompute_insights` stores
+insights ahead of time for users with new results (see progress/precompute.py).
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from typing import Optional
+
+from django.db import connections
+from django.utils import timezone
+
+from myapp.models import PracticeTestResult, WritingTaskResult
+from myapp.utils import ai_chat_response
+
+from .models import AIInsight
+
+logger = logging.getLogger(__name__)
+
+RECENT = 20
+SYSTEM_PROMPT = "You are a helpful assistant that provides insights based on user performance data."
+
+_refreshing = set()
+_refresh_lock = threading.Lock()
+
+
+def recent_data(user):
+    practice = PracticeTestResult.objects.filter(owner=user).order_by("-taken_at")[:RECENT]
+    writing = WritingTaskResult.objects.filter(owner=user).order_by("-taken_at")[:RECENT]
+    return {
+        "practice": [
+            {"id": str(r.pk), "score": r.score, "date": r.taken_at.strftime("%Y-%m-%d")}
+            for r in practice
+        ],
+        "writing": [
+            {"id": str(r.pk), "score": r.score, "length": len(r.content or ""), "date": r.taken_at.strftime("%Y-%m-%d")}
+            for r in writing
+        ],
+    }
+
+
+def fingerprint(data) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def build_prompt(data) -> str:
+    """The model prompt: one compact line per result list (ids only serve the fingerprint)."""
+    practice = ", ".join(f"{row['date']} {row['score']:g}%" for row in data["practice"]) or "none"
+    writing = ", ".join(
+        f"{row['date']} {row['score']:g}% ({row['length']} chars)" for row in data["writing"]
+    ) or "none"
+    return (
+        "Analyze these practice test and writing task results (newest first). Provide insights on "
+        "strengths, weaknesses, and suggestions for improvement. Focus on recent activities.\n\n"
+        f"Practice tests: {practice}\n"
+        f"Writing tasks: {writing}\n\n"
+        "Provide a concise summary with actionable advice."
+    )
+
+
+def store(owner_id, key: str, content: str, older_than=None) -> Optional[AIInsight]:
+    """
+    Store the user's insight. With `older_than` (a batch run's start) an insight
+    generated since then is newer than this one and is kept: returns None.
+    """
+    fields = {"fingerprint": key, "content": content, "generated_at": timezone.now()}
+    if older_than is None:
+        return AIInsight.objects.update_or_create(owner_id=owner_id, defaults=fields)[0]
+    if AIInsight.objects.filter(owner_id=owner_id, generated_at__lt=older_than).update(**fields):
+        return AIInsight(owner_id=owner_id, **fields)
+    insight, created = AIInsight.objects.get_or_create(owner_id=owner_id, defaults=fields)
+    return insight if created else None
+
+
+def generate(user, data, key: str):
+    """Call the model and store the insight. Returns the stored row, or the error text if the call failed."""
+    response = ai_chat_response(build_prompt(data), SYSTEM_PROMPT, user, task="insights", response_format="text")
+    if not isinstance(response, str):  # ai_chat_response returns ("Error: ...", {}) on failure
+        return str(response[0] if isinstance(response, tuple) else response)
+    return store(user.pk, key, response)
+
+
+def _refresh_in_background(user, data, key: str):
+    """Start regenerating the user's insight unless a refresh is already running."""
+    with _refresh_lock:
+        if user.pk in _refreshing:
+            return
+        _refreshing.add(user.pk)
+
+    def run():
+        try:
+            generate(user, data, key)
+        except Exception:
+            logger.exception(f"Background AI insight refresh for user {user.pk} failed")
+        finally:
+            connections.close_all()
+            with _refresh_lock:
+                _refreshing.discard(user.pk)
+
+    threading.Thread(target=run, daemon=True, name=f"insight-refresh {user.pk}").start()
+
+
+def _payload(insight, stale: bool, refreshing: bool):
+    return {
+        "ai_insight": insight.content,
+        "generated_at": insight.generated_at.isoformat(),
+        "age_seconds": int((timezone.now() - insight.generated_at).total_seconds()),
+        "stale": stale,
+        "refreshing": refreshing,
+    }
+
+
+def get(user):
+    """The user's insight for their current results (see module docstring)."""
+    data = recent_data(user)
+    key = fingerprint(data)
+    stored = AIInsight.objects.filter(owner=user).first()
+    if stored is not None and stored.fingerprint == key:
+        return _payload(stored, stale=False, refreshing=False)
+    if stored is not None:
+        _refresh_in_background(user, data, key)
+        return _payload(stored, stale=True, refreshing=True)
+
+    insight = generate(user, data, key)
+    if isinstance(insight, str):
+        return {"ai_insight": insight, "generated_at": None, "age_seconds": None, "stale": False, "refreshing": False}
+    return _payload(insight, stale=False, refreshing=False)
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0012_customuser_username_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIInsight',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ai_insight', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('content', models.TextField()),
+                ('generated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
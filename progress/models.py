@@ -1,2 +1,14 @@
 from django.db import models
 
+from accounts.models import CustomUser
+
+
+class AIInsight(models.Model):
+    """
+    The last AI insight generated for a user, with a fingerprint of the
+    results it was generated from (see progress/insights.py).
+    """
+    owner = models.OneToOneField(CustomUser, primary_key=True, related_name="ai_insight", on_delete=models.CASCADE)
+    fingerprint = models.CharField(max_length=64)
+    content = models.TextField()
+    generated_at = models.DateTimeField()
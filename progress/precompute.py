@@ -0,0 +1,264 @@
+"""
+Offline pre-computation of AI insights for active users (manage.py precompute_insights).
+
+    run = Checkpoint.load(path) or Checkpoint.start(path, "live", due_users(days=7))
+    run_live(run, client, concurrency=8)   # bounded worker pool, each insight stored as it arrives
+    submit_batch(run, client)              # or: one OpenAI Batch API job at the lower batch price...
+    collect_batch(run, client)             # ...picked up by a later run once it has completed
+
+A user is due when they have a result in the last `days` days that is newer
+than their stored insight. Prompts and fingerprints are the compact ones from
+progress/insights.py, and results are stored as AIInsight rows. The progress
+page renders them directly, and the on-demand endpoint treats them as fresh
+while the user's results stay the same.
+
+The checkpoint is a JSON file listing the run's users, the fingerprint each
+was prompted with, which are done, and the batch id once one is submitted.
+It is rewritten after every stored insight, so an interrupted run resumes
+where it stopped and a submitted batch is collected by running the command
+again. Users that fail stay pending for the next run. The file is deleted
+once every user is done. A result never replaces an insight generated
+after the run started (on demand, say): that one is newer.
+
+Pre-computed insights are not charged to users' credits, since nobody asked
+for them. `manage.py fake_openai` serves the files and batches endpoints as
+well as chat completions, so both modes also run offline.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.utils import timezone
+
+from myapp.ai_router import router
+from myapp.models import PracticeTestResult, WritingTaskResult
+from myapp.utils import plan_tier
+
+from . import insights
+from .models import AIInsight
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "checkpoint": ".insights_checkpoint.json",
+    "active_days": 7,
+    "concurrency": 8,
+    "max_tokens": 800,
+}
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+PENDING_BATCH = ("validating", "in_progress", "finalizing")
+
+
+def _conf():
+    return {**DEFAULTS, **getattr(settings, "INSIGHT_PRECOMPUTE", {})}
+
+
+def checkpoint_path() -> str:
+    return _conf()["checkpoint"]
+
+
+def due_users(days: Optional[int] = None) -> List[int]:
+    """Ids of users with a result in the last `days` days that is newer than their stored insight."""
+    since = timezone.now() - timedelta(days=days if days is not None else _conf()["active_days"])
+    latest = {}
+    for model in (PracticeTestResult, WritingTaskResult):
+        rows = (model.objects.filter(taken_at__gte=since).exclude(owner=None)
+                .values("owner").annotate(last=Max("taken_at")).values_list("owner", "last").order_by())
+        for owner_id, last in rows:
+            latest[owner_id] = max(last, latest.get(owner_id, last))
+    generated = dict(AIInsight.objects.filter(owner__in=list(latest)).values_list("owner", "generated_at"))
+    return sorted(owner_id for owner_id, last in latest.items()
+                  if owner_id not in generated or last > generated[owner_id])
+
+
+# ============================== CHECKPOINT ==============================
+
+@dataclass
+class Checkpoint:
+    path: str
+    mode: str                                            # "live" or "batch"
+    started: str
+    users: Dict[str, str] = field(default_factory=dict)  # user id -> fingerprint prompted with ("" until then)
+    done: List[str] = field(default_factory=list)
+    batch_id: Optional[str] = None
+
+    @classmethod
+    def start(cls, path: str, mode: str, user_ids) -> "Checkpoint":
+        run = cls(path=path, mode=mode, started=timezone.now().isoformat(),
+                  users={str(user_id): "" for user_id in user_ids})
+        run.save()
+        return run
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Checkpoint"]:
+        try:
+            with open(path) as f:
+                return cls(path=path, **{k: v for k, v in json.load(f).items() if k != "path"})
+        except FileNotFoundError:
+            return None
+
+    @property
+    def started_at(self) -> datetime:
+        return datetime.fromisoformat(self.started)
+
+    @property
+    def pending(self) -> List[str]:
+        done = set(self.done)
+        return [user_id for user_id in self.users if user_id not in done]
+
+    def save(self):
+        # written whole and renamed into place, so a crash never leaves half a file
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({k: v for k, v in asdict(self).items() if k != "path"}, f)
+        os.replace(tmp, self.path)
+
+    def mark_done(self, user_id: str):
+        self.done.append(user_id)
+        self.save()
+
+    def finish(self) -> bool:
+        """Delete the file if every user is done. Returns whether the run is complete."""
+        if self.pending:
+            return False
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        return True
+
+
+# ============================== JOBS ==============================
+
+@dataclass
+class Job:
+    user_id: str
+    plan: str
+    fingerprint: str
+    prompt: str
+
+
+def build_jobs(run: Checkpoint) -> List[Job]:
+    """Prompts for the run's pending users. Users whose stored insight is already current are marked done."""
+    pending = run.pending
+    users = get_user_model().objects.filter(pk__in=pending).select_related("ai_insight")
+    jobs = []
+    for user in users:
+        data = insights.recent_data(user)
+        key = insights.fingerprint(data)
+        stored = getattr(user, "ai_insight", None)
+        if stored is not None and stored.fingerprint == key:
+            run.done.append(str(user.pk))
+            continue
+        run.users[str(user.pk)] = key
+        jobs.append(Job(str(user.pk), plan_tier(user), key, insights.build_prompt(data)))
+    found = {str(user.pk) for user in users}
+    run.done.extend(user_id for user_id in pending if user_id not in found)  # deleted since the run started
+    run.save()
+    return jobs
+
+
+def _messages(prompt: str):
+    return [{"role": "system", "content": insights.SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+# ============================== LIVE ==============================
+
+def _call(client, job: Job) -> str:
+    response = router.run(
+        "insights",
+        lambda model: client.chat.completions.create(
+            model=model, messages=_messages(job.prompt), max_tokens=_conf()["max_tokens"], temperature=0.7,
+        ),
+        prompt_chars=len(job.prompt),
+        plan=job.plan,
+    )
+    return response.choices[0].message.content
+
+
+def run_live(run: Checkpoint, client, concurrency: Optional[int] = None) -> Dict[str, int]:
+    """
+    Generate insights with at most `concurrency` model calls in flight. Results
+    are stored, and the checkpoint updated, on this thread as they arrive.
+    """
+    jobs = build_jobs(run)
+    stored = failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency or _conf()["concurrency"]) as pool:
+        futures = {pool.submit(_call, client, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                content = future.result()
+            except Exception:
+                logger.exception(f"Insight for user {job.user_id} failed")
+                failed += 1
+                continue
+            stored += insights.store(job.user_id, job.fingerprint, content, run.started_at) is not None
+            run.mark_done(job.user_id)
+    return {"stored": stored, "failed": failed, "complete": run.finish()}
+
+
+# ============================== BATCH ==============================
+
+def submit_batch(run: Checkpoint, client) -> Optional[str]:
+    """Upload the pending users' requests as one batch. Returns its id (None if nobody needs one)."""
+    jobs = build_jobs(run)
+    if not jobs:
+        run.finish()
+        return None
+    max_tokens = _conf()["max_tokens"]
+    lines = [
+        json.dumps({
+            "custom_id": f"user-{job.user_id}",
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                # no failover inside a batch: the route's first healthy tier
+                "model": router.candidates("insights", len(job.prompt), job.plan)[0][0],
+                "messages": _messages(job.prompt),
+                "max_tokens": max_tokens,
+            },
+        })
+        for job in jobs
+    ]
+    upload = client.files.create(file=("insights.jsonl", "\n".join(lines).encode()), purpose="batch")
+    batch = client.batches.create(input_file_id=upload.id, endpoint=BATCH_ENDPOINT, completion_window="24h",
+                                  metadata={"job": "precompute_insights"})
+    run.batch_id = batch.id
+    run.save()
+    return batch.id
+
+
+def _batch_lines(client, file_id: Optional[str]):
+    if not file_id:
+        return []
+    return [json.loads(line) for line in client.files.content(file_id).text.splitlines() if line.strip()]
+
+
+def collect_batch(run: Checkpoint, client) -> Dict[str, object]:
+    """Store the results of the run's batch if it has finished. Unanswered users stay pending."""
+    batch = client.batches.retrieve(run.batch_id)
+    if batch.status in PENDING_BATCH:
+        return {"status": batch.status, "stored": 0, "failed": 0, "complete": False}
+
+    stored = failed = 0
+    for line in _batch_lines(client, batch.output_file_id) + _batch_lines(client, batch.error_file_id):
+        user_id = (line.get("custom_id") or "").removeprefix("user-")
+        response = line.get("response") or {}
+        if user_id not in run.users or response.get("status_code") != 200:
+            failed += 1
+            continue
+        content = response["body"]["choices"][0]["message"]["content"]
+        stored += insights.store(user_id, run.users[user_id], content, run.started_at) is not None
+        run.mark_done(user_id)
+
+    run.batch_id = None  # whatever is still pending goes into the next run's batch
+    run.save()
+    return {"status": batch.status, "stored": stored, "failed": failed, "complete": run.finish()}
@@ -1,3 +1,92 @@
+import os
+import tempfile
+import threading
+from datetime import timedelta
+
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from openai import OpenAI
+
+from accounts.models import CustomUser
+from myapp.management.commands.fake_openai import make_server
+from myapp.models import PracticeTest, PracticeTestResult
+
+from .insights import fingerprint, recent_data, store
+from .models import AIInsight
+from .precompute import Checkpoint, collect_batch, due_users, run_live, submit_batch
+
+
+class AIInsightCacheTests(TestCase):
+
+    def test_unchanged_results_reuse_the_stored_insight(self):
+        user = CustomUser.objects.create_user(email="insights@example.com", password="pw")
+        self.client.force_login(user)
+        test = PracticeTest.objects.create(title="Algebra", owner=user)
+        PracticeTestResult.objects.create(owner=user, practice_test=test, score=60)
+        key = fingerprint(recent_data(user))
+        AIInsight.objects.create(owner=user, fingerprint=key, content="Keep practising algebra.",
+                                 generated_at=timezone.now() - timedelta(minutes=5))
+
+        with self.assertNumQueries(5):  # session, user, two result lists, the stored insight
+            data = self.client.post(reverse("progress:get_ai_insights"), HTTP_X_REQUESTED_WITH="XMLHttpRequest").json()
+        self.assertEqual(data["ai_insight"], "Keep practising algebra.")
+        self.assertFalse(data["stale"])
+        self.assertGreaterEqual(data["age_seconds"], 300)
+
+        PracticeTestResult.objects.create(owner=user, practice_test=test, score=90)
+        self.assertNotEqual(fingerprint(recent_data(user)), key)
+
+
+class PrecomputeInsightsTests(TestCase):
+
+    def setUp(self):
+        self.server = make_server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client_ai = OpenAI(api_key="x", base_url=f"http://127.0.0.1:{self.server.server_address[1]}/v1",
+                                max_retries=0)
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+
+        self.active, current, idle = (
+            CustomUser.objects.create_user(email=f"{name}@example.com", password="pw")
+            for name in ("active", "current", "idle")
+        )
+        for user in (self.active, current, idle):
+            test = PracticeTest.objects.create(title="Algebra", owner=user)
+            PracticeTestResult.objects.create(owner=user, practice_test=test, score=70)
+        AIInsight.objects.create(owner=current, fingerprint=fingerprint(recent_data(current)), content="Up to date.",
+                                 generated_at=timezone.now())
+        PracticeTestResult.objects.filter(owner=idle).update(taken_at=timezone.now() - timedelta(days=30))
+
+    def test_live_and_batch_runs_store_insights_for_due_users(self):
+        self.assertEqual(due_users(), [self.active.pk])
+
+        report = run_live(Checkpoint.start(self.checkpoint, "live", due_users()), self.client_ai, concurrency=2)
+        self.assertEqual((report["stored"], report["failed"], report["complete"]), (1, 0, True))
+        self.assertFalse(os.path.exists(self.checkpoint))
+        insight = AIInsight.objects.get(owner=self.active)
+        self.assertEqual(insight.fingerprint, fingerprint(recent_data(self.active)))
+        self.assertEqual(due_users(), [])
+        self.client.force_login(self.active)
+        self.assertContains(self.client.get(reverse("progress:progress_page")), insight.content[:40])
+
+        test = PracticeTest.objects.get(owner=self.active)
+        PracticeTestResult.objects.create(owner=self.active, practice_test=test, score=95)
+        batch_id = submit_batch(Checkpoint.start(self.checkpoint, "batch", due_users()), self.client_ai)
+        self.assertEqual(Checkpoint.load(self.checkpoint).batch_id, batch_id)
+
+        report = collect_batch(Checkpoint.load(self.checkpoint), self.client_ai)  # the next cron run
+        self.assertEqual((report["status"], report["stored"], report["complete"]), ("completed", 1, True))
+        self.assertEqual(AIInsight.objects.get(owner=self.active).fingerprint, fingerprint(recent_data(self.active)))
+
+    def test_late_batch_keeps_a_newer_insight(self):
+        batch_id = submit_batch(Checkpoint.start(self.checkpoint, "batch", due_users()), self.client_ai)
+        self.assertTrue(batch_id)
+        newer = store(self.active.pk, fingerprint(recent_data(self.active)), "Generated on demand.")
 
-# Create your tests here.
+        report = collect_batch(Checkpoint.load(self.checkpoint), self.client_ai)
+        self.assertEqual((report["stored"], report["complete"]), (0, True))
+        self.assertEqual(AIInsight.objects.get(owner=self.active).content, newer.content)
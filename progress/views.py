@@ -5,7 +5,10 @@ from myapp.models import PracticeTestResult, WritingTaskResult, FlashcardSetProg
 import json
 from django.http import JsonResponse
 from django.core.serializers.json import DjangoJSONEncoder
-from myapp.utils import ai_chat_response
+from myapp.cache import cached_per_user
+
+from . import insights
+from .models import AIInsight
 
 
 def get_user_results(user):
@@ -21,7 +24,17 @@ def get_user_results(user):
 
 def progress_page(request):
     """Main progress page with all data consolidated"""
-    results = get_user_results(request.user)
+    return render(request, 'progress/progress_page.html', {
+        **progress_context(request.user),
+        # stored by the insights endpoint or manage.py precompute_insights; not part of the cached context
+        'ai_insight': AIInsight.objects.filter(owner=request.user).first(),
+    })
+
+
+@cached_per_user("progress_page", timeout=600)
+def progress_context(user):
+    """Every summary on the progress page; cached per user, dropped on any result change."""
+    results = get_user_results(user)
     
     practice_results = results["practice_results"]
     writing_results = results["writing_results"]
@@ -77,8 +90,11 @@ def progress_page(request):
         in_progress = total_sets - completed
 
         sets_progress = []
-        for fp in flashcard_progress:
-            total_cards = fp.flashcard_set.flashcards.count()
+        rows = flashcard_progress.select_related('flashcard_set').annotate(
+            total_cards=Count('flashcard_set__flashcards')
+        )
+        for fp in rows:
+            total_cards = fp.total_cards
             known_percent = (fp.known / total_cards * 100) if total_cards else 0
             sets_progress.append({
                 'title': fp.flashcard_set.title,
@@ -94,8 +110,8 @@ def progress_page(request):
         }
 
     # Recent activity data
-    recent_practice = practice_results.order_by('-taken_at')[:10]
-    recent_writing = writing_results.order_by('-taken_at')[:10]
+    recent_practice = list(practice_results.order_by('-taken_at')[:10])
+    recent_writing = list(writing_results.order_by('-taken_at')[:10])
 
     # Performance over time data
     practice_data = [
@@ -116,9 +132,8 @@ def progress_page(request):
     ]
 
     # Quick insights for AI section
-    avg_practice_score = (
-        practice_results.aggregate(avg_score=Avg('score'))['avg_score'] or 0
-    )
+    practice = practice_summary()
+    avg_practice_score = practice['average']
 
     if writing_results.exists():
         lengths = [len(r.content) for r in writing_results]
@@ -126,8 +141,8 @@ def progress_page(request):
     else:
         avg_writing_length = 0
 
-    recent_practice_item = practice_results.order_by('-taken_at').first()
-    recent_writing_item = writing_results.order_by('-taken_at').first()
+    recent_practice_item = recent_practice[0] if recent_practice else None
+    recent_writing_item = recent_writing[0] if recent_writing else None
 
     recent_activity_date = None
     if recent_practice_item and recent_writing_item:
@@ -144,63 +159,24 @@ def progress_page(request):
     }
 
     # ------------------------ Gather all data ------------------------
-    context = {
-        'practice_summary': practice_summary(),
+    flashcards = flashcard_summary()
+    return {
+        'practice_summary': practice,
         'writing_summary': writing_summary(),
-        'flashcard_summary': flashcard_summary(),
+        'flashcard_summary': flashcards,
         'recent_practice': recent_practice,
         'recent_writing': recent_writing,
         'practice_data_json': json.dumps(practice_data, cls=DjangoJSONEncoder),
         'writing_data_json': json.dumps(writing_data, cls=DjangoJSONEncoder),
         'quick_insights': quick_insights,
-        'practice_distribution_json': json.dumps(practice_summary()['distribution']),
-        'flashcard_sets_json': json.dumps([s['title'] for s in flashcard_summary()['sets_progress']]),
-        'flashcard_known_json': json.dumps([s['known_percent'] for s in flashcard_summary()['sets_progress']]),
+        'practice_distribution_json': json.dumps(practice['distribution']),
+        'flashcard_sets_json': json.dumps([s['title'] for s in flashcards['sets_progress']]),
+        'flashcard_known_json': json.dumps([s['known_percent'] for s in flashcards['sets_progress']]),
     }
 
-    return render(request, 'progress/progress_page.html', context)
-
 def get_ai_insights(request):
-    """AJAX endpoint for AI insights"""
+    """AJAX endpoint for AI insights, reused while the user's results are unchanged (see progress/insights.py)"""
     if request.method == "POST" and request.headers.get("x-requested-with") == "XMLHttpRequest":
-        results = get_user_results(request.user)
-        practice_results = results["practice_results"]
-        writing_results = results["writing_results"]
-
-        recent_practice_data = practice_results.order_by('-taken_at')[:20]
-        recent_writing_data = writing_results.order_by('-taken_at')[:20]
-
-        practice_data = [
-            {'score': r.score, 'date': r.taken_at.strftime('%Y-%m-%d')}
-            for r in recent_practice_data
-        ]
-        writing_data = [
-            {'score': r.score, 'length': len(r.content), 'date': r.taken_at.strftime('%Y-%m-%d')}
-            for r in recent_writing_data
-        ]
-
-        prompt = f"""
-        Analyze the following practice test results and writing task results. Provide insights on strengths, weaknesses, and suggestions for improvement. Focus on recent activities.
-
-        Practice Test Results:
-        {practice_data}
-
-        Writing Task Results:
-        {writing_data}
-
-        Provide a concise summary with actionable advice.
-        """
-
-        # Get AI response
-        response = ai_chat_response(
-            prompt,
-            "You are a helpful assistant that provides insights based on user performance data.",
-            request.user,
-            "gpt-4o-mini",
-            "text"
-        )
-
-        # Ensure it's a string and return JSON
-        return JsonResponse({'ai_insight': str(response)})
+        return JsonResponse(insights.get(request.user))
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
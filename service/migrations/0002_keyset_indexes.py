@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['created_at', 'id'], name='blog_created_idx'),
+        ),
+    ]
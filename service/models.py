@@ -12,4 +12,7 @@ class Blog(models.Model):
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"], name="blog_created_idx")]
\ No newline at end of file
@@ -1,3 +1,35 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from accounts.models import CustomUser
+
+from .models import Blog
+
+
+class AnonymousPageCacheTests(TestCase):
+
+    def test_static_pages_served_from_cache(self):
+        for name in ("support", "terms_and_conditions", "privacy_policy", "about_us"):
+            with self.subTest(page=name):
+                url = reverse(f"service:{name}")
+                self.assertEqual(self.client.get(url)["X-Page-Cache"], "MISS")
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["X-Page-Cache"], "HIT")
+
+    def test_blog_change_purges_blog_pages(self):
+        author = CustomUser.objects.create_user(email="author@example.com", password="pw")
+        url = reverse("service:view_blogs")
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "HIT")
+
+        Blog.objects.create(title="Exam week tips", content="...", slug="exam-week", created_by=author)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertContains(response, "Exam week tips")
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.force_login(CustomUser.objects.create_user(email="member@example.com", password="pw"))
+        response = self.client.get(reverse("service:support"))
+        self.assertNotIn("X-Page-Cache", response)
@@ -6,6 +6,7 @@ app_name = "service"
 urlpatterns = [
     path('support/', views.support, name='support'),
     path('view_blogs/', views.view_blogs, name='view_blogs'),
+    path('view_blogs/feed/', views.blogs_feed, name='blogs_feed'),
     path('blog/<int:blog_id>/', views.blog, name='blog'),
     path('create_blog/', views.create_blog, name='create_blog'),
 
@@ -0,0 +1,62 @@
+// infinite scroll for the keyset-paginated lists (see myapp/pagination.py)
+//
+// A "Load more" link with data-infinite-scroll="<grid id>" sits under the grid.
+// When it scrolls into view we fetch the grid's data-feed-url with the link's
+// cursor, append the returned cards, and move the link to the next cursor.
+// Without JS the link still works as a plain next-page link.
+
+function setupInfiniteScroll(link) {
+  const grid = document.getElementById(link.dataset.infiniteScroll);
+  if (!grid || !grid.dataset.feedUrl) return;
+
+  let loading = false;
+  let failed = false;
+
+  async function loadMore() {
+    if (loading || !link.dataset.cursor) return;
+    loading = true;
+
+    const url = new URL(grid.dataset.feedUrl, window.location.origin);
+    url.searchParams.set("cursor", link.dataset.cursor);
+
+    try {
+      const res = await fetch(url, { headers: { "Accept": "application/json" } });
+      if (!res.ok) throw new Error(`Feed returned ${res.status}`);
+      const data = await res.json();
+
+      grid.insertAdjacentHTML("beforeend", data.html);
+      grid.dispatchEvent(new CustomEvent("feed:loaded", { detail: data }));
+
+      if (data.next_cursor) {
+        link.dataset.cursor = data.next_cursor;
+        const next = new URL(link.href, window.location.href);  // keeps any filter params
+        next.searchParams.set("cursor", data.next_cursor);
+        link.href = next;
+      } else {
+        observer.disconnect();
+        link.parentElement.remove();
+      }
+    } catch (err) {
+      console.error("Infinite scroll failed, falling back to the link:", err);
+      failed = true;
+      observer.disconnect();
+    } finally {
+      loading = false;
+    }
+  }
+
+  const observer = new IntersectionObserver(entries => {
+    if (entries.some(entry => entry.isIntersecting)) loadMore();
+  }, { rootMargin: "400px" });
+
+  observer.observe(link);
+  link.addEventListener("click", e => {
+    if (failed) return;  // plain navigation to the next page
+    e.preventDefault();
+    loadMore();
+  });
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  document.querySelectorAll("[data-infinite-scroll]").forEach(setupInfiniteScroll);
+});
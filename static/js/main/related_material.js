@@ -0,0 +1,18 @@
+// "Related material" on the test result and flashcard summary pages (see myapp/related.py)
+//
+// A placeholder with data-related-url is filled with the cards that URL
+// returns once the page has loaded. Nothing shows if there's nothing related
+// or the request fails.
+
+document.addEventListener("DOMContentLoaded", () => {
+  document.querySelectorAll("[data-related-url]").forEach(async box => {
+    try {
+      const res = await fetch(box.dataset.relatedUrl, { headers: { "Accept": "application/json" } });
+      if (!res.ok) throw new Error(`Related material returned ${res.status}`);
+      const data = await res.json();
+      box.innerHTML = data.html;
+    } catch (err) {
+      console.error("Could not load related material:", err);
+    }
+  });
+});